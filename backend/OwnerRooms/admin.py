@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Room, RoomImage, Booking, Visit, Complaint
+from .models import Room, RoomImage, RoomViewStats, Booking, Visit, Complaint
 class RoomImageInline(admin.TabularInline):
     model = RoomImage
     extra = 1
@@ -258,3 +258,9 @@ class ComplaintAdmin(admin.ModelAdmin):
         }
         return render(request, 'admin/OwnerRooms/complaint/complaint_detail.html', context)
 
+
+@admin.register(RoomViewStats)
+class RoomViewStatsAdmin(admin.ModelAdmin):
+    list_display = ('room', 'date', 'views', 'unique_viewers', 'visits', 'bookings')
+    list_filter = ('date',)
+    exclude = ('sketch',)
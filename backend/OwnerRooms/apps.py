@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class OwnerroomsConfig(AppConfig):
     name = 'OwnerRooms'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,84 @@
+from datetime import date
+from django.db import connection
+from django.db.models import F, Q
+
+# Bookings in these states hold their dates; Pending requests may overlap until one is confirmed.
+# Postgres also enforces this with an exclusion constraint (migration 0026).
+BLOCKING_STATUSES = ('Confirmed', 'Active')
+# Room states the booking calendar manages; others (e.g. Pending Verification) are left alone
+BOOKABLE_ROOM_STATUSES = ('Available', 'Occupied')
+
+
+def overlapping_bookings(room_id, start, end, exclude=None):
+    """Blocking bookings of a room that share at least one day with [start, end]."""
+    from .models import Booking
+    queryset = Booking.objects.filter(
+        room_id=room_id, status__in=BLOCKING_STATUSES, start_date__lte=end, end_date__gte=start
+    )
+    if exclude is not None:
+        queryset = queryset.exclude(pk=exclude)
+    return queryset
+
+
+def lock_room(room_id):
+    """
+    Serialize booking writes for one room until the transaction ends. Postgres
+    locks the room row; SQLite has no row locks, so a no-op UPDATE takes the
+    database write lock before the overlap check instead of after it.
+    """
+    from .models import Room
+    if connection.features.has_select_for_update:
+        list(Room.objects.select_for_update().filter(pk=room_id).values_list('pk', flat=True))
+    else:
+        Room.objects.filter(pk=room_id).update(id=F('id'))
+
+
+def available_rooms(queryset, start=None, end=None):
+    """
+    Rooms in `queryset` free for every day of [start, end]. A missing end means
+    open-ended (free from `start` on); a missing start means today.
+    """
+    from .models import Booking
+    start = start or date.today()
+    busy = Booking.objects.filter(status__in=BLOCKING_STATUSES, end_date__gte=start)
+    if end is not None:
+        busy = busy.filter(start_date__lte=end)
+    return queryset.exclude(id__in=busy.values('room_id')).filter(
+        Q(available_from__isnull=True) | Q(available_from__lte=start)
+    )
+
+
+def occupied_today(room_id, today=None):
+    today = today or date.today()
+    return overlapping_bookings(room_id, today, today).exists()
+
+
+def sync_room_status(room, today=None):
+    """Occupied while a blocking booking covers today, Available otherwise."""
+    if room.status not in BOOKABLE_ROOM_STATUSES:
+        return False
+    status = 'Occupied' if occupied_today(room.id, today) else 'Available'
+    if room.status == status:
+        return False
+    room.status = status
+    room.save()
+    return True
+
+
+def sync_all_room_statuses(today=None):
+    """Daily pass that starts future bookings and releases finished ones. Returns rooms changed."""
+    from .models import Booking, Room
+    today = today or date.today()
+    current = Booking.objects.filter(
+        status__in=BLOCKING_STATUSES, start_date__lte=today, end_date__gte=today
+    ).values('room_id')
+    starting = Room.objects.filter(status='Available', id__in=current)
+    # Only rooms a booking made Occupied; an owner may mark a room Occupied by hand
+    ended = Room.objects.filter(status='Occupied').exclude(id__in=current).filter(
+        id__in=Booking.objects.filter(status__in=BLOCKING_STATUSES, end_date__lt=today).values('room_id')
+    )
+    changed = 0
+    # save() per room so search caches, clusters and tiles hear about it
+    for room in [*starting, *ended]:
+        changed += sync_room_status(room, today)
+    return changed
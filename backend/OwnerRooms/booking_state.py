@@ -0,0 +1,122 @@
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .availability import BLOCKING_STATUSES, lock_room, overlapping_bookings, sync_room_status
+
+logger = logging.getLogger(__name__)
+
+# Booking status changes allowed from each state. Active is the legacy spelling of Confirmed.
+TRANSITIONS = {
+    'Pending': ('Confirmed', 'Active', 'Rejected', 'Cancelled'),
+    'Confirmed': ('Active', 'Completed', 'Cancelled'),
+    'Active': ('Confirmed', 'Completed', 'Cancelled'),
+    'Rejected': (),
+    'Cancelled': (),
+    'Completed': (),
+}
+
+
+class TransitionError(Exception):
+    """A booking change the state machine refuses (bad transition or taken dates)."""
+
+
+def lock_booking(booking_id):
+    """
+    Lock a booking and its room for the rest of the transaction. The room is
+    locked first, as booking creation does, so the two paths can't deadlock.
+    """
+    from .models import Booking
+    room_id = Booking.objects.filter(pk=booking_id).values_list('room_id', flat=True).first()
+    if room_id is None:
+        raise Booking.DoesNotExist(f"Booking {booking_id} does not exist.")
+    lock_room(room_id)
+    return Booking.objects.select_for_update().select_related('room').get(pk=booking_id)
+
+
+def ensure_first_rent(booking):
+    """The first Rent payment of a confirmed booking, due a month in (or at the end of a shorter stay)."""
+    from dateutil.relativedelta import relativedelta
+    from payments.models import Payment
+    due_date = booking.start_date + relativedelta(months=1)
+    if booking.end_date and due_date > booking.end_date:
+        due_date = booking.end_date
+    return Payment.objects.get_or_create(
+        booking=booking, payment_type='Rent', due_date=due_date,
+        defaults={'amount': booking.monthly_rent, 'status': 'Pending'}
+    )[0]
+
+
+def transition_booking(booking_id, new_status=None, key=None, actor=None, changes=None):
+    """
+    Move a booking to `new_status` (and apply other field `changes`) in one
+    transaction holding the room and booking locks: checks the transition and
+    the dates, records a BookingTransition, creates the first rent payment on
+    confirmation and syncs the room status.
+
+    Returns (booking, changed). Repeating a call is a no-op: `changed` is False
+    when `key` was already applied or the booking already has that status.
+    """
+    from .models import BookingTransition
+    with transaction.atomic():
+        booking = lock_booking(booking_id)
+        if key and BookingTransition.objects.filter(key=key).exists():
+            return booking, False
+
+        from_status = booking.status
+        new_status = new_status or from_status
+        if new_status != from_status and new_status not in TRANSITIONS.get(from_status, ()):
+            raise TransitionError(f"A {from_status.lower()} booking cannot be changed to {new_status.lower()}.")
+        if new_status == from_status and not changes:
+            return booking, False
+
+        room_id = booking.room_id
+        for field, value in (changes or {}).items():
+            setattr(booking, field, value)
+        if booking.room_id != room_id:
+            lock_room(booking.room_id)
+        booking.status = new_status
+        if new_status in BLOCKING_STATUSES and overlapping_bookings(
+            booking.room_id, booking.start_date, booking.end_date, exclude=booking.id
+        ).exists():
+            raise TransitionError("This room is already booked for those dates.")
+        booking.save()
+
+        if new_status == from_status:
+            return booking, False
+        BookingTransition.objects.create(
+            booking=booking, from_status=from_status, to_status=new_status, key=key, actor=actor
+        )
+        if new_status in BLOCKING_STATUSES:
+            ensure_first_rent(booking)
+        sync_room_status(booking.room)
+        return booking, True
+
+
+def record_payment(payment_id, method, reference, actor=None):
+    """
+    Mark a payment Paid and confirm its booking if still Pending, in one
+    transaction. Gateways may report the same payment more than once; only the
+    first report changes anything. Returns (payment, changed).
+    """
+    from payments.models import Payment
+    booking_id = Payment.objects.values_list('booking_id', flat=True).get(pk=payment_id)
+    with transaction.atomic():
+        booking = lock_booking(booking_id)
+        payment = Payment.objects.select_for_update().get(pk=payment_id)
+        if payment.status == 'Paid':
+            return payment, False
+
+        payment.status = 'Paid'
+        payment.paid_date = timezone.now().date()
+        payment.payment_method = method
+        payment.transaction_id = reference
+        payment.save()
+
+        if booking.status == 'Pending':
+            try:
+                # Savepoint: the payment stands even if the dates were taken meanwhile
+                with transaction.atomic():
+                    transition_booking(booking.id, 'Confirmed', key=f'{method}:{reference}', actor=actor)
+            except TransitionError as e:
+                logger.warning(f"Payment {payment.id} received but booking {booking.id} was not confirmed: {str(e)}")
+        return payment, True
@@ -0,0 +1,305 @@
+import io
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Responsive variants: name -> longest edge in pixels (never upscaled)
+VARIANT_SIZES = {
+    'card': 400,
+    'detail': 1024,
+    'full': 1920,
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Formats an original is re-encoded in (anything else becomes a JPEG)
+ORIGINAL_FORMATS = {
+    'JPEG': {'quality': 95},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 95},
+    'GIF': {},
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='room-images')
+
+
+# Blurhash (https://blurha.sh) placeholder encoder
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _encode83(value, length):
+    result = ''
+    for i in range(1, length + 1):
+        digit = (int(value) // (83 ** (length - i))) % 83
+        result += _BASE83[digit]
+    return result
+
+
+def _srgb_to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * (v ** (1 / 2.4)) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exp):
+    return math.copysign(abs(value) ** exp, value)
+
+
+def blurhash_encode(image, x_components=4, y_components=3):
+    """Encode a PIL image as a short blurhash string (computed on a 32px sample)."""
+    sample = image.convert('RGB')
+    sample.thumbnail((32, 32))
+    width, height = sample.size
+    pixels = sample.load()
+    linear = [
+        tuple(_srgb_to_linear(c) for c in pixels[x, y])
+        for y in range(height) for x in range(width)
+    ]
+
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(v) for factor in ac for v in factor)
+        quantised_max = max(0, min(82, int(math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        max_value = 1
+        result += _encode83(0, 1)
+
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, int(math.floor(_sign_pow(v / max_value, 0.5) * 9 + 9.5)))) for v in factor)
+        result += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def strip_original(image, fmt, stem):
+    """
+    Store a re-encoded copy of an upload without its EXIF or XMP (GPS
+    position, camera serials), keeping its format where the original's can be
+    written. Returns the stored name.
+    """
+    fmt = fmt if fmt in ORIGINAL_FORMATS else 'JPEG'
+    # Empty EXIF/XMP stated outright: some Pillow versions carry im.info's copies into the save
+    options = dict(ORIGINAL_FORMATS[fmt], exif=b'', xmp=b'')
+    image.info.pop('exif', None)
+    image.info.pop('xmp', None)
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    if fmt == 'JPEG':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    ext = {'JPEG': 'jpg'}.get(fmt, fmt.lower())
+    return default_storage.save(f"room_images/{stem}.{ext}", ContentFile(buffer.getvalue()))
+
+
+def render_variants(image_name):
+    """
+    Build every variant of a stored image, plus a copy of the original to
+    replace it if it carries EXIF/XMP. Touches storage only (no DB), so it can
+    run in a worker process. Re-encoding drops EXIF, including GPS tags.
+    Returns the metadata to store on the RoomImage.
+    """
+    with default_storage.open(image_name, 'rb') as source:
+        original = Image.open(source)
+        fmt = original.format
+        # EXIF and XMP are where phones put the GPS position
+        tagged = len(original.getexif()) > 0 or 'xmp' in original.info
+        original = ImageOps.exif_transpose(original)
+        original.load()
+    image = original.convert('RGB')
+
+    width, height = image.size
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    variants = {}
+    for variant, max_edge in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        meta = {'width': resized.width, 'height': resized.height}
+        for ext, (fmt, options) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt, **options)
+            name = f"room_images/variants/{stem}_{variant}.{'jpg' if ext == 'jpeg' else ext}"
+            meta[ext] = default_storage.save(name, ContentFile(buffer.getvalue()))
+        variants[variant] = meta
+
+    metadata = {
+        'width': width,
+        'height': height,
+        'blurhash': blurhash_encode(image),
+        'variants': variants,
+    }
+    if tagged:
+        # Originals without metadata are kept as uploaded (no generation loss on reprocessing)
+        metadata['image'] = strip_original(original, fmt, stem)
+    return metadata
+
+
+def variant_names(variants):
+    return [meta[ext] for meta in (variants or {}).values() for ext in VARIANT_FORMATS if meta.get(ext)]
+
+
+def save_image_metadata(image_id, metadata):
+    """Store pipeline output on the row and release the original and variants it replaces."""
+    from .models import RoomImage
+    from .payload_cache import invalidate_room_images
+    row = RoomImage.objects.filter(id=image_id).values('image', 'variants', 'room_id').first()
+    updated = RoomImage.objects.filter(id=image_id).update(processed_at=timezone.now(), **metadata)
+    if updated:
+        # update() sends no signals, so cached room payloads are dropped here
+        invalidate_room_images(row['room_id'])
+
+    # Each save added a reference, so the replaced files are released in full.
+    # If the image was deleted mid-processing, release what was just written instead.
+    replaced = row if updated else metadata
+    names = variant_names(replaced['variants'])
+    if 'image' in metadata:
+        names.append(replaced['image'])
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+def process_room_image(image_id):
+    """Render variants for one RoomImage and store the metadata on its row."""
+    from .models import RoomImage
+    image = RoomImage.objects.filter(id=image_id).only('id', 'image').first()
+    if not image or not image.image:
+        return None
+    metadata = render_variants(image.image.name)
+    save_image_metadata(image_id, metadata)
+    return metadata
+
+
+def _run_image_job(image_id):
+    try:
+        process_room_image(image_id)
+    except Exception as e:
+        logger.error(f"Room image processing failed for image {image_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_image_processing(image_ids):
+    """Process newly uploaded room images off the request thread, after commit."""
+    image_ids = list(image_ids)
+    transaction.on_commit(lambda: [_executor.submit(_run_image_job, image_id) for image_id in image_ids])
+
+
+# Bulk uploads
+
+def validate_room_images(files):
+    """
+    Check every file before anything is written: count, per-file size,
+    the per-request byte budget and that Pillow can actually decode it.
+    Returns {filename: reason}; empty when the batch is acceptable.
+    """
+    errors = {}
+    if not files:
+        return {'images': 'No images provided.'}
+    if len(files) > settings.ROOM_IMAGE_MAX_FILES:
+        return {'images': f'At most {settings.ROOM_IMAGE_MAX_FILES} images per request.'}
+
+    total = sum(f.size for f in files)
+    if total > settings.ROOM_IMAGE_UPLOAD_BUDGET_BYTES:
+        return {'images': f'Total upload exceeds {settings.ROOM_IMAGE_UPLOAD_BUDGET_BYTES // (1024 * 1024)} MB.'}
+
+    for f in files:
+        if f.size > settings.ROOM_IMAGE_MAX_BYTES:
+            errors[f.name] = f'Exceeds {settings.ROOM_IMAGE_MAX_BYTES // (1024 * 1024)} MB.'
+            continue
+        try:
+            f.seek(0)
+            Image.open(f).verify()
+        except Exception:
+            errors[f.name] = 'Not a valid image.'
+        finally:
+            f.seek(0)
+    return errors
+
+
+def _write_file(storage, name, f):
+    # Content-addressed storage can write without the DB; references are added by the caller
+    if hasattr(storage, 'write_blob'):
+        return storage.write_blob(name, f)
+    return storage.save(name, f), None, None
+
+
+def bulk_store_room_images(room, files):
+    """
+    Write validated files in parallel, then insert every RoomImage row with
+    one bulk_create inside a transaction. If anything fails no rows are kept
+    and the files already written are released.
+    """
+    from .models import RoomImage
+    from .payload_cache import invalidate_room_images
+    field = RoomImage._meta.get_field('image')
+    storage = field.storage
+    names = [field.generate_filename(None, f.name) for f in files]
+
+    with ThreadPoolExecutor(max_workers=min(4, len(files))) as pool:
+        futures = [pool.submit(_write_file, storage, name, f) for name, f in zip(names, files)]
+        written, failure = [], None
+        for future in futures:
+            try:
+                written.append(future.result())
+            except Exception as e:
+                failure = failure or e
+
+    try:
+        if failure:
+            raise failure
+        with transaction.atomic():
+            for name, sha256, size in written:
+                if sha256:
+                    storage.add_reference(name, sha256, size)
+            images = RoomImage.objects.bulk_create(
+                [RoomImage(room=room, image=name) for name, _, _ in written]
+            )
+            transaction.on_commit(lambda: invalidate_room_images(room.id))
+            schedule_image_processing(image.id for image in images)
+    except Exception:
+        # Plain storage: remove what was written. Blob storage: the refs rolled back,
+        # so the blobs are unreferenced and gc_media will collect them.
+        for name, sha256, _ in written:
+            if not sha256:
+                storage.delete(name)
+        raise
+    return images
@@ -0,0 +1,94 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import User
+from OwnerRooms.availability import available_rooms, overlapping_bookings
+from OwnerRooms.models import Booking, Room
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Times availability searches and booking overlap checks against synthetic rooms with '
+        'multi-year booking histories. Everything is created inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=1000, help='Synthetic rooms (e.g. 100000)')
+        parser.add_argument('--years', type=int, default=3, help='Years of booking history per room')
+        parser.add_argument('--checks', type=int, default=500, help='Overlap checks to time')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if min(options['rooms'], options['years'], options['checks']) < 1:
+            raise CommandError("--rooms, --years and --checks must be positive")
+        try:
+            with transaction.atomic():
+                self.run(**options)
+                raise Rollback()
+        except Rollback:
+            self.stdout.write("Synthetic data rolled back.")
+
+    def run(self, rooms, years, checks, seed, **options):
+        rng = random.Random(seed)
+        today = timezone.localdate()
+
+        started = time.perf_counter()
+        owner = User.objects.create(username='availability-benchmark-owner', role='Owner')
+        tenant = User.objects.create(username='availability-benchmark-tenant', role='Tenant')
+        Room.objects.bulk_create(
+            (Room(owner=owner, title=f'Benchmark room {i}', location='Kathmandu', price=10000) for i in range(rooms)),
+            batch_size=2000
+        )
+        room_ids = list(Room.objects.filter(owner=owner).values_list('id', flat=True))
+
+        bookings = []
+        created = 0
+        for room_id in room_ids:
+            # Back-to-back stays of 1-6 months with short gaps, from `years` ago to a few months ahead
+            day = today - timedelta(days=365 * years + rng.randint(0, 60))
+            while day < today + timedelta(days=120):
+                end = day + timedelta(days=rng.randint(30, 180))
+                if end < today:
+                    status = rng.choice(('Completed', 'Completed', 'Completed', 'Cancelled'))
+                else:
+                    status = rng.choice(('Confirmed', 'Confirmed', 'Pending'))
+                bookings.append(Booking(
+                    tenant=tenant, room_id=room_id, start_date=day, end_date=end,
+                    monthly_rent=10000, status=status
+                ))
+                day = end + timedelta(days=rng.randint(1, 45))
+            if len(bookings) >= 5000:
+                Booking.objects.bulk_create(bookings)
+                created += len(bookings)
+                bookings = []
+        Booking.objects.bulk_create(bookings)
+        created += len(bookings)
+        self.stdout.write(
+            f"Created {len(room_ids)} room(s) and {created} booking(s) in {time.perf_counter() - started:.1f}s."
+        )
+
+        rooms_queryset = Room.objects.filter(owner=owner)
+        windows = [
+            ('next week', today + timedelta(days=7), today + timedelta(days=14)),
+            ('next 3 months', today, today + timedelta(days=90)),
+            ('open-ended from next month', today + timedelta(days=30), None),
+        ]
+        for label, start, end in windows:
+            started = time.perf_counter()
+            count = available_rooms(rooms_queryset, start, end).count()
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"Available rooms, {label}: {count} in {elapsed:.1f}ms")
+
+        started = time.perf_counter()
+        for _ in range(checks):
+            start = today + timedelta(days=rng.randint(0, 180))
+            overlapping_bookings(rng.choice(room_ids), start, start + timedelta(days=rng.randint(30, 180))).exists()
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Overlap check: {elapsed / checks:.3f}ms average over {checks} check(s)")
@@ -0,0 +1,110 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from accounts.models import User
+from OwnerRooms.models import Booking, Room
+from OwnerRooms.tenants import active_leases, directory_page, directory_rooms, directory_stats
+from payments.models import Payment
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the owner tenant directory against synthetic active leases with rent histories, '
+        'comparing per-booking payment lookups with the annotated page query. Everything is '
+        'created inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leases', type=int, default=10000, help='Synthetic active leases')
+        parser.add_argument('--payments', type=int, default=6, help='Rent payments per lease')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if min(options['leases'], options['payments']) < 1:
+            raise CommandError("--leases and --payments must be positive")
+        try:
+            with transaction.atomic():
+                self.run(**options)
+                raise Rollback()
+        except Rollback:
+            self.stdout.write("Synthetic data rolled back.")
+
+    def run(self, leases, payments, seed, **options):
+        rng = random.Random(seed)
+        today = timezone.localdate()
+
+        started = time.perf_counter()
+        owner = User.objects.create(username='directory-benchmark-owner', role='Owner')
+        User.objects.bulk_create(
+            (User(username=f'directory-benchmark-tenant-{i}', full_name=f'Tenant {i}', role='Tenant')
+             for i in range(leases)),
+            batch_size=2000
+        )
+        tenant_ids = list(
+            User.objects.filter(username__startswith='directory-benchmark-tenant-').values_list('id', flat=True)
+        )
+        Room.objects.bulk_create(
+            (Room(owner=owner, title=f'Benchmark room {i}', location='Kathmandu', price=10000) for i in range(leases)),
+            batch_size=2000
+        )
+        room_ids = list(Room.objects.filter(owner=owner).values_list('id', flat=True))
+        Booking.objects.bulk_create(
+            (Booking(
+                tenant_id=tenant_id, room_id=room_id, monthly_rent=10000, status='Active',
+                start_date=today - timedelta(days=30 * payments), end_date=today + timedelta(days=rng.randint(10, 365))
+            ) for tenant_id, room_id in zip(tenant_ids, room_ids)),
+            batch_size=2000
+        )
+        booking_ids = list(active_leases(owner).values_list('id', flat=True))
+        # bulk_create skips Payment.save (and its ledger signal), which is fine for timing reads
+        Payment.objects.bulk_create(
+            (Payment(
+                booking_id=booking_id, amount=10000, due_date=today - timedelta(days=30 * (payments - month)),
+                status='Paid' if month < payments - 1 else rng.choice(('Paid', 'Pending', 'Overdue')),
+            ) for booking_id in booking_ids for month in range(payments)),
+            batch_size=5000
+        )
+        self.stdout.write(
+            f"Created {len(booking_ids)} lease(s) with {len(booking_ids) * payments} payment(s) "
+            f"in {time.perf_counter() - started:.1f}s."
+        )
+
+        def timed(label, build):
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                rows = build()
+                elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"{label}: {rows} row(s), {len(queries)} queries, {elapsed:.1f}ms")
+
+        def per_booking():
+            # The directory before: every lease loaded, one latest-payment query each
+            statuses = []
+            for booking in active_leases(owner).select_related('tenant', 'room'):
+                latest = Payment.objects.filter(booking=booking).order_by('-due_date').first()
+                statuses.append(latest.status if latest else 'Paid')
+            return len(statuses)
+
+        def page(**kwargs):
+            def build():
+                directory_stats(owner)
+                directory_rooms(owner)
+                return len(directory_page(owner, **kwargs)[0])
+            return build
+
+        timed('Per-booking lookups (all leases)', per_booking)
+        timed('Annotated page 1', page())
+        timed('Annotated last page', page(page=max(len(booking_ids) // 20, 1)))
+        timed("Annotated search 'Tenant 99'", page(search='Tenant 99'))
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.db import connections
+from OwnerRooms.models import RoomImage
+from OwnerRooms.images import render_variants, save_image_metadata
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfills responsive variants, dimensions and blurhash for room images using a process pool; '
+        'originals carrying EXIF/XMP are replaced by stripped copies (use --all for images processed before that)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+        parser.add_argument('--all', action='store_true', help='Reprocess images that already have variants')
+        parser.add_argument('--limit', type=int, default=None, help='Process at most this many images')
+
+    def handle(self, *args, **options):
+        queryset = RoomImage.objects.exclude(image='').order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(processed_at__isnull=True)
+        if options['limit']:
+            queryset = queryset[:options['limit']]
+        jobs = list(queryset.values_list('id', 'image'))
+
+        if not jobs:
+            self.stdout.write("No room images need processing.")
+            return
+
+        # Workers only do pixel work + storage writes; all DB writes stay in this process.
+        # Close connections so forked workers don't share the parent's DB socket.
+        connections.close_all()
+        processed = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(render_variants, name): image_id for image_id, name in jobs}
+            for future in as_completed(futures):
+                image_id = futures[future]
+                try:
+                    save_image_metadata(image_id, future.result())
+                    processed += 1
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"Image {image_id} failed: {str(e)}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} room image(s)."))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} image(s) could not be processed."))
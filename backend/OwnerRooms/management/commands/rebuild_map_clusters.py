@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from OwnerRooms.map_clusters import rebuild_map_clusters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every precomputed room map cluster (room changes keep them current incrementally)'
+
+    def handle(self, *args, **options):
+        count = rebuild_map_clusters()
+        self.stdout.write(self.style.SUCCESS(f"Built {count} map cluster(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from OwnerRooms.recommendations import refresh_all_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds precomputed room recommendations for every active tenant (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only refresh this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        count = refresh_all_recommendations(options['users'])
+        if count:
+            self.stdout.write(self.style.SUCCESS(f"Refreshed recommendations for {count} tenant(s)."))
+        else:
+            self.stdout.write("No active tenants need recommendations.")
@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from OwnerRooms.viewcounts import flush_views, prune_view_events, rollup_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Rolls room view events, visits and bookings up into RoomViewStats (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to roll up (YYYY-MM-DD); defaults to yesterday')
+        parser.add_argument('--days', type=int, default=1, help='Number of days to roll up, ending at --date')
+        parser.add_argument('--no-prune', action='store_true', help='Keep raw events past the retention window')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                last = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+        else:
+            last = timezone.localdate() - timedelta(days=1)
+
+        # Views still buffered in this process belong in the rollup too
+        flush_views()
+
+        for offset in range(options['days'] - 1, -1, -1):
+            day = last - timedelta(days=offset)
+            rooms = rollup_daily_stats(day)
+            self.stdout.write(f"{day}: rolled up {rooms} room(s).")
+
+        if not options['no_prune']:
+            cutoff = timezone.localdate() - timedelta(days=settings.ROOM_VIEW_EVENT_RETENTION_DAYS)
+            pruned = prune_view_events(cutoff)
+            if pruned:
+                self.stdout.write(self.style.WARNING(f"Pruned {pruned} view event(s) before {cutoff}."))
+
+        self.stdout.write(self.style.SUCCESS("Room stats rollup complete."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from OwnerRooms.availability import sync_all_room_statuses
+
+
+class Command(BaseCommand):
+    help = 'Marks rooms Occupied when a confirmed booking starts and Available once it ends (run daily)'
+
+    def handle(self, *args, **options):
+        changed = sync_all_room_statuses()
+        self.stdout.write(self.style.SUCCESS(f"Updated {changed} room status(es)."))
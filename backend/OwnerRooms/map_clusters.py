@@ -0,0 +1,219 @@
+import logging
+import math
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Clusters live on a Web Mercator grid: at zoom z the world is 2^z map tiles across,
+# and each tile is split into 2^ROOM_MAP_CELL_BITS cells per side. Cells nest, so the
+# cell holding a point at one zoom contains its cells at every higher zoom.
+MAX_LATITUDE = 85.05112878
+COLUMNS = ('lat', 'lng', 'count', 'min_price', 'max_price', 'room_id')
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='room-map')
+
+
+def zoom_levels():
+    return range(settings.ROOM_MAP_MIN_ZOOM, settings.ROOM_MAP_MAX_ZOOM + 1)
+
+
+def _grid(zoom):
+    return 1 << (zoom + settings.ROOM_MAP_CELL_BITS)
+
+
+def world_xy(lat, lng):
+    """Web Mercator position in 0..1 on both axes (y grows southwards)."""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = (lng + 180.0) / 360.0
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2
+    return x, y
+
+
+def grid_cell(lat, lng, n):
+    """(x, y) of the point on an n x n grid over the world."""
+    x, y = world_xy(lat, lng)
+    return min(max(int(x * n), 0), n - 1), min(max(int(y * n), 0), n - 1)
+
+
+def grid_bounds(x, y, n):
+    """(south, west, north, east) of cell (x, y) on an n x n grid."""
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return latitude(y + 1), x / n * 360.0 - 180.0, latitude(y), (x + 1) / n * 360.0 - 180.0
+
+
+def cell_of(lat, lng, zoom):
+    """Grid cell (x, y) holding a point at `zoom`."""
+    return grid_cell(lat, lng, _grid(zoom))
+
+
+def cell_bounds(x, y, zoom):
+    return grid_bounds(x, y, _grid(zoom))
+
+
+def load_points(bounds=None):
+    """(id, lat, lng, price) for Available rooms with coordinates, optionally within (s, w, n, e)."""
+    from .models import Room
+    queryset = Room.objects.filter(status='Available', latitude__isnull=False, longitude__isnull=False)
+    if bounds is not None:
+        south, west, north, east = bounds
+        queryset = queryset.filter(
+            latitude__gte=south, latitude__lte=north, longitude__gte=west, longitude__lte=east
+        )
+    rows = queryset.values_list('id', 'latitude', 'longitude', 'price')
+    return [(room_id, float(lat), float(lng), price) for room_id, lat, lng, price in rows]
+
+
+def build_clusters(points, zoom, cells=None):
+    """RoomMapCluster rows for `points` at `zoom`, limited to `cells` when given."""
+    from .models import RoomMapCluster
+    groups = defaultdict(list)
+    for point in points:
+        cell = cell_of(point[1], point[2], zoom)
+        if cells is None or cell in cells:
+            groups[cell].append(point)
+
+    clusters = []
+    for (x, y), members in groups.items():
+        prices = [price for _, _, _, price in members]
+        clusters.append(RoomMapCluster(
+            zoom=zoom, x=x, y=y,
+            count=len(members),
+            latitude=sum(lat for _, lat, _, _ in members) / len(members),
+            longitude=sum(lng for _, _, lng, _ in members) / len(members),
+            min_price=min(prices),
+            max_price=max(prices),
+            room_id=members[0][0] if len(members) == 1 else None,
+        ))
+    return clusters
+
+
+def rebuild_map_clusters():
+    """Recompute every zoom level from one read of the rooms. Returns the number of clusters."""
+    from .models import RoomMapCluster
+    points = load_points()
+    clusters = [cluster for zoom in zoom_levels() for cluster in build_clusters(points, zoom)]
+    with transaction.atomic():
+        RoomMapCluster.objects.all().delete()
+        RoomMapCluster.objects.bulk_create(clusters, batch_size=1000)
+    return len(clusters)
+
+
+def merge_clusters(zoom, x, y, children):
+    """The cluster of cell (x, y) at `zoom` built from its cells' clusters one zoom higher."""
+    from .models import RoomMapCluster
+    children = [child for child in children if child.count]
+    if not children:
+        return None
+    count = sum(child.count for child in children)
+    return RoomMapCluster(
+        zoom=zoom, x=x, y=y,
+        count=count,
+        latitude=sum(child.latitude * child.count for child in children) / count,
+        longitude=sum(child.longitude * child.count for child in children) / count,
+        min_price=min(child.min_price for child in children),
+        max_price=max(child.max_price for child in children),
+        room_id=children[0].room_id if count == 1 else None,
+    )
+
+
+def refresh_cells(positions):
+    """
+    Recompute, at every zoom level, only the cells holding `positions`
+    ([(lat, lng), ...], e.g. a room's old and new location). Rooms are read
+    only from those cells at ROOM_MAP_MAX_ZOOM; each lower zoom is then built
+    zoom by zoom from the clusters of the cells it contains (the rebuilt ones
+    in memory, their neighbours from the table), so a refresh never reads more
+    than one street-level cell of rooms per position.
+    """
+    from .models import RoomMapCluster
+    positions = {(float(lat), float(lng)) for lat, lng in positions if lat is not None and lng is not None}
+    if not positions:
+        return 0
+
+    zoom = settings.ROOM_MAP_MAX_ZOOM
+    cells = {cell_of(lat, lng, zoom) for lat, lng in positions}
+    points = {}
+    for x, y in cells:
+        south, west, north, east = cell_bounds(x, y, zoom)
+        # Padded so rounding at the edges can't drop a room; cell_of decides membership
+        for point in load_points((south - 1e-6, west - 1e-6, north + 1e-6, east + 1e-6)):
+            points[point[0]] = point
+    rebuilt = {(zoom, cluster.x, cluster.y): cluster for cluster in build_clusters(points.values(), zoom, cells)}
+    stale = Q(pk__in=[])
+    for x, y in cells:
+        stale |= Q(zoom=zoom, x=x, y=y)
+
+    for zoom in reversed(zoom_levels()[:-1]):
+        child_cells = cells
+        cells = {cell_of(lat, lng, zoom) for lat, lng in positions}
+        children = defaultdict(list)
+        neighbours = Q(pk__in=[])
+        for x, y in cells:
+            stale |= Q(zoom=zoom, x=x, y=y)
+            neighbours |= Q(zoom=zoom + 1, x__in=(2 * x, 2 * x + 1), y__in=(2 * y, 2 * y + 1))
+        for child_x, child_y in child_cells:
+            if (zoom + 1, child_x, child_y) in rebuilt:
+                children[(child_x // 2, child_y // 2)].append(rebuilt[(zoom + 1, child_x, child_y)])
+        for child in RoomMapCluster.objects.filter(neighbours):
+            if (child.x, child.y) not in child_cells:
+                children[(child.x // 2, child.y // 2)].append(child)
+        for x, y in cells:
+            cluster = merge_clusters(zoom, x, y, children[(x, y)])
+            if cluster is not None:
+                rebuilt[(zoom, x, y)] = cluster
+
+    with transaction.atomic():
+        RoomMapCluster.objects.filter(stale).delete()
+        RoomMapCluster.objects.bulk_create(rebuilt.values())
+    return len(rebuilt)
+
+
+def map_markers(bbox, zoom):
+    """
+    Rows of COLUMNS for the map viewport `bbox` (west, south, east, north).
+    Up to ROOM_MAP_MAX_ZOOM these are precomputed clusters; beyond it every room
+    is its own marker, unless the viewport spans more than
+    ROOM_MAP_MAX_VIEWPORT_TILES map tiles at that zoom (no real screen does),
+    in which case it gets the ROOM_MAP_MAX_ZOOM clusters. Returns (effective zoom, rows).
+    """
+    from .models import RoomMapCluster
+    west, south, east, north = bbox
+    zoom = max(zoom, settings.ROOM_MAP_MIN_ZOOM)
+    if zoom > settings.ROOM_MAP_MAX_ZOOM:
+        x0, y0 = grid_cell(north, west, 1 << zoom)
+        x1, y1 = grid_cell(south, east, 1 << zoom)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > settings.ROOM_MAP_MAX_VIEWPORT_TILES:
+            zoom = settings.ROOM_MAP_MAX_ZOOM
+    if zoom > settings.ROOM_MAP_MAX_ZOOM:
+        rows = [
+            [round(lat, 6), round(lng, 6), 1, price, price, room_id]
+            for room_id, lat, lng, price in load_points((south, west, north, east))
+        ]
+        return zoom, rows
+
+    x0, y0 = cell_of(north, west, zoom)
+    x1, y1 = cell_of(south, east, zoom)
+    clusters = RoomMapCluster.objects.filter(
+        zoom=zoom, x__gte=x0, x__lte=x1, y__gte=y0, y__lte=y1
+    ).values_list('latitude', 'longitude', 'count', 'min_price', 'max_price', 'room_id')
+    return zoom, [[round(lat, 6), round(lng, 6), *rest] for lat, lng, *rest in clusters]
+
+
+def _run(positions):
+    try:
+        refresh_cells(positions)
+    except Exception as e:
+        logger.error(f"Map cluster refresh for {positions} failed: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_cell_refresh(positions):
+    positions = list(positions)
+    transaction.on_commit(lambda: _executor.submit(_run, positions))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('OwnerRooms', '0020_roomimage_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomViewStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_viewers', models.PositiveIntegerField(default=0)),
+                ('sketch', models.BinaryField(blank=True, default=b'')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_stats', to='OwnerRooms.room')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('room', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('OwnerRooms', '0023_room_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersearchpreference',
+            name='search_signals',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
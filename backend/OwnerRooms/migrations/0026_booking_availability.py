@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:33
+
+from django.db import migrations, models
+
+# Postgres only: no two Confirmed/Active bookings of a room may share a day.
+# Other databases rely on OwnerRooms.availability.lock_room plus the overlap check.
+ADD_EXCLUSION = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE "OwnerRooms_booking" ADD CONSTRAINT booking_no_overlap
+    EXCLUDE USING gist (room_id WITH =, daterange(start_date, end_date, '[]') WITH &&)
+    WHERE (status IN ('Confirmed', 'Active'));
+"""
+DROP_EXCLUSION = 'ALTER TABLE "OwnerRooms_booking" DROP CONSTRAINT IF EXISTS booking_no_overlap;'
+
+
+# Bookings that already break the rule; the constraint can't be added while any exist
+FIND_OVERLAPS = """
+SELECT a.room_id, a.id, a.start_date, a.end_date, b.id, b.start_date, b.end_date
+FROM "OwnerRooms_booking" a
+JOIN "OwnerRooms_booking" b
+    ON b.room_id = a.room_id AND b.id > a.id
+    AND b.start_date <= a.end_date AND a.start_date <= b.end_date
+WHERE a.status IN ('Confirmed', 'Active') AND b.status IN ('Confirmed', 'Active')
+ORDER BY a.room_id, a.id, b.id
+LIMIT 50;
+"""
+
+
+def add_exclusion(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FIND_OVERLAPS)
+        overlaps = cursor.fetchall()
+    if overlaps:
+        lines = '\n'.join(
+            f"  room {room}: booking {first} ({first_start} to {first_end}) overlaps booking {second} ({second_start} to {second_end})"
+            for room, first, first_start, first_end, second, second_start, second_end in overlaps
+        )
+        raise RuntimeError(
+            "Cannot add booking_no_overlap: these Confirmed/Active bookings share days "
+            f"(first {len(overlaps)} shown). Cancel or reschedule them, then migrate again.\n{lines}"
+        )
+    schema_editor.execute(ADD_EXCLUSION)
+
+
+def drop_exclusion(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_EXCLUSION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('OwnerRooms', '0025_room_map_clusters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status__in', ['Confirmed', 'Active'])), fields=['room', 'start_date', 'end_date'], name='booking_room_span_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status__in', ['Confirmed', 'Active'])), fields=['end_date', 'start_date', 'room'], name='booking_span_idx'),
+        ),
+        migrations.RunPython(add_exclusion, drop_exclusion),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_lookup_columns(apps, schema_editor):
+    RoomRecommendation = apps.get_model('OwnerRooms', 'RoomRecommendation')
+    recs = list(RoomRecommendation.objects.all())
+    for rec in recs:
+        scores = rec.scores or []
+        rec.listed_rooms = f",{','.join(str(room_id) for room_id, _ in scores)}," if scores else ''
+        rec.min_score = scores[-1][1] if len(scores) >= settings.ROOM_RECOMMENDATION_TOP_K else 0
+    RoomRecommendation.objects.bulk_update(recs, ['listed_rooms', 'min_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('OwnerRooms', '0027_booking_transitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomrecommendation',
+            name='listed_rooms',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='roomrecommendation',
+            name='min_score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.RunPython(fill_lookup_columns, migrations.RunPython.noop),
+    ]
@@ -114,12 +114,63 @@ class Room(models.Model):
     def __str__(self):
         return f"{self.title} - {self.location}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Column values as loaded, so a save can tell what changed without re-reading the row
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Signals have compared against the old values; the next save compares against these
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields if field.attname in self.__dict__
+        }
+
+
+class RoomViewEvent(models.Model):
+    """Append-only log of detail-page views, bulk inserted by the view buffer (OwnerRooms.viewcounts)."""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='view_events')
+    viewer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    viewed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['room', 'viewed_at'])]
+
+
+class RoomViewStats(models.Model):
+    """Nightly per-room, per-day rollup of view events, visits and bookings; room analytics read only this."""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='view_stats')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+    visits = models.PositiveIntegerField(default=0)
+    bookings = models.PositiveIntegerField(default=0)
+    # HyperLogLog registers for the day; merged to estimate unique viewers over a range
+    sketch = models.BinaryField(blank=True, default=b'')
+
+    class Meta:
+        unique_together = ('room', 'date')
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.room_id} on {self.date}: {self.views} views"
+
 
 class RoomImage(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='room_images/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
+    # Filled in by the background image pipeline (OwnerRooms.images)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True)
+    variants = models.JSONField(default=dict, blank=True)  # {"card": {"width", "height", "webp", "jpeg"}, ...}
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         ordering = ['uploaded_at']
     
@@ -138,12 +189,61 @@ class UserSearchPreference(models.Model):
     tv = models.BooleanField(default=False)
     cctv = models.BooleanField(default=False)
     furnished = models.BooleanField(default=False)
+    # Last searched price band and map point, used by the recommendation scorer
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    # Decayed counts / moving averages over recent searches (OwnerRooms.preferences);
+    # the columns above are derived from this on every flush
+    search_signals = models.JSONField(default=dict, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Preferences for {self.user.email}"
 
 
+class RoomRecommendation(models.Model):
+    """Precomputed top-K rooms for a tenant, kept current by OwnerRooms.recommendations."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='room_recommendation')
+    # [[room_id, score], ...] best first
+    scores = models.JSONField(default=list, blank=True)
+    # Lookup columns kept beside `scores` so a room change only loads the lists it
+    # can affect: the listed ids as ",3,17," and the score a newcomer must reach
+    # (the last score of a full list, else 0)
+    listed_rooms = models.TextField(default='', blank=True)
+    min_score = models.FloatField(default=0, db_index=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recommendations for {self.user.email}"
+
+    @property
+    def room_ids(self):
+        return [room_id for room_id, _ in self.scores]
+
+
+class RoomMapCluster(models.Model):
+    """Available rooms in one map grid cell at one zoom level, kept current by OwnerRooms.map_clusters."""
+    zoom = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    count = models.PositiveIntegerField()
+    # Centroid of the rooms in the cell, where the marker is drawn
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Set when the cell holds a single room, so the marker can link to it
+    room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        unique_together = ('zoom', 'x', 'y')
+
+    def __str__(self):
+        return f"{self.count} rooms at z{self.zoom}/{self.x}/{self.y}"
+
+
 class Booking(models.Model):
     """Represents a tenant's booking/rental of a room."""
     STATUS_CHOICES = [
@@ -166,11 +266,41 @@ class Booking(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        # Only bookings that hold their dates (OwnerRooms.availability.BLOCKING_STATUSES)
+        indexes = [
+            # Overlap check for one room
+            models.Index(
+                fields=['room', 'start_date', 'end_date'], name='booking_room_span_idx',
+                condition=models.Q(status__in=['Confirmed', 'Active'])
+            ),
+            # Availability search: bookings still running on or after a date
+            models.Index(
+                fields=['end_date', 'start_date', 'room'], name='booking_span_idx',
+                condition=models.Q(status__in=['Confirmed', 'Active'])
+            ),
+        ]
     
     def __str__(self):
         return f"{self.tenant.full_name} - {self.room.title} ({self.status})"
 
 
+class BookingTransition(models.Model):
+    """One applied booking status change, written by OwnerRooms.booking_state."""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='transitions')
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    # Idempotency key (e.g. a payment gateway's transaction id); a repeated key is a no-op
+    key = models.CharField(max_length=150, unique=True, null=True, blank=True)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Booking {self.booking_id}: {self.from_status} -> {self.to_status}"
+
+
 class Visit(models.Model):
     """Represents a scheduled visit to view a room."""
     STATUS_CHOICES = [
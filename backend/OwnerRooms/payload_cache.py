@@ -0,0 +1,78 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from stayspot.cache import count_metric, invalidate_tags, tag_versions
+
+# Serialized RoomSerializer payloads, keyed by (room id, updated_at, images version,
+# rating version, host). Saving a room moves updated_at; image and review changes
+# bump their tag, so stale fragments are never read, only left to expire.
+MEMO_KEY = '_room_payloads'
+# Columns bumped with update() (view counts) that leave updated_at alone; they are
+# copied from the freshly loaded room into every payload instead of being cached
+LIVE_FIELDS = ('views',)
+METRICS = ('room_payload_hit', 'room_payload_miss')
+# Relations a room payload reads, prefetched in bulk before serializing a batch
+RELATIONS = ('owner', 'images', 'reviews')
+
+
+def _host(context):
+    request = context.get('request')
+    return request.build_absolute_uri('/') if request else ''
+
+
+def payload_keys(rooms, context):
+    tags = []
+    for room in rooms:
+        tags += [f'room-images:{room.id}', f'room-rating:{room.id}']
+    versions = tag_versions(tags)
+    host = _host(context)
+    keys = {}
+    for i, room in enumerate(rooms):
+        parts = f"{room.updated_at.timestamp()}:{versions[2 * i]}:{versions[2 * i + 1]}:{host}"
+        keys[room.id] = f"rooms:payload:{room.id}:{hashlib.sha1(parts.encode()).hexdigest()[:20]}"
+    return keys
+
+
+def room_payloads(rooms, context, serialize):
+    """
+    {room_id: payload} for `rooms`, fetched with one multi-get. serialize(room)
+    builds misses (owner, images and reviews are prefetched for them in bulk).
+    Results are memoized in the serializer context for the rest of the request.
+    """
+    memo = context.setdefault(MEMO_KEY, {})
+    pending = list({room.id: room for room in rooms if room.id not in memo}.values())
+    if not pending:
+        return memo
+
+    keys = payload_keys(pending, context)
+    found = cache.get_many(list(keys.values()))
+    missing = [room for room in pending if keys[room.id] not in found]
+    for room in pending:
+        if keys[room.id] in found:
+            memo[room.id] = _with_live_fields(found[keys[room.id]], room)
+
+    if missing:
+        prefetch_related_objects(missing, *RELATIONS)
+        fresh = {}
+        for room in missing:
+            memo[room.id] = fresh[keys[room.id]] = serialize(room)
+        cache.set_many(fresh, settings.ROOM_DETAIL_CACHE_SECONDS)
+
+    count_metric('room_payload_hit', len(pending) - len(missing))
+    count_metric('room_payload_miss', len(missing))
+    return memo
+
+
+def _with_live_fields(payload, room):
+    # A copy: the local cache level hands out the stored object itself
+    live = {field: room.__dict__[field] for field in LIVE_FIELDS if field in payload and field in room.__dict__}
+    return {**payload, **live} if live else payload
+
+
+def invalidate_room_images(room_id):
+    invalidate_tags(f'room-images:{room_id}')
+
+
+def invalidate_room_rating(room_id):
+    invalidate_tags(f'room-rating:{room_id}')
@@ -0,0 +1,209 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from time import monotonic
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .recommendations import refresh_user_recommendations, schedule_user_refresh
+
+logger = logging.getLogger(__name__)
+
+# Search query params learned from, mapped to the UserSearchPreference fields they drive
+CATEGORIES = ('location', 'gender_preference', 'room_type')
+AMENITIES = ('wifi', 'ac', 'tv', 'cctv')
+NUMBERS = {'min_price': 'min_price', 'max_price': 'max_price', 'lat': 'latitude', 'lng': 'longitude'}
+
+
+def search_signal(params):
+    """
+    Pull the preference-relevant filters out of a room search's query params.
+    Returns None when the search carries nothing worth learning from.
+    """
+    signal = {}
+    for key in CATEGORIES:
+        value = (params.get(key) or '').strip()
+        if value:
+            signal[key] = value
+    for key in AMENITIES:
+        if params.get(key) in ('true', 'false'):
+            signal[key] = params.get(key) == 'true'
+    for key in NUMBERS:
+        try:
+            if params.get(key):
+                signal[key] = float(params.get(key))
+        except (TypeError, ValueError):
+            pass
+    if ('lat' in signal) != ('lng' in signal):
+        signal.pop('lat', None)
+        signal.pop('lng', None)
+    return signal or None
+
+
+class SearchSignalBuffer:
+    """
+    Collects tenants' search filters in memory between flushes so a burst of
+    keystroke-driven searches costs one write per tenant instead of one each.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signals = defaultdict(list)
+        self._timer = None
+        self._due = None
+
+    def add(self, user_id, signal):
+        """Record a search. Returns the number of searches now pending."""
+        with self._lock:
+            self._signals[user_id].append(signal)
+            return sum(len(signals) for signals in self._signals.values())
+
+    def drain(self):
+        with self._lock:
+            batch, self._signals = self._signals, defaultdict(list)
+            self._timer = self._due = None
+            return batch
+
+    def requeue(self, batch):
+        """Put a drained batch back (its flush failed), ahead of searches recorded since."""
+        with self._lock:
+            for user_id, signals in batch.items():
+                self._signals[user_id][:0] = signals
+
+    def schedule(self, delay, callback):
+        """Run `callback` on a timer thread in `delay` seconds, unless a flush is already due by then."""
+        due = monotonic() + delay
+        with self._lock:
+            if self._timer is not None:
+                if self._due <= due:
+                    return
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, callback)
+            self._timer.daemon = True
+            self._due = due
+            self._timer.start()
+
+
+search_buffer = SearchSignalBuffer()
+
+
+def fold_signal(state, signal, decay):
+    """
+    Fold one search into the decayed state stored on the preference:
+    categorical values keep decayed counts, amenities and numbers keep
+    exponential moving averages. Older searches fade instead of being overwritten.
+    """
+    for key in CATEGORIES:
+        counts = state.setdefault(key, {})
+        for value in list(counts):
+            counts[value] *= decay
+            if counts[value] < 0.01:
+                del counts[value]
+        if key in signal:
+            counts[signal[key]] = counts.get(signal[key], 0) + 1
+
+    for key in list(AMENITIES) + list(NUMBERS):
+        if key in signal:
+            observed = float(signal[key])
+            previous = state.get(key)
+            state[key] = observed if previous is None else decay * previous + (1 - decay) * observed
+    return state
+
+
+def apply_state(pref, state):
+    """Derive the preference columns from the decayed state."""
+    for key in CATEGORIES:
+        counts = state.get(key) or {}
+        setattr(pref, key, max(counts, key=counts.get) if counts else None)
+    for key in AMENITIES:
+        if state.get(key) is not None:
+            setattr(pref, key, state[key] >= 0.5)
+    for key, field in NUMBERS.items():
+        if state.get(key) is not None:
+            setattr(pref, field, round(state[key], 6 if key in ('lat', 'lng') else 2))
+
+
+def apply_signals(batch, in_background=True):
+    """
+    Persist a drained batch ({user_id: [signal, ...]}) with one bulk insert and
+    one bulk update, then refresh the tenants' recommendations: in the
+    background, or inline when `in_background` is False.
+    """
+    from accounts.models import User
+    from .models import UserSearchPreference
+
+    # Tenants deleted since searching would fail the whole batch on the FK (and its retries)
+    live = set(User.objects.filter(id__in=list(batch)).values_list('id', flat=True))
+    batch = {user_id: signals for user_id, signals in batch.items() if user_id in live}
+    decay = settings.SEARCH_PREFERENCE_DECAY
+    with transaction.atomic():
+        queryset = UserSearchPreference.objects.select_for_update()
+        existing = queryset.in_bulk(list(batch), field_name='user_id')
+        missing = [UserSearchPreference(user_id=user_id) for user_id in batch if user_id not in existing]
+        if missing:
+            UserSearchPreference.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = queryset.in_bulk(list(batch), field_name='user_id')
+
+        prefs = []
+        for user_id, signals in batch.items():
+            pref = existing[user_id]
+            state = dict(pref.search_signals or {})
+            for signal in signals:
+                fold_signal(state, signal, decay)
+            pref.search_signals = state
+            apply_state(pref, state)
+            prefs.append(pref)
+
+        # bulk_update skips auto_now and post_save, so both are handled here
+        now = timezone.now()
+        for pref in prefs:
+            pref.updated_at = now
+        fields = ['search_signals', 'updated_at', *CATEGORIES, *AMENITIES, *NUMBERS.values()]
+        UserSearchPreference.objects.bulk_update(prefs, fields)
+
+    for user_id in batch:
+        if in_background:
+            schedule_user_refresh(user_id)
+        else:
+            refresh_user_recommendations(user_id)
+
+
+def flush_signals(in_background=True):
+    """
+    Write out whatever the buffer holds. Safe to call from any thread; if the
+    write fails the batch goes back into the buffer and is retried later.
+    """
+    batch = search_buffer.drain()
+    if not batch:
+        return
+    close_old_connections()
+    try:
+        apply_signals(batch, in_background)
+    except Exception as e:
+        logger.error(f"Flushing search signals for {len(batch)} tenant(s) failed, will retry: {str(e)}")
+        search_buffer.requeue(batch)
+        search_buffer.schedule(max(settings.SEARCH_PREFERENCE_FLUSH_SECONDS, 1), flush_signals)
+    finally:
+        close_old_connections()
+
+
+def record_search(user_id, params):
+    """
+    Learn from a tenant's room search without writing on the request: a full
+    buffer (or SEARCH_PREFERENCE_FLUSH_SECONDS of 0) only moves the background
+    flush up to now.
+    """
+    signal = search_signal(params)
+    if signal is None:
+        return
+    pending = search_buffer.add(user_id, signal)
+    if settings.SEARCH_PREFERENCE_FLUSH_SECONDS <= 0 or pending >= settings.SEARCH_PREFERENCE_FLUSH_MAX:
+        search_buffer.schedule(0, flush_signals)
+    else:
+        search_buffer.schedule(settings.SEARCH_PREFERENCE_FLUSH_SECONDS, flush_signals)
+
+
+# Executors refuse new jobs once the interpreter is shutting down, so the
+# last flush refreshes recommendations inline
+atexit.register(flush_signals, in_background=False)
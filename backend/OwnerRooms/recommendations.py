@@ -0,0 +1,285 @@
+import heapq
+import logging
+import math
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .search_cache import invalidate_user_results
+
+logger = logging.getLogger(__name__)
+
+# Amenities a tenant can prefer; each one maps to a bit in the feature mask
+AMENITIES = ('wifi', 'ac', 'tv', 'cctv', 'furnished')
+
+# Score weights: a text location match and full proximity are worth the most
+LOCATION_WEIGHT = 2.0
+DISTANCE_WEIGHT = 2.0
+DISTANCE_RANGE_KM = 10.0
+GENDER_WEIGHT = 1.0
+ROOM_TYPE_WEIGHT = 1.0
+AMENITY_WEIGHT = 1.0
+PRICE_WEIGHT = 1.5
+
+RoomFeatures = namedtuple('RoomFeatures', 'id mask price room_type gender lat lng location created')
+PreferenceFeatures = namedtuple('PreferenceFeatures', 'mask min_price max_price room_type gender lat lng location')
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='room-recommendations')
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def _mask(obj):
+    return sum(1 << i for i, name in enumerate(AMENITIES) if getattr(obj, name, False))
+
+
+def load_room_features(room_ids=None):
+    """Feature rows for every Available room (or just `room_ids`), read in one query."""
+    from .models import Room
+    queryset = Room.objects.filter(status='Available')
+    if room_ids is not None:
+        queryset = queryset.filter(id__in=room_ids)
+    rows = queryset.values_list(
+        'id', *AMENITIES, 'price', 'room_type', 'gender_preference', 'latitude', 'longitude', 'location', 'created_at'
+    )
+    features = []
+    for row in rows.iterator():
+        room_id, flags, rest = row[0], row[1:1 + len(AMENITIES)], row[1 + len(AMENITIES):]
+        price, room_type, gender, lat, lng, location, created = rest
+        features.append(RoomFeatures(
+            room_id,
+            sum(1 << i for i, flag in enumerate(flags) if flag),
+            float(price),
+            room_type,
+            gender,
+            _float(lat),
+            _float(lng),
+            (location or '').lower(),
+            created.timestamp(),
+        ))
+    return features
+
+
+def preference_features(pref):
+    return PreferenceFeatures(
+        _mask(pref),
+        _float(pref.min_price),
+        _float(pref.max_price),
+        pref.room_type or None,
+        pref.gender_preference if pref.gender_preference and pref.gender_preference != 'Any' else None,
+        _float(pref.latitude),
+        _float(pref.longitude),
+        (pref.location or '').lower() or None,
+    )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def score_room(pref, room):
+    """How well one room matches a tenant's preferences; 0 means nothing matches."""
+    score = AMENITY_WEIGHT * bin(pref.mask & room.mask).count('1')
+
+    if pref.location and pref.location in room.location:
+        score += LOCATION_WEIGHT
+    if pref.lat is not None and pref.lng is not None and room.lat is not None and room.lng is not None:
+        distance = haversine_km(pref.lat, pref.lng, room.lat, room.lng)
+        score += DISTANCE_WEIGHT * max(0.0, 1 - distance / DISTANCE_RANGE_KM)
+    if pref.gender and room.gender in (pref.gender, 'Any'):
+        score += GENDER_WEIGHT
+    if pref.room_type and room.room_type == pref.room_type:
+        score += ROOM_TYPE_WEIGHT
+
+    if pref.min_price is not None or pref.max_price is not None:
+        low = pref.min_price or 0.0
+        high = pref.max_price if pref.max_price is not None else math.inf
+        if low <= room.price <= high:
+            score += PRICE_WEIGHT
+        else:
+            # Partial credit that fades out once the price is 50% outside the band
+            edge = low if room.price < low else high
+            gap = abs(room.price - edge) / max(edge, 1.0)
+            score += PRICE_WEIGHT * max(0.0, 1 - 2 * gap)
+    return score
+
+
+def top_k(pref, rooms, k=None):
+    """[[room_id, score], ...] for the k best matching rooms; newer rooms win ties."""
+    k = k or settings.ROOM_RECOMMENDATION_TOP_K
+    scored = ((score_room(pref, room), room.created, room.id) for room in rooms)
+    best = heapq.nlargest(k, (item for item in scored if item[0] > 0))
+    return [[room_id, round(score, 3)] for score, _, room_id in best]
+
+
+def score_bound(room):
+    """The highest score any tenant's preferences could give `room`."""
+    bound = AMENITY_WEIGHT * bin(room.mask).count('1') + PRICE_WEIGHT
+    if room.location:
+        bound += LOCATION_WEIGHT
+    if room.lat is not None and room.lng is not None:
+        bound += DISTANCE_WEIGHT
+    if room.gender:
+        bound += GENDER_WEIGHT
+    if room.room_type:
+        bound += ROOM_TYPE_WEIGHT
+    return bound
+
+
+def recommendation_columns(scores):
+    """A top-K list and the lookup columns stored beside it."""
+    full = len(scores) >= settings.ROOM_RECOMMENDATION_TOP_K
+    return {
+        'scores': scores,
+        'listed_rooms': f",{','.join(str(room_id) for room_id, _ in scores)}," if scores else '',
+        'min_score': scores[-1][1] if full else 0,
+    }
+
+
+def refresh_user_recommendations(user_id, rooms=None):
+    """
+    Recompute one tenant's top-K. Pass `rooms` to reuse features across many users.
+    A tenant without preferences gets an empty list stored, so it isn't recomputed
+    on every request; saving a preference schedules the real one.
+    """
+    from .models import RoomRecommendation, UserSearchPreference
+    pref = UserSearchPreference.objects.filter(user_id=user_id).first()
+    if pref is None:
+        RoomRecommendation.objects.update_or_create(user_id=user_id, defaults=recommendation_columns([]))
+        return []
+    scores = top_k(preference_features(pref), rooms if rooms is not None else load_room_features())
+    RoomRecommendation.objects.update_or_create(user_id=user_id, defaults=recommendation_columns(scores))
+    return scores
+
+
+def active_tenant_ids():
+    """Tenants with preferences who logged in or searched within ROOM_RECOMMENDATION_ACTIVE_DAYS."""
+    from .models import UserSearchPreference
+    cutoff = timezone.now() - timedelta(days=settings.ROOM_RECOMMENDATION_ACTIVE_DAYS)
+    return UserSearchPreference.objects.filter(
+        user__role='Tenant',
+        user__is_active=True
+    ).filter(
+        Q(user__last_login__gte=cutoff) | Q(updated_at__gte=cutoff)
+    ).values_list('user_id', flat=True)
+
+
+def refresh_all_recommendations(user_ids=None):
+    """Rebuild top-K for every active tenant, loading room features only once."""
+    rooms = load_room_features()
+    count = 0
+    for user_id in (user_ids if user_ids is not None else active_tenant_ids()):
+        refresh_user_recommendations(user_id, rooms)
+        count += 1
+    return count
+
+
+def apply_room_change(room_id):
+    """
+    Fold one created/updated/removed room into the stored top-Ks without a
+    full rebuild. Only lists that hold the room, or whose lowest score the
+    room could beat, are loaded; only users whose full list loses a room are
+    rescanned.
+    """
+    from .models import Room, RoomRecommendation
+
+    changed = load_room_features([room_id])
+    room = changed[0] if changed else None
+    k = settings.ROOM_RECOMMENDATION_TOP_K
+    all_rooms = None
+    updated = []
+
+    affected = Q(listed_rooms__contains=f',{room_id},')
+    if room:
+        affected |= Q(min_score__lte=round(score_bound(room), 3))
+    # Empty lists stored for tenants without preferences never take a room
+    recs = list(
+        RoomRecommendation.objects.filter(affected, user__search_preference__isnull=False)
+        .select_related('user__search_preference')
+    )
+
+    # Ties rank newer rooms first, as in top_k
+    listed = {entry[0] for rec in recs for entry in rec.scores} - {room_id}
+    created = {
+        listed_id: created_at.timestamp()
+        for listed_id, created_at in Room.objects.filter(id__in=listed).values_list('id', 'created_at')
+    }
+    if room:
+        created[room_id] = room.created
+    rank = lambda entry: (entry[1], created.get(entry[0], 0), entry[0])
+
+    for rec in recs:
+        pref = getattr(rec.user, 'search_preference', None)
+        if pref is None:
+            continue
+        entries = [entry for entry in rec.scores if entry[0] != room_id]
+        was_listed = len(entries) != len(rec.scores)
+        score = score_room(preference_features(pref), room) if room else 0
+
+        full = len(rec.scores) >= k
+        if was_listed and full and score < rec.scores[-1][1]:
+            # The room dropped out of (or below) a full list; the next best room
+            # is unknown without a rescan
+            if all_rooms is None:
+                all_rooms = load_room_features()
+            entries = top_k(preference_features(pref), all_rooms, k)
+        elif score > 0:
+            entries.append([room_id, round(score, 3)])
+            entries.sort(key=rank, reverse=True)
+            entries = entries[:k]
+
+        if entries != rec.scores:
+            for field, value in recommendation_columns(entries).items():
+                setattr(rec, field, value)
+            rec.computed_at = timezone.now()
+            updated.append(rec)
+
+    RoomRecommendation.objects.bulk_update(updated, ['scores', 'listed_rooms', 'min_score', 'computed_at'])
+    for rec in updated:
+        invalidate_user_results(rec.user_id)
+    return len(updated)
+
+
+def recommended_room_ids(user):
+    """
+    Cached top-K room ids for a tenant. The first request computes them in the
+    background and gets an empty list (callers fall back to recent rooms).
+    """
+    from .models import RoomRecommendation
+    rec = RoomRecommendation.objects.filter(user=user).first()
+    if rec is not None:
+        return rec.room_ids
+    schedule_user_refresh(user.id)
+    return []
+
+
+def recommended_rooms(user, limit):
+    """Up to `limit` Available rooms in recommendation order (may be empty)."""
+    from .models import Room
+    ids = recommended_room_ids(user)
+    rooms = Room.objects.filter(status='Available').in_bulk(ids)
+    return [rooms[room_id] for room_id in ids if room_id in rooms][:limit]
+
+
+def _run(job, *args):
+    try:
+        job(*args)
+    except Exception as e:
+        logger.error(f"Recommendation update {job.__name__}{args} failed: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_room_update(room_id):
+    transaction.on_commit(lambda: _executor.submit(_run, apply_room_change, room_id))
+
+
+def schedule_user_refresh(user_id):
+    transaction.on_commit(lambda: _executor.submit(_run, refresh_user_recommendations, user_id))
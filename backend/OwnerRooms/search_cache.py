@@ -0,0 +1,69 @@
+import hashlib
+from django.conf import settings
+from stayspot.cache import count_metric, get_or_build, invalidate_tags
+
+# Search results are stored as ordered room id lists keyed by the normalized query;
+# room payloads come from OwnerRooms.payload_cache. A room change to any column a
+# search filters or sorts on bumps the shared 'rooms' tag every search key carries;
+# booking changes only bump the 'room-bookings' tag of date-filtered searches.
+METRICS = ('search_hit', 'search_miss')
+SEARCH_FIELDS = (
+    'owner_id', 'status', 'location', 'room_type', 'gender_preference', 'price', 'latitude', 'longitude',
+    'wifi', 'ac', 'tv', 'cctv', 'parking', 'attached_bathroom', 'water_supply',
+    'kitchen_access', 'furnished', 'created_at',
+)
+AVAILABILITY_PARAMS = ('available_from', 'available_to')
+
+# Params that only shape the payload or the client, never the result set
+IGNORED_PARAMS = {'format', '_', 'fields', 'exclude', 'expand'}
+
+
+def normalize_params(params):
+    """Stable, order-independent form of the search query (empty values dropped)."""
+    items = []
+    for key in sorted(params.keys()):
+        if key in IGNORED_PARAMS:
+            continue
+        values = sorted(value.strip().lower() for value in params.getlist(key) if value.strip())
+        if values:
+            items.append(f"{key}={','.join(values)}")
+    return '&'.join(items)
+
+
+def search_key(request, personalized):
+    """
+    Cache key and tags for a room list: role, the owner's or tenant's id where
+    the result is user-specific, and the normalized query.
+    """
+    user = request.user
+    scope, tags = user.role, ['rooms']
+    if user.role == 'Owner' or personalized:
+        scope = f"{user.role}:{user.id}"
+        tags.append(f'user-rooms:{user.id}')
+    if any(request.query_params.get(param) for param in AVAILABILITY_PARAMS):
+        tags.append('room-bookings')
+    query = hashlib.sha1(normalize_params(request.query_params).encode()).hexdigest()
+    return f"rooms:search:{scope}:{query}", tags
+
+
+def cached_room_ids(request, personalized, build):
+    """Ordered room ids for this search; build() (a queryset of ids) runs once per miss."""
+    key, tags = search_key(request, personalized)
+    ids, hit = get_or_build(key, lambda: list(build()), settings.ROOM_SEARCH_CACHE_SECONDS, tags=tags)
+    count_metric('search_hit' if hit else 'search_miss')
+    return ids
+
+
+def invalidate_search_results():
+    """A room was created, removed or changed in a searched column: drop every cached result list."""
+    invalidate_tags('rooms')
+
+
+def invalidate_availability_results():
+    """A booking changed: drop the result lists filtered by available dates."""
+    invalidate_tags('room-bookings')
+
+
+def invalidate_user_results(user_id):
+    """A tenant's recommendations changed: drop their personalized result lists."""
+    invalidate_tags(f'user-rooms:{user_id}')
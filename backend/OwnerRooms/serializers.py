@@ -1,26 +1,77 @@
 from rest_framework import serializers
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.manager import BaseManager
 from .models import Room, RoomImage, Booking, Visit, RoomReview, Complaint
+from .images import schedule_image_processing
+from .payload_cache import RELATIONS, room_payloads
 from accounts.models import User
+from stayspot.sparse_fields import SparseFieldsMixin, selected_columns
 from chat.serializers import MessageSerializer
 from payments.models import Payment
 from payments.serializers import PaymentSerializer
 # PaymentSerializer imported locally in TenantDashboardSerializer
 
-class RoomImageSerializer(serializers.ModelSerializer):
+class RoomImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = RoomImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'uploaded_at', 'width', 'height', 'blurhash', 'variants', 'srcset']
+        field_dependencies = {'variants': ['variants'], 'srcset': ['variants']}
+
+    def _url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_variants(self, obj):
+        # {"card": {"width": 400, "height": 300, "webp": url, "jpeg": url}, ...}; empty until processed
+        return {
+            variant: {
+                'width': meta['width'],
+                'height': meta['height'],
+                'webp': self._url(meta['webp']),
+                'jpeg': self._url(meta['jpeg']),
+            }
+            for variant, meta in (obj.variants or {}).items()
+        }
+
+    def get_srcset(self, obj):
+        # Ready for <source srcset> / <img srcset>: "url 400w, url 1024w, ..."
+        if not obj.variants:
+            return {}
+        ordered = sorted(obj.variants.values(), key=lambda meta: meta['width'])
+        return {
+            fmt: ', '.join(f"{self._url(meta[fmt])} {meta['width']}w" for meta in ordered)
+            for fmt in ('webp', 'jpeg')
+        }
 
 
 # User serializer for nested data
-class UserBasicSerializer(serializers.ModelSerializer):
+class UserBasicSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'full_name', 'email', 'phone', 'role', 'profile_photo', 'identity_document', 'is_identity_verified']
 
 
 
-class RoomSerializer(serializers.ModelSerializer):
+class RoomListSerializer(serializers.ListSerializer):
+    """Room lists read every cached payload with one multi-get and serialize only the misses."""
+
+    def to_representation(self, data):
+        rooms = list(data.all() if isinstance(data, BaseManager) else data)
+        if self.child.sparse:
+            # Prefetch just the relations the kept fields read (all of them if that can't be told)
+            columns = selected_columns(self.child, Room)
+            prefetch_related_objects(rooms, *[name for name in RELATIONS if columns is None or name in columns])
+            return [self.child.build_representation(room) for room in rooms]
+        payloads = room_payloads(rooms, self.context, self.child.build_representation)
+        return [payloads[room.id] for room in rooms]
+
+
+class RoomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     images = RoomImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
         child=serializers.ImageField(),
@@ -46,6 +97,18 @@ class RoomSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'views', 'created_at', 'updated_at']
+        list_serializer_class = RoomListSerializer
+        field_dependencies = {'average_rating': ['reviews'], 'review_count': ['reviews']}
+
+    def build_representation(self, instance):
+        """Serialize without the payload cache."""
+        return super().to_representation(instance)
+
+    def to_representation(self, instance):
+        if self.sparse:
+            # Cached payloads hold every field; a pruned one is cheaper to build directly
+            return self.build_representation(instance)
+        return room_payloads([instance], self.context, self.build_representation)[instance.id]
     
     def get_average_rating(self, obj):
         reviews = obj.reviews.all()
@@ -60,8 +123,8 @@ class RoomSerializer(serializers.ModelSerializer):
         uploaded_images = validated_data.pop('uploaded_images', [])
         room = Room.objects.create(**validated_data)
         
-        for image in uploaded_images:
-            RoomImage.objects.create(room=room, image=image)
+        created = [RoomImage.objects.create(room=room, image=image) for image in uploaded_images]
+        schedule_image_processing(image.id for image in created)
         
         return room
     
@@ -72,27 +135,107 @@ class RoomSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         
-        for image in uploaded_images:
-            RoomImage.objects.create(room=instance, image=image)
+        created = [RoomImage.objects.create(room=instance, image=image) for image in uploaded_images]
+        schedule_image_processing(image.id for image in created)
         
         return instance
 
 
-class RoomReviewSerializer(serializers.ModelSerializer):
+class OwnerSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'full_name', 'profile_photo']
+
+
+class RoomSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Compact room for nested use: no amenities, review aggregates or image gallery."""
+    owner = OwnerSummarySerializer(read_only=True)
+    cover_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Room
+        fields = ['id', 'title', 'location', 'price', 'status', 'owner', 'cover_image']
+        field_dependencies = {'cover_image': ['images']}
+
+    def get_cover_image(self, obj):
+        # Uses prefetched images when present, else loads just the first one
+        if 'images' in getattr(obj, '_prefetched_objects_cache', {}):
+            image = next(iter(obj.images.all()), None)
+        else:
+            image = obj.images.first()
+        return RoomImageSerializer(image, context=self.context).data if image else None
+
+
+def expand_room(context):
+    """True when the request asked for full nested rooms (?expand=room)."""
+    params = getattr(context.get('request'), 'query_params', {})
+    return 'room' in params.get('expand', '').split(',')
+
+
+class NestedRoomField(serializers.Field):
+    """Read-only nested room: RoomSummarySerializer, or the full RoomSerializer with ?expand=room."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        self.summary = RoomSummarySerializer()
+        self.full = RoomSerializer()
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        self.summary.bind(field_name, parent)
+        self.full.bind(field_name, parent)
+
+    def to_representation(self, room):
+        if expand_room(self.context):
+            return self.full.to_representation(room)
+        return self.summary.to_representation(room)
+
+
+class NestedRoomListSerializer(serializers.ListSerializer):
+    """
+    For models with a NestedRoomField `room`: load the nested users and rooms
+    (with owners and images for summaries, or cached payloads when expanded)
+    in bulk before the items are serialized.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        users = [name for name, field in self.child.fields.items() if isinstance(field, UserBasicSerializer)]
+        prefetch_related_objects(items, *users)
+        if 'room' in self.child.fields:
+            self.prefetch_rooms(items)
+        return super().to_representation(items)
+
+    def prefetch_rooms(self, items):
+        if expand_room(self.context):
+            prefetch_related_objects(items, 'room')
+            rooms = [item.room for item in items if item.room_id]
+            room_payloads(rooms, self.context, RoomSerializer(context=self.context).build_representation)
+        else:
+            prefetch_related_objects(
+                items,
+                Prefetch('room', queryset=Room.objects.select_related('owner')),
+                'room__images'
+            )
+
+
+class RoomReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tenant = UserBasicSerializer(read_only=True)
-    room = RoomSerializer(read_only=True)
+    room = NestedRoomField()
     
     class Meta:
         model = RoomReview
         fields = ['id', 'tenant', 'room', 'rating', 'comment', 'created_at']
         read_only_fields = ['id', 'tenant', 'created_at']
+        list_serializer_class = NestedRoomListSerializer
 
 
 # User serializer for nested data
 # Booking serializers
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tenant = UserBasicSerializer(read_only=True)
-    room = RoomSerializer(read_only=True)
+    room = NestedRoomField()
     room_id = serializers.PrimaryKeyRelatedField(
         queryset=Room.objects.all(), 
         source='room', 
@@ -106,13 +249,21 @@ class BookingSerializer(serializers.ModelSerializer):
             'monthly_rent', 'status', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = NestedRoomListSerializer
+
+    def validate(self, data):
+        start = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if start and end and end < start:
+            raise serializers.ValidationError({"error": "End date cannot be before the start date."})
+        return data
 
 
 # Visit serializers
-class VisitSerializer(serializers.ModelSerializer):
+class VisitSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tenant = UserBasicSerializer(read_only=True)
     owner = UserBasicSerializer(read_only=True)
-    room = RoomSerializer(read_only=True)
+    room = NestedRoomField()
     room_id = serializers.PrimaryKeyRelatedField(
         queryset=Room.objects.all(), 
         source='room', 
@@ -131,6 +282,7 @@ class VisitSerializer(serializers.ModelSerializer):
             'visit_date', 'visit_time', 'purpose', 'notes', 'status', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = NestedRoomListSerializer
 
     def validate(self, data):
         # Only validate on creation
@@ -164,7 +316,7 @@ class VisitSerializer(serializers.ModelSerializer):
 
 
 # Dashboard aggregated serializer
-class TenantDashboardSerializer(serializers.Serializer):
+class TenantDashboardSerializer(SparseFieldsMixin, serializers.Serializer):
     upcoming_visit = VisitSerializer(allow_null=True)
     current_booking = BookingSerializer(allow_null=True)
     payment_reminders = PaymentSerializer(many=True)
@@ -172,7 +324,7 @@ class TenantDashboardSerializer(serializers.Serializer):
     suggested_rooms = RoomSerializer(many=True)
 
 
-class ComplaintSerializer(serializers.ModelSerializer):
+class ComplaintSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tenant = UserBasicSerializer(read_only=True)
     owner = UserBasicSerializer(read_only=True)
     owner_id = serializers.PrimaryKeyRelatedField(
@@ -181,7 +333,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
-    room = RoomSerializer(read_only=True)
+    room = NestedRoomField()
     room_id = serializers.PrimaryKeyRelatedField(
         queryset=Room.objects.all(), 
         source='room', 
@@ -197,4 +349,5 @@ class ComplaintSerializer(serializers.ModelSerializer):
             'complaint_type', 'priority', 'description', 'image', 'status', 
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'tenant', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'tenant', 'created_at', 'updated_at']
+        list_serializer_class = NestedRoomListSerializer
\ No newline at end of file
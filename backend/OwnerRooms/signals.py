@@ -0,0 +1,117 @@
+from decimal import Decimal
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Booking, Room, RoomImage, RoomRecommendation, RoomReview, UserSearchPreference
+from .map_clusters import schedule_cell_refresh
+from .vector_tiles import schedule_tile_invalidation
+from .images import variant_names
+from .recommendations import schedule_room_update, schedule_user_refresh
+from .payload_cache import invalidate_room_images, invalidate_room_rating
+from .search_cache import SEARCH_FIELDS, invalidate_availability_results, invalidate_search_results, invalidate_user_results
+
+
+# Keep precomputed recommendations current without a full rebuild
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_changed(sender, instance, created=False, **kwargs):
+    # Cached payloads are keyed by updated_at, so only result lists need dropping,
+    # and only when a column searches filter or sort on may have changed
+    if kwargs['signal'] is post_delete or created or _changed(instance, SEARCH_FIELDS):
+        invalidate_search_results()
+    schedule_room_update(instance.id)
+
+
+@receiver(post_save, sender=UserSearchPreference)
+def preference_changed(sender, instance, **kwargs):
+    schedule_user_refresh(instance.user_id)
+
+
+# Cached search results and room payloads
+
+@receiver(post_save, sender=RoomImage)
+@receiver(post_delete, sender=RoomImage)
+def room_images_changed(sender, instance, **kwargs):
+    invalidate_room_images(instance.room_id)
+
+
+@receiver(post_save, sender=RoomReview)
+@receiver(post_delete, sender=RoomReview)
+def room_reviews_changed(sender, instance, **kwargs):
+    invalidate_room_rating(instance.room_id)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    # Only available_from/available_to searches depend on confirmed booking dates
+    invalidate_availability_results()
+
+
+@receiver(post_save, sender=RoomRecommendation)
+@receiver(post_delete, sender=RoomRecommendation)
+def recommendation_changed(sender, instance, **kwargs):
+    invalidate_user_results(instance.user_id)
+
+
+# Map clusters and vector tiles: refresh the cells and tiles a room leaves and enters
+
+MAP_FIELDS = ('latitude', 'longitude', 'status', 'price')
+
+
+def _state(values, fields):
+    # Decimal() so 27.67 and Decimal('27.670000') compare equal
+    return tuple(
+        Decimal(str(value)) if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) else value
+        for value in (values[field] for field in fields)
+    )
+
+
+def _changed(instance, fields):
+    """Whether a save may have changed any of `fields` (True when the old values aren't known)."""
+    loaded = getattr(instance, '_loaded_values', {})
+    if not all(field in loaded for field in fields):
+        return True
+    return _state(loaded, fields) != _state({field: getattr(instance, field) for field in fields}, fields)
+
+
+@receiver(pre_save, sender=Room)
+def remember_map_position(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if instance.pk is None:
+        instance._map_before = None
+    elif all(field in loaded for field in MAP_FIELDS):
+        instance._map_before = {field: loaded[field] for field in MAP_FIELDS}
+    else:
+        # Built by hand or loaded without these columns: read them
+        instance._map_before = Room.objects.filter(pk=instance.pk).values(*MAP_FIELDS).first()
+
+
+@receiver(post_save, sender=Room)
+def room_map_changed(sender, instance, **kwargs):
+    before = getattr(instance, '_map_before', None)
+    after = {field: getattr(instance, field) for field in MAP_FIELDS}
+    if before is not None and _state(before, MAP_FIELDS) == _state(after, MAP_FIELDS):
+        return
+    positions = [(instance.latitude, instance.longitude)]
+    if before is not None:
+        positions.append((before['latitude'], before['longitude']))
+    schedule_cell_refresh(positions)
+    schedule_tile_invalidation(positions)
+
+
+@receiver(post_delete, sender=Room)
+def room_map_removed(sender, instance, **kwargs):
+    schedule_cell_refresh([(instance.latitude, instance.longitude)])
+    schedule_tile_invalidation([(instance.latitude, instance.longitude)])
+
+
+# Stored media: drop the deleted image's references to its original and variants
+# (a signal rather than RoomImage.delete(), so queryset and cascade deletes count too)
+
+@receiver(post_delete, sender=RoomImage)
+def release_room_image_files(sender, instance, **kwargs):
+    for name in [instance.image.name, *variant_names(instance.variants)]:
+        if name:
+            default_storage.delete(name)
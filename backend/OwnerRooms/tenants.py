@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db.models import Count, OuterRef, Q, Subquery
+from payments.models import Payment
+from .models import Booking, Complaint
+
+LEASE_STATUSES = ('Active', 'Confirmed')
+
+
+def active_leases(owner):
+    return Booking.objects.filter(room__owner=owner, status__in=LEASE_STATUSES)
+
+
+def directory_stats(owner):
+    """Directory header stats: one aggregate over the leases plus the rent and maintenance counts."""
+    stats = active_leases(owner).aggregate(
+        total_tenants=Count('tenant', distinct=True),
+        active_leases=Count('id'),
+    )
+    stats['pending_rent'] = Payment.objects.filter(booking__room__owner=owner, status='Pending').count()
+    stats['maintenance_requests'] = Complaint.objects.filter(
+        owner=owner, complaint_type='Maintenance', status='Pending'
+    ).count()
+    return stats
+
+
+def directory_page(owner, search=None, room=None, page=1, page_size=None):
+    """
+    One page of the owner's leases, most recently booked first, each annotated with
+    `rent_status` (its latest payment's status) in the same query.
+    `search` matches tenant names and emails, `room` a room title.
+    Returns (bookings, total matching).
+    """
+    page_size = page_size or settings.OWNER_TENANTS_PAGE_SIZE
+    leases = active_leases(owner)
+    if search:
+        leases = leases.filter(Q(tenant__full_name__icontains=search) | Q(tenant__email__icontains=search))
+    if room:
+        leases = leases.filter(room__title=room)
+
+    latest_payment = Payment.objects.filter(booking=OuterRef('pk')).order_by('-due_date', '-id')
+    bookings = (
+        leases.select_related('tenant', 'room')
+        .annotate(rent_status=Subquery(latest_payment.values('status')[:1]))
+        .order_by('-created_at', '-id')
+    )
+    offset = (max(page, 1) - 1) * page_size
+    return list(bookings[offset:offset + page_size]), leases.count()
+
+
+def directory_rooms(owner):
+    """Titles of the owner's rooms that have a lease, for the property filter."""
+    return list(active_leases(owner).order_by('room__title').values_list('room__title', flat=True).distinct())
@@ -1,8 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 from datetime import date, timedelta
 from accounts.models import User
-from .models import Room, Booking, Visit, RoomReview, Complaint
+from .models import Room, RoomImage, Booking, Visit, RoomReview, Complaint
+from .serializers import RoomImageSerializer
 
 class RoomModelTests(TestCase):
     """
@@ -351,3 +352,1564 @@ class GoogleMapIntegrationTests(TestCase):
         titles = [r['title'] for r in response.json()]
         self.assertNotIn('No Coord Room', titles)
         print("[RESULT]: SUCCESS - Room without coordinates correctly excluded from map search.")
+
+
+class RoomImagePipelineTests(TestCase):
+    """
+    UNIT TESTS — Room Image Pipeline
+    Tests responsive variants, EXIF stripping, blurhash and srcset output.
+    """
+    def setUp(self):
+        import io
+        import tempfile
+        from PIL import Image
+        from django.test import override_settings
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.tmp.name)
+        self.settings_override.enable()
+
+        self.owner = User.objects.create_user(
+            username='img_owner@gmail.com', email='img_owner@gmail.com', password='123', role='Owner'
+        )
+        self.room = Room.objects.create(owner=self.owner, title='Photo Room', location='Loc', price=5000)
+
+        exif = Image.Exif()
+        exif[0x010F] = 'CameraMaker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (2000, 1500), color=(40, 120, 200)).save(buffer, format='JPEG', exif=exif)
+        self.image = RoomImage.objects.create(
+            room=self.room,
+            image=SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def test_process_room_image_builds_variants(self):
+        """Processing should store dimensions, blurhash and card/detail/full variants."""
+        print("\n[RUNNING]: test_process_room_image_builds_variants")
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        from .images import process_room_image
+        process_room_image(self.image.id)
+        self.image.refresh_from_db()
+
+        self.assertEqual((self.image.width, self.image.height), (2000, 1500))
+        self.assertEqual(len(self.image.blurhash), 28)
+        self.assertEqual(set(self.image.variants), {'card', 'detail', 'full'})
+        self.assertEqual(self.image.variants['card']['width'], 400)
+        # Full variant is never upscaled past the original
+        self.assertEqual(self.image.variants['full']['width'], 1920)
+        with default_storage.open(self.image.variants['card']['jpeg']) as f:
+            self.assertEqual(len(Image.open(f).getexif()), 0)
+        self.assertIsNotNone(self.image.processed_at)
+        print("[RESULT]: SUCCESS - Variants, dimensions and blurhash stored.")
+
+    def test_original_is_replaced_without_exif(self):
+        """The served original should be a re-encoded copy without EXIF, and the upload's blob released."""
+        print("\n[RUNNING]: test_original_is_replaced_without_exif")
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        from mediastore.models import MediaBlob
+        from .images import process_room_image
+        uploaded = self.image.image.name
+        process_room_image(self.image.id)
+        self.image.refresh_from_db()
+
+        self.assertNotEqual(self.image.image.name, uploaded)
+        with default_storage.open(self.image.image.name) as f:
+            stored = Image.open(f)
+            self.assertEqual((stored.format, stored.size), ('JPEG', (2000, 1500)))
+            self.assertEqual(len(stored.getexif()), 0)
+        self.assertTrue(RoomImageSerializer(self.image).data['image'].endswith(self.image.image.name))
+        self.assertEqual(MediaBlob.objects.get(name=uploaded).ref_count, 0)
+
+        # A clean original is kept as it is when reprocessed
+        stripped = self.image.image.name
+        process_room_image(self.image.id)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.image.name, stripped)
+        self.assertEqual(MediaBlob.objects.get(name=stripped).ref_count, 1)
+        print("[RESULT]: SUCCESS - Original re-encoded without EXIF.")
+
+    def test_stored_original_has_no_gps_exif_or_xmp(self):
+        """A phone photo's GPS position, in EXIF or XMP, must not survive into the stored original."""
+        print("\n[RUNNING]: test_stored_original_has_no_gps_exif_or_xmp")
+        import io
+        from PIL import ExifTags, Image
+        from django.core.files.storage import default_storage
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .images import process_room_image
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        exif.get_ifd(ExifTags.IFD.GPSInfo).update({1: 'N', 2: (27.0, 42.0, 0.0), 3: 'E', 4: (85.0, 19.0, 0.0)})
+        xmp = (
+            b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+            b'<rdf:Description xmlns:exif="http://ns.adobe.com/exif/1.0/" exif:GPSLatitude="27,42.0N"/>'
+            b'</rdf:RDF></x:xmpmeta>'
+        )
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), color=(90, 60, 30)).save(buffer, format='JPEG', exif=exif, xmp=xmp)
+        image = RoomImage.objects.create(
+            room=self.room, image=SimpleUploadedFile('gps.jpg', buffer.getvalue(), content_type='image/jpeg')
+        )
+        process_room_image(image.id)
+        image.refresh_from_db()
+
+        with default_storage.open(image.image.name) as f:
+            data = f.read()
+        stored = Image.open(io.BytesIO(data))
+        self.assertEqual(len(stored.getexif()), 0)
+        self.assertNotIn('exif', stored.info)
+        self.assertNotIn('xmp', stored.info)
+        self.assertNotIn(b'GPSLatitude', data)
+        print("[RESULT]: SUCCESS - GPS EXIF and XMP stripped from the original.")
+
+    def test_serializer_returns_srcset(self):
+        """RoomImageSerializer should expose srcset strings ordered by width."""
+        print("\n[RUNNING]: test_serializer_returns_srcset")
+        from .images import process_room_image
+        process_room_image(self.image.id)
+        self.image.refresh_from_db()
+        data = RoomImageSerializer(self.image).data
+        self.assertIn('400w', data['srcset']['webp'])
+        self.assertTrue(data['srcset']['jpeg'].index('400w') < data['srcset']['jpeg'].index('1920w'))
+        self.assertTrue(data['variants']['detail']['webp'].endswith('.webp'))
+        print("[RESULT]: SUCCESS - srcset structure returned by serializer.")
+
+
+class BulkRoomImageUploadTests(TestCase):
+    """
+    INTEGRATION TESTS — Bulk Room Image Upload
+    Tests validation before writes, owner-only access and the atomic insert.
+    """
+    def setUp(self):
+        import tempfile
+        from django.test import Client, override_settings
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.tmp.name)
+        self.settings_override.enable()
+
+        self.client = Client()
+        self.owner = User.objects.create_user(
+            username='bulk_owner@gmail.com', email='bulk_owner@gmail.com', password='123',
+            role='Owner', is_identity_verified=True
+        )
+        self.other = User.objects.create_user(
+            username='bulk_other@gmail.com', email='bulk_other@gmail.com', password='123',
+            role='Owner', is_identity_verified=True
+        )
+        self.room = Room.objects.create(owner=self.owner, title='Bulk Room', location='Loc', price=5000)
+        self.url = f'/api/rooms/{self.room.id}/bulk_upload_images/'
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def make_image(self, name, color):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color=color).save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_bulk_upload_creates_all_images(self):
+        """All files should be stored and returned in one response."""
+        print("\n[RUNNING]: test_bulk_upload_creates_all_images")
+        self.client.force_login(self.owner)
+        files = [self.make_image(f'p{i}.png', (i * 40, 10, 10)) for i in range(3)]
+        response = self.client.post(self.url, {'images': files})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(RoomImage.objects.filter(room=self.room).count(), 3)
+        print("[RESULT]: SUCCESS - Three images stored in one request.")
+
+    def test_invalid_file_rejects_whole_batch(self):
+        """One undecodable file should fail the request without storing the others."""
+        print("\n[RUNNING]: test_invalid_file_rejects_whole_batch")
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(self.owner)
+        files = [
+            self.make_image('good.png', (10, 200, 10)),
+            SimpleUploadedFile('broken.png', b'not an image', content_type='image/png'),
+        ]
+        response = self.client.post(self.url, {'images': files})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('broken.png', response.data['errors'])
+        self.assertFalse(RoomImage.objects.filter(room=self.room).exists())
+        print("[RESULT]: SUCCESS - Batch rejected before any write.")
+
+    def test_limits_and_ownership(self):
+        """Oversized files are rejected and only the owner may upload."""
+        print("\n[RUNNING]: test_limits_and_ownership")
+        from django.test import override_settings
+        self.client.force_login(self.owner)
+        with override_settings(ROOM_IMAGE_MAX_FILES=1):
+            files = [self.make_image('a.png', (1, 2, 3)), self.make_image('b.png', (4, 5, 6))]
+            response = self.client.post(self.url, {'images': files})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(self.other)
+        response = self.client.post(self.url, {'images': [self.make_image('c.png', (7, 8, 9))]})
+        self.assertIn(response.status_code, (403, 404))
+        self.assertFalse(RoomImage.objects.filter(room=self.room).exists())
+        print("[RESULT]: SUCCESS - Limits and ownership enforced.")
+
+    def test_failed_write_keeps_no_rows(self):
+        """If a storage write fails, no RoomImage rows should be committed."""
+        print("\n[RUNNING]: test_failed_write_keeps_no_rows")
+        from unittest import mock
+        from .images import bulk_store_room_images
+        files = [self.make_image('x.png', (9, 9, 9)), self.make_image('y.png', (8, 8, 8))]
+        with mock.patch('OwnerRooms.images._write_file', side_effect=[('ok.png', None, None), OSError('disk full')]):
+            with self.assertRaises(OSError):
+                bulk_store_room_images(self.room, files)
+        self.assertFalse(RoomImage.objects.filter(room=self.room).exists())
+        print("[RESULT]: SUCCESS - Nothing committed after a partial failure.")
+
+    def test_failed_upload_hides_error_details(self):
+        """A storage failure is logged and answered with a generic 500, not the exception text."""
+        print("\n[RUNNING]: test_failed_upload_hides_error_details")
+        from unittest import mock
+        self.client.force_login(self.owner)
+        with mock.patch('OwnerRooms.views.bulk_store_room_images', side_effect=OSError('/srv/media: disk full')):
+            with self.assertLogs('OwnerRooms.views', 'ERROR'):
+                response = self.client.post(self.url, {'images': [self.make_image('z.png', (1, 1, 1))]})
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn('disk full', response.data['error'])
+        print("[RESULT]: SUCCESS - Failure logged, generic error returned.")
+
+
+class RoomViewCountingTests(TestCase):
+    """
+    UNIT TESTS — Room View Counting & Analytics
+    Tests batched `views = views + n` flushes, unique-viewer estimates, the event log and nightly rollups.
+    """
+    def setUp(self):
+        from django.test import Client
+        from .viewcounts import view_buffer
+        view_buffer.drain()
+        self.client = Client()
+        self.owner = User.objects.create_user(
+            username='views_owner@gmail.com', email='views_owner@gmail.com', password='123', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='views_tenant@gmail.com', email='views_tenant@gmail.com', password='123', role='Tenant'
+        )
+        self.room = Room.objects.create(owner=self.owner, title='Viewed Room', location='Loc', price=5000)
+
+    def test_views_are_buffered_until_flush(self):
+        """Views should not touch the row (or updated_at) until the buffer is flushed."""
+        print("\n[RUNNING]: test_views_are_buffered_until_flush")
+        from django.test import override_settings
+        from .models import RoomViewEvent
+        from .viewcounts import flush_views
+        updated_at = self.room.updated_at
+        self.client.force_login(self.tenant)
+        with override_settings(ROOM_VIEW_FLUSH_SECONDS=3600):
+            for _ in range(5):
+                response = self.client.post(f'/api/rooms/{self.room.id}/increment_views/')
+        self.assertEqual(response.data['views'], 5)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.views, 0)
+        self.assertFalse(RoomViewEvent.objects.exists())
+
+        flush_views()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.views, 5)
+        self.assertEqual(self.room.updated_at, updated_at)
+        self.assertEqual(RoomViewEvent.objects.filter(room=self.room, viewer=self.tenant).count(), 5)
+        print("[RESULT]: SUCCESS - Five views written in one flush.")
+
+    def test_full_buffer_flushes_in_background(self):
+        """A full buffer moves the background flush up instead of writing on the request; failed flushes requeue."""
+        print("\n[RUNNING]: test_full_buffer_flushes_in_background")
+        from unittest import mock
+        from django.test import override_settings
+        from .viewcounts import flush_views, record_view, view_buffer
+        with mock.patch.object(view_buffer, 'schedule') as schedule, override_settings(ROOM_VIEW_FLUSH_MAX=5):
+            for _ in range(5):
+                record_view(self.room.id, self.tenant.id)
+            schedule.assert_called_with(0, flush_views)
+            self.room.refresh_from_db()
+            self.assertEqual(self.room.views, 0)
+
+            with mock.patch('OwnerRooms.viewcounts.apply_views', side_effect=RuntimeError('database is locked')):
+                with self.assertLogs('OwnerRooms.viewcounts', 'ERROR'):
+                    flush_views()
+            self.assertEqual(view_buffer.pending(self.room.id), 5)
+
+        flush_views()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.views, 5)
+        print("[RESULT]: SUCCESS - Overflow flushed off the request, failures kept for a retry.")
+
+    def test_unique_viewers_estimated_in_rollup(self):
+        """The rollup's sketch should count repeat viewers once; ROOM_VIEW_UNIQUE off keeps no viewers."""
+        print("\n[RUNNING]: test_unique_viewers_estimated_in_rollup")
+        from unittest import mock
+        from django.test import override_settings
+        from .models import RoomViewEvent
+        from .viewcounts import flush_views, record_view, rollup_daily_stats, view_buffer
+        viewers = User.objects.bulk_create([
+            User(username=f'unique{i}@gmail.com', email=f'unique{i}@gmail.com') for i in range(300)
+        ])
+        with mock.patch.object(view_buffer, 'schedule'):
+            for viewer in viewers[:200] + viewers[100:]:
+                record_view(self.room.id, viewer.id)
+            flush_views()
+        rollup_daily_stats(timezone.localdate())
+        stats = self.room.view_stats.get()
+        self.assertEqual(stats.views, 400)
+        self.assertTrue(285 <= stats.unique_viewers <= 315)
+
+        with mock.patch.object(view_buffer, 'schedule'), override_settings(ROOM_VIEW_UNIQUE=False):
+            record_view(self.room.id, self.tenant.id)
+            flush_views()
+        self.assertEqual(RoomViewEvent.objects.filter(viewer__isnull=True).count(), 1)
+        print("[RESULT]: SUCCESS - Unique viewers estimated within tolerance.")
+
+    def test_view_stats_owner_only(self):
+        """Only the owner (or an admin) can read a room's view stats."""
+        print("\n[RUNNING]: test_view_stats_owner_only")
+        self.client.force_login(self.tenant)
+        response = self.client.get(f'/api/rooms/{self.room.id}/view_stats/')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.owner)
+        response = self.client.get(f'/api/rooms/{self.room.id}/view_stats/')
+        self.assertEqual(response.status_code, 200)
+        print("[RESULT]: SUCCESS - View stats restricted to the owner.")
+
+    def test_rollup_builds_daily_stats(self):
+        """The nightly rollup should count views, unique viewers, visits and bookings per day."""
+        print("\n[RUNNING]: test_rollup_builds_daily_stats")
+        import io
+        from django.core.management import call_command
+        from .models import RoomViewEvent
+        now = timezone.now()
+        viewers = [
+            User.objects.create_user(username=f'viewer{i}@gmail.com', email=f'viewer{i}@gmail.com', password='123')
+            for i in range(3)
+        ]
+        RoomViewEvent.objects.bulk_create(
+            [RoomViewEvent(room=self.room, viewer=viewer, viewed_at=now) for viewer in viewers * 2]
+        )
+        Visit.objects.create(room=self.room, tenant=self.tenant, owner=self.owner,
+                             visit_date=date.today(), visit_time='10:00')
+        Booking.objects.create(room=self.room, tenant=self.tenant, start_date=date.today(),
+                               end_date=date.today() + timedelta(days=30), monthly_rent=5000)
+
+        call_command('rollup_room_stats', date=timezone.localdate().isoformat(), stdout=io.StringIO())
+        stats = self.room.view_stats.get()
+        self.assertEqual((stats.views, stats.unique_viewers, stats.visits, stats.bookings), (6, 3, 1, 1))
+        print("[RESULT]: SUCCESS - Daily rollup stored.")
+
+    def test_analytics_reads_rollups_owner_only(self):
+        """Only the owner (or an admin) can read analytics, which come from the rollups."""
+        print("\n[RUNNING]: test_analytics_reads_rollups_owner_only")
+        from .models import RoomViewStats
+        from .viewcounts import HyperLogLog
+        sketches = [HyperLogLog(), HyperLogLog()]
+        for viewer in range(200):
+            sketches[0].add(viewer)
+        for viewer in range(100, 300):
+            sketches[1].add(viewer)
+        today = timezone.localdate()
+        for offset, sketch in enumerate(sketches):
+            RoomViewStats.objects.create(
+                room=self.room, date=today - timedelta(days=offset + 1), views=200,
+                unique_viewers=sketch.count(), visits=4, bookings=1, sketch=sketch.to_bytes()
+            )
+
+        self.client.force_login(self.tenant)
+        response = self.client.get(f'/api/rooms/{self.room.id}/analytics/')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.owner)
+        response = self.client.get(f'/api/rooms/{self.room.id}/analytics/')
+        self.assertEqual(response.status_code, 200)
+        totals = response.data['totals']
+        self.assertEqual((totals['views'], totals['visits'], totals['bookings']), (400, 8, 2))
+        self.assertEqual(totals['visits_per_view'], 0.02)
+        # Repeat viewers across days are merged, not double counted
+        self.assertTrue(285 <= totals['unique_viewers'] <= 315)
+        self.assertEqual(len(response.data['daily']), 2)
+        print("[RESULT]: SUCCESS - Analytics served from rollups.")
+
+
+class RoomRecommendationTests(TestCase):
+    """
+    UNIT TESTS — Precomputed Room Recommendations
+    Tests preference scoring, incremental top-K updates and cached serving.
+    """
+    def setUp(self):
+        from django.test import Client
+        from .models import UserSearchPreference
+        self.client = Client()
+        self.owner = User.objects.create_user(
+            username='rec_owner@gmail.com', email='rec_owner@gmail.com', password='123', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='rec_tenant@gmail.com', email='rec_tenant@gmail.com', password='123', role='Tenant'
+        )
+        self.pref = UserSearchPreference.objects.create(
+            user=self.tenant, location='Baneshwor', room_type='Single Room', wifi=True,
+            min_price=4000, max_price=6000, latitude=27.6915, longitude=85.3420
+        )
+        self.best = Room.objects.create(
+            owner=self.owner, title='Best', location='New Baneshwor', price=5000, room_type='Single Room',
+            wifi=True, latitude=27.6920, longitude=85.3425
+        )
+        self.partial = Room.objects.create(
+            owner=self.owner, title='Partial', location='Lalitpur', price=5500, wifi=True
+        )
+        self.unrelated = Room.objects.create(
+            owner=self.owner, title='Unrelated', location='Pokhara', price=20000, room_type='Flat'
+        )
+
+    def test_scoring_orders_best_match_first(self):
+        """Closer, cheaper-fitting, amenity-matching rooms should rank first; non-matches are dropped."""
+        print("\n[RUNNING]: test_scoring_orders_best_match_first")
+        from .recommendations import refresh_user_recommendations
+        scores = refresh_user_recommendations(self.tenant.id)
+        self.assertEqual([room_id for room_id, _ in scores], [self.best.id, self.partial.id])
+        print("[RESULT]: SUCCESS - Rooms ranked by preference score.")
+
+    def test_room_changes_update_top_k_incrementally(self):
+        """A room leaving Available drops out; a new matching room is folded in."""
+        print("\n[RUNNING]: test_room_changes_update_top_k_incrementally")
+        from .models import RoomRecommendation
+        from .recommendations import apply_room_change, refresh_user_recommendations
+        refresh_user_recommendations(self.tenant.id)
+
+        Room.objects.filter(id=self.best.id).update(status='Occupied')
+        apply_room_change(self.best.id)
+        newcomer = Room.objects.create(
+            owner=self.owner, title='New', location='Baneshwor Height', price=4500, room_type='Single Room'
+        )
+        apply_room_change(newcomer.id)
+
+        ids = RoomRecommendation.objects.get(user=self.tenant).room_ids
+        self.assertNotIn(self.best.id, ids)
+        self.assertEqual(ids, [newcomer.id, self.partial.id])
+        print("[RESULT]: SUCCESS - Top-K updated without a full rebuild.")
+
+    def test_room_change_only_loads_affected_lists(self):
+        """Lists the room can't enter are never loaded; tied scores rank the newer room first."""
+        print("\n[RUNNING]: test_room_change_only_loads_affected_lists")
+        from unittest import mock
+        from django.test import override_settings
+        from . import recommendations
+        from .models import RoomRecommendation, UserSearchPreference
+        from .recommendations import apply_room_change, refresh_user_recommendations
+        picky = User.objects.create_user(
+            username='rec_picky@gmail.com', email='rec_picky@gmail.com', password='123', role='Tenant'
+        )
+        UserSearchPreference.objects.create(user=picky, location='Pokhara')
+        with override_settings(ROOM_RECOMMENDATION_TOP_K=2):
+            refresh_user_recommendations(self.tenant.id)
+            RoomRecommendation.objects.create(user=picky, scores=[[self.unrelated.id, 9.0], [self.best.id, 9.0]],
+                                              listed_rooms=f',{self.unrelated.id},{self.best.id},', min_score=9.0)
+            twin = Room.objects.create(
+                owner=self.owner, title='Twin', location='New Baneshwor', price=5000, room_type='Single Room',
+                wifi=True, latitude=27.6920, longitude=85.3425
+            )
+            with mock.patch.object(recommendations, 'preference_features', wraps=recommendations.preference_features) as scored:
+                self.assertEqual(apply_room_change(twin.id), 1)
+        # The picky list's lowest score is out of the twin's reach, so it was never scored
+        self.assertEqual(scored.call_count, 1)
+
+        rec = RoomRecommendation.objects.get(user=self.tenant)
+        self.assertEqual(rec.room_ids, [twin.id, self.best.id])
+        self.assertEqual(rec.listed_rooms, f',{twin.id},{self.best.id},')
+        self.assertEqual(rec.min_score, rec.scores[-1][1])
+        print("[RESULT]: SUCCESS - Only affected lists loaded and ties broken by age.")
+
+    def test_suggested_and_dashboard_served_from_cache(self):
+        """Suggestions should come from the stored top-K, in order."""
+        print("\n[RUNNING]: test_suggested_and_dashboard_served_from_cache")
+        from .models import RoomRecommendation
+        RoomRecommendation.objects.create(user=self.tenant, scores=[[self.partial.id, 9], [self.best.id, 1]])
+        self.client.force_login(self.tenant)
+
+        response = self.client.get('/api/rooms/suggested/')
+        self.assertEqual([room['id'] for room in response.data], [self.partial.id, self.best.id])
+        response = self.client.get('/api/rooms/')
+        self.assertEqual(response.data[0]['id'], self.partial.id)
+        print("[RESULT]: SUCCESS - Cached recommendations served.")
+
+    def test_missing_recommendations_are_computed_in_background(self):
+        """A tenant without a stored list gets the fallback while it's computed once, off the request."""
+        print("\n[RUNNING]: test_missing_recommendations_are_computed_in_background")
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import recommendations
+        from .models import RoomRecommendation
+        newcomer = User.objects.create_user(
+            username='rec_newcomer@gmail.com', email='rec_newcomer@gmail.com', password='123', role='Tenant'
+        )
+        self.client.force_login(newcomer)
+        with mock.patch.object(recommendations, '_executor') as executor, \
+                mock.patch.object(recommendations, 'load_room_features') as loaded, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/api/rooms/suggested/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data)
+        loaded.assert_not_called()
+        job, *args = executor.submit.call_args[0]
+        job(*args)
+
+        # No preferences: an empty list is stored, and later requests neither rescore nor delete
+        self.assertEqual(RoomRecommendation.objects.get(user=newcomer).scores, [])
+        with mock.patch.object(recommendations, '_executor') as executor, \
+                self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/rooms/suggested/')
+        executor.submit.assert_not_called()
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('DELETE')])
+        print("[RESULT]: SUCCESS - Recommendations computed once in the background.")
+
+
+class SearchPreferenceLearningTests(TestCase):
+    """
+    UNIT TESTS — Buffered Search Preference Learning
+    Tests that searches are read-only and preferences follow decayed weights.
+    """
+    def setUp(self):
+        from django.test import Client
+        from .preferences import search_buffer
+        search_buffer.drain()
+        self.client = Client()
+        self.tenant = User.objects.create_user(
+            username='pref_tenant@gmail.com', email='pref_tenant@gmail.com', password='123', role='Tenant'
+        )
+
+    def test_search_request_is_read_only(self):
+        """Filtered searches should be buffered, then written once per tenant on flush."""
+        print("\n[RUNNING]: test_search_request_is_read_only")
+        from django.test import override_settings
+        from .models import UserSearchPreference
+        from .preferences import flush_signals
+        self.client.force_login(self.tenant)
+        with override_settings(SEARCH_PREFERENCE_FLUSH_SECONDS=3600):
+            for query in ('K', 'Ka', 'Kathmandu'):
+                self.client.get('/api/rooms/', {'location': query, 'wifi': 'true'})
+        self.assertFalse(UserSearchPreference.objects.filter(user=self.tenant).exists())
+
+        flush_signals()
+        pref = UserSearchPreference.objects.get(user=self.tenant)
+        self.assertEqual(pref.location, 'Kathmandu')
+        self.assertTrue(pref.wifi)
+        print("[RESULT]: SUCCESS - Preferences written in one batched flush.")
+
+    def test_decayed_weights_beat_last_write(self):
+        """A single stray search should not override a repeatedly searched location or price band."""
+        print("\n[RUNNING]: test_decayed_weights_beat_last_write")
+        from django.test import override_settings
+        from unittest import mock
+        from .models import UserSearchPreference
+        from .preferences import flush_signals, record_search, search_buffer
+        with override_settings(SEARCH_PREFERENCE_FLUSH_SECONDS=0), mock.patch.object(search_buffer, 'schedule'):
+            for _ in range(4):
+                record_search(self.tenant.id, {'location': 'Lalitpur', 'max_price': '6000'})
+                flush_signals()
+            record_search(self.tenant.id, {'location': 'Pokhara', 'max_price': '20000'})
+            flush_signals()
+        pref = UserSearchPreference.objects.get(user=self.tenant)
+        self.assertEqual(pref.location, 'Lalitpur')
+        self.assertTrue(6000 < pref.max_price < 20000)
+        self.assertIn('Pokhara', pref.search_signals['location'])
+        print("[RESULT]: SUCCESS - Decayed weights kept the dominant preference.")
+
+    def test_full_buffer_flushes_in_background(self):
+        """A full buffer moves the background flush up instead of writing on the search; failed flushes requeue."""
+        print("\n[RUNNING]: test_full_buffer_flushes_in_background")
+        from unittest import mock
+        from django.test import override_settings
+        from .models import UserSearchPreference
+        from .preferences import flush_signals, record_search, search_buffer
+        with mock.patch.object(search_buffer, 'schedule') as schedule, override_settings(SEARCH_PREFERENCE_FLUSH_MAX=2):
+            record_search(self.tenant.id, {'location': 'Lalitpur'})
+            record_search(self.tenant.id, {'location': 'Lalitpur', 'wifi': 'true'})
+            schedule.assert_called_with(0, flush_signals)
+            self.assertFalse(UserSearchPreference.objects.filter(user=self.tenant).exists())
+
+            with mock.patch('OwnerRooms.preferences.apply_signals', side_effect=RuntimeError('database is locked')):
+                with self.assertLogs('OwnerRooms.preferences', 'ERROR'):
+                    flush_signals()
+            flush_signals()
+        pref = UserSearchPreference.objects.get(user=self.tenant)
+        self.assertEqual(pref.location, 'Lalitpur')
+        self.assertTrue(pref.wifi)
+        print("[RESULT]: SUCCESS - Overflow flushed off the search, failures kept for a retry.")
+
+
+    def test_exit_flush_skips_the_executor(self):
+        """The shutdown flush must not hand work to an executor that already refuses it."""
+        print("\n[RUNNING]: test_exit_flush_skips_the_executor")
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from django.test import override_settings
+        from . import recommendations
+        from .models import RoomRecommendation
+        from .preferences import flush_signals, record_search
+        stopped = ThreadPoolExecutor(max_workers=1)
+        stopped.shutdown()
+        with override_settings(SEARCH_PREFERENCE_FLUSH_SECONDS=3600):
+            record_search(self.tenant.id, {'location': 'Lalitpur'})
+        with mock.patch.object(recommendations, '_executor', stopped), \
+                self.captureOnCommitCallbacks(execute=True):
+            flush_signals(in_background=False)
+        self.assertTrue(RoomRecommendation.objects.filter(user=self.tenant).exists())
+        print("[RESULT]: SUCCESS - Exit flush refreshed recommendations inline.")
+
+
+class RoomSearchCacheTests(TestCase):
+    """
+    INTEGRATION TESTS — Room Search Cache
+    Tests cached id lists, signal-driven invalidation and metrics.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        from django.test import Client
+        cache.clear()
+        self.client = Client()
+        self.owner = User.objects.create_user(
+            username='cache_owner@gmail.com', email='cache_owner@gmail.com', password='123', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='cache_tenant@gmail.com', email='cache_tenant@gmail.com', password='123', role='Tenant'
+        )
+        self.admin = User.objects.create_user(
+            username='cache_admin@gmail.com', email='cache_admin@gmail.com', password='123', role='Admin'
+        )
+        self.room = Room.objects.create(owner=self.owner, title='Cached Room', location='Kathmandu', price=5000)
+
+    def tearDown(self):
+        from .preferences import search_buffer
+        search_buffer.drain()
+
+    def test_repeat_search_is_served_from_cache(self):
+        """The same search with reordered params should hit the cache; only the rooms themselves are loaded."""
+        print("\n[RUNNING]: test_repeat_search_is_served_from_cache")
+        self.client.force_login(self.tenant)
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        first = self.client.get('/api/rooms/', {'location': 'Kathmandu', 'max_price': '6000'})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/rooms/?max_price=6000&location=kathmandu')
+        self.assertEqual(first.data, second.data)
+        room_queries = [q['sql'] for q in queries.captured_queries if 'OwnerRooms_room' in q['sql']]
+        self.assertEqual(len(room_queries), 1)
+        self.assertNotIn('WHERE "OwnerRooms_room"."status"', room_queries[0])
+
+        self.client.force_login(self.admin)
+        stats = self.client.get('/api/rooms/cache_stats/').data
+        self.assertEqual((stats['search_hit'], stats['search_miss']), (1, 1))
+        self.assertEqual(stats['room_payload_hit'], 1)
+        print("[RESULT]: SUCCESS - Repeat search served from cache.")
+
+    def test_room_and_review_changes_invalidate(self):
+        """Saving a room or adding a review should refresh cached results and payloads."""
+        print("\n[RUNNING]: test_room_and_review_changes_invalidate")
+        self.client.force_login(self.tenant)
+        self.client.get('/api/rooms/', {'location': 'Kathmandu'})
+
+        self.room.title = 'Renamed Room'
+        self.room.save()
+        Room.objects.create(owner=self.owner, title='Second Room', location='Kathmandu', price=4000)
+        response = self.client.get('/api/rooms/', {'location': 'Kathmandu'})
+        self.assertEqual(len(response.data), 2)
+        self.assertIn('Renamed Room', [room['title'] for room in response.data])
+
+        RoomReview.objects.create(room=self.room, tenant=self.tenant, rating=4)
+        response = self.client.get('/api/rooms/', {'location': 'Kathmandu'})
+        reviewed = next(room for room in response.data if room['id'] == self.room.id)
+        self.assertEqual(reviewed['review_count'], 1)
+        print("[RESULT]: SUCCESS - Signals invalidated cached rooms.")
+
+
+    def test_radius_only_search_is_not_personalized(self):
+        """A tenant searching by distance alone gets the filtered, shared result list and feeds preference learning."""
+        print("\n[RUNNING]: test_radius_only_search_is_not_personalized")
+        from unittest import mock
+        from . import views
+        Room.objects.filter(pk=self.room.pk).update(latitude=27.7172, longitude=85.3240)
+        Room.objects.create(
+            owner=self.owner, title='Far Room', location='Pokhara', price=4000, latitude=28.2096, longitude=83.9856
+        )
+        self.client.force_login(self.tenant)
+        params = {'lat': '27.7', 'lng': '85.3', 'radius': '5'}
+        with mock.patch.object(views, 'record_search') as record_search, \
+                mock.patch.object(views, 'cached_room_ids', wraps=views.cached_room_ids) as cached:
+            response = self.client.get('/api/rooms/', params)
+        self.assertEqual([room['id'] for room in response.data], [self.room.id])
+        record_search.assert_called_once()
+        self.assertFalse(cached.call_args.args[1])
+        print("[RESULT]: SUCCESS - Radius search treated as a search.")
+
+    def test_only_relevant_changes_invalidate(self):
+        """Edits outside searched columns and bookings keep plain result lists; view counts stay live."""
+        print("\n[RUNNING]: test_only_relevant_changes_invalidate")
+        from datetime import date, timedelta
+        from .models import Booking
+        from .viewcounts import apply_views
+        from stayspot.cache import tag_versions
+        self.client.force_login(self.tenant)
+        self.client.get('/api/rooms/', {'location': 'Kathmandu'})
+        before = tag_versions(['rooms', 'room-bookings'])
+
+        room = Room.objects.get(pk=self.room.pk)
+        room.description = 'Sunny, quiet street'
+        room.save()
+        Booking.objects.create(
+            tenant=self.tenant, room=room, monthly_rent=5000, status='Confirmed',
+            start_date=date.today(), end_date=date.today() + timedelta(days=30)
+        )
+        rooms_version, bookings_version = tag_versions(['rooms', 'room-bookings'])
+        self.assertEqual(rooms_version, before[0])
+        self.assertNotEqual(bookings_version, before[1])
+
+        apply_views({room.id: 7}, [])
+        response = self.client.get('/api/rooms/', {'location': 'Kathmandu'})
+        self.assertEqual(response.data[0]['views'], 7)
+
+        room.price = 5500
+        room.save()
+        self.assertNotEqual(tag_versions(['rooms'])[0], rooms_version)
+        print("[RESULT]: SUCCESS - Only relevant changes invalidated results.")
+
+
+def expanded_context():
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    return {'request': Request(APIRequestFactory().get('/', {'expand': 'room'}))}
+
+
+class RoomPayloadCacheTests(TestCase):
+    """
+    UNIT TESTS — Room Payload Cache
+    Tests per-room serialized payloads shared by nested serializers and their versioning.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.owner = User.objects.create_user(
+            username='payload_owner@gmail.com', email='payload_owner@gmail.com', password='123', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='payload_tenant@gmail.com', email='payload_tenant@gmail.com', password='123', role='Tenant'
+        )
+        self.rooms = [
+            Room.objects.create(owner=self.owner, title=f'Payload Room {i}', location='Pokhara', price=4000 + i)
+            for i in range(2)
+        ]
+        for i in range(4):
+            Booking.objects.create(
+                tenant=self.tenant, room=self.rooms[i % 2],
+                start_date=date.today(), end_date=date.today() + timedelta(days=30), monthly_rent=4000
+            )
+
+    def test_nested_rooms_reuse_cached_payloads(self):
+        """A booking list should serialize each room once, then read every room from one multi-get."""
+        print("\n[RUNNING]: test_nested_rooms_reuse_cached_payloads")
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from stayspot.cache import read_metrics
+        from .serializers import BookingSerializer
+        from .payload_cache import METRICS
+
+        first = BookingSerializer(Booking.objects.all(), many=True, context=expanded_context()).data
+        self.assertEqual(read_metrics(METRICS)['room_payload_miss'], 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = BookingSerializer(Booking.objects.all(), many=True, context=expanded_context()).data
+        self.assertEqual(first, second)
+        heavy = [q for q in queries.captured_queries if 'roomimage' in q['sql'] or 'roomreview' in q['sql']]
+        self.assertFalse(heavy)
+        stats = read_metrics(METRICS)
+        self.assertEqual((stats['room_payload_hit'], stats['room_payload_miss']), (2, 2))
+        print("[RESULT]: SUCCESS - Nested rooms served from payload cache.")
+
+    def test_payload_follows_room_images_and_reviews(self):
+        """Saving the room, adding an image or a review should each produce a fresh payload."""
+        print("\n[RUNNING]: test_payload_follows_room_images_and_reviews")
+        from .serializers import RoomSerializer
+        room = self.rooms[0]
+
+        def payload():
+            return RoomSerializer(Room.objects.get(id=room.id), context={}).data
+
+        self.assertEqual(payload()['review_count'], 0)
+        RoomReview.objects.create(room=room, tenant=self.tenant, rating=5)
+        self.assertEqual(payload()['review_count'], 1)
+        self.assertEqual(payload()['average_rating'], 5)
+
+        RoomImage.objects.create(room=room, image='room_images/payload.jpg')
+        self.assertEqual(len(payload()['images']), 1)
+
+        room.title = 'Renamed Payload Room'
+        room.save()
+        self.assertEqual(payload()['title'], 'Renamed Payload Room')
+        print("[RESULT]: SUCCESS - Payload versions follow room changes.")
+
+
+class RoomSummaryTests(TestCase):
+    """
+    BENCHMARK TESTS — Nested Room Summaries
+    Compares nested summaries against ?expand=room on query count and payload size.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.owner = User.objects.create_user(
+            username='summary_owner@gmail.com', email='summary_owner@gmail.com', password='123', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='summary_tenant@gmail.com', email='summary_tenant@gmail.com', password='123', role='Tenant'
+        )
+        for i in range(10):
+            room = Room.objects.create(owner=self.owner, title=f'Summary Room {i}', location='Lalitpur', price=3000 + i)
+            for j in range(3):
+                RoomImage.objects.create(room=room, image=f'room_images/summary_{i}_{j}.jpg')
+            RoomReview.objects.create(room=room, tenant=self.tenant, rating=4, comment='Nice')
+
+    def measure(self, context):
+        import json
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .serializers import RoomReviewSerializer
+        with CaptureQueriesContext(connection) as queries:
+            data = RoomReviewSerializer(RoomReview.objects.all(), many=True, context=context).data
+        return data, len(queries.captured_queries), len(json.dumps(data, default=str))
+
+    def test_summary_is_smaller_and_cheaper(self):
+        """Nested summaries should need a fixed number of queries and far fewer bytes than full rooms."""
+        print("\n[RUNNING]: test_summary_is_smaller_and_cheaper")
+        summary, summary_queries, summary_bytes = self.measure({})
+        full, full_queries, full_bytes = self.measure(expanded_context())
+        print(f"  summary: {summary_queries} queries, {summary_bytes} bytes; "
+              f"expand=room: {full_queries} queries, {full_bytes} bytes")
+
+        self.assertEqual(set(summary[0]['room']), {'id', 'title', 'location', 'price', 'status', 'owner', 'cover_image'})
+        self.assertTrue(summary[0]['room']['cover_image']['image'].endswith('_0.jpg'))
+        self.assertIn('amenities', full[0]['room'])
+        self.assertLess(summary_queries, full_queries)
+        self.assertLess(summary_bytes * 2, full_bytes)
+
+        # Query count stays flat as rows grow
+        RoomReview.objects.create(room=Room.objects.first(), tenant=self.owner, rating=3)
+        self.assertEqual(self.measure({})[1], summary_queries)
+        print("[RESULT]: SUCCESS - Nested summaries are lighter than full rooms.")
+
+
+class SparseFieldsetTests(TestCase):
+    """
+    INTEGRATION TESTS — Sparse Fieldsets
+    Tests ?fields= / ?exclude= pruning of payloads and of the columns and relations loaded.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        from django.test import Client
+        cache.clear()
+        self.client = Client()
+        self.owner = User.objects.create_user(
+            username='sparse_owner@gmail.com', email='sparse_owner@gmail.com', password='123', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='sparse_tenant@gmail.com', email='sparse_tenant@gmail.com', password='123', role='Tenant'
+        )
+        self.room = Room.objects.create(
+            owner=self.owner, title='Sparse Room', location='Bhaktapur', price=4500,
+            latitude=27.67, longitude=85.43, description='A long description the map never shows'
+        )
+        RoomImage.objects.create(room=self.room, image='room_images/sparse.jpg')
+        Booking.objects.create(
+            tenant=self.tenant, room=self.room,
+            start_date=date.today(), end_date=date.today() + timedelta(days=30), monthly_rent=4500
+        )
+
+    def test_map_fields_load_only_their_columns(self):
+        """A map-style request should return and load only the requested room columns."""
+        print("\n[RUNNING]: test_map_fields_load_only_their_columns")
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/rooms/', {'fields': 'id,title,price,latitude,longitude'})
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'price', 'latitude', 'longitude'})
+
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertFalse([q for q in sql if 'roomimage' in q or 'roomreview' in q])
+        loads = [q for q in sql if q.startswith('SELECT') and '"OwnerRooms_room"."title"' in q]
+        self.assertTrue(loads)
+        self.assertFalse([q for q in loads if '"description"' in q])
+        print("[RESULT]: SUCCESS - Only the map's columns were loaded.")
+
+    def test_sparse_list_prefetches_requested_relations(self):
+        """Images and review aggregates asked for by ?fields= should load in one query each, not per room."""
+        print("\n[RUNNING]: test_sparse_list_prefetches_requested_relations")
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        for i in range(3):
+            room = Room.objects.create(owner=self.owner, title=f'Sparse Room {i}', location='Bhaktapur', price=4500)
+            RoomImage.objects.create(room=room, image=f'room_images/sparse{i}.jpg')
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/rooms/', {'fields': 'id,images,review_count'})
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(set(response.data[0]), {'id', 'images', 'review_count'})
+
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertEqual(len([q for q in sql if 'FROM "OwnerRooms_roomimage"' in q]), 1)
+        self.assertEqual(len([q for q in sql if 'FROM "OwnerRooms_roomreview"' in q]), 1)
+        print("[RESULT]: SUCCESS - Requested relations prefetched once for the page.")
+
+    def test_exclude_drops_nested_relations(self):
+        """Excluding the nested room should skip loading rooms; other viewsets honour ?fields= too."""
+        print("\n[RUNNING]: test_exclude_drops_nested_relations")
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from notifications.models import Notification
+        self.client.force_login(self.tenant)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/bookings/', {'exclude': 'room,tenant'})
+        self.assertNotIn('room', response.data[0])
+        self.assertIn('monthly_rent', response.data[0])
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "OwnerRooms_room"' in q['sql']])
+
+        Notification.objects.create(recipient=self.tenant, notification_type='booking_request', text='Hello')
+        response = self.client.get('/api/notifications/', {'fields': 'id,text'})
+        self.assertEqual(response.data[0], {'id': response.data[0]['id'], 'text': 'Hello'})
+
+        # Without the params the full payload is back
+        response = self.client.get('/api/bookings/')
+        self.assertIn('room', response.data[0])
+        print("[RESULT]: SUCCESS - Excluded relations were never loaded.")
+
+
+class RoomMapClusterTests(TestCase):
+    """
+    UNIT TESTS — Room Map Clusters
+    Tests precomputed clusters, incremental cell refreshes and the map endpoint.
+    """
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='map_owner@gmail.com', email='map_owner@gmail.com', password='123', role='Owner'
+        )
+        # Two rooms a few hundred metres apart in Thamel, one across town in Patan
+        self.thamel = [
+            Room.objects.create(owner=self.owner, title='Thamel A', location='Thamel', price=5000,
+                                latitude=27.7152, longitude=85.3123),
+            Room.objects.create(owner=self.owner, title='Thamel B', location='Thamel', price=7000,
+                                latitude=27.7160, longitude=85.3110),
+        ]
+        self.patan = Room.objects.create(owner=self.owner, title='Patan', location='Patan', price=6000,
+                                         latitude=27.6727, longitude=85.3253)
+
+    def markers(self, zoom, bbox='85.2,27.6,85.4,27.8'):
+        from django.test import Client
+        client = Client()
+        client.force_login(self.owner)
+        response = client.get('/api/rooms/map/', {'bbox': bbox, 'zoom': zoom})
+        self.assertEqual(response.status_code, 200)
+        return [dict(zip(response.data['columns'], row)) for row in response.data['markers']]
+
+    def test_clusters_merge_with_zoom(self):
+        """Low zoom should merge nearby rooms into one cluster with a price range; street zoom lists rooms."""
+        print("\n[RUNNING]: test_clusters_merge_with_zoom")
+        from .map_clusters import rebuild_map_clusters
+        rebuild_map_clusters()
+
+        region = self.markers(6)
+        self.assertEqual(len(region), 1)
+        self.assertEqual(region[0]['count'], 3)
+        self.assertEqual((region[0]['min_price'], region[0]['max_price']), (5000, 7000))
+
+        district = self.markers(14)
+        self.assertEqual(sorted(marker['count'] for marker in district), [1, 2])
+        single = next(marker for marker in district if marker['count'] == 1)
+        self.assertEqual(single['room_id'], self.patan.id)
+
+        street = self.markers(18, bbox='85.310,27.714,85.314,27.717')
+        self.assertEqual(sorted(marker['room_id'] for marker in street), sorted(room.id for room in self.thamel))
+        # A city-wide viewport at street zoom gets the finest clusters, not every room
+        from .map_clusters import map_markers
+        self.assertEqual(map_markers((85.2, 27.6, 85.4, 27.8), 18)[0], 16)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get('/api/rooms/map/', {'zoom': 10}).status_code, 400)
+        print("[RESULT]: SUCCESS - Clusters merge and split by zoom.")
+
+    def test_room_changes_refresh_only_their_cells(self):
+        """Moving or renting out a room should update clusters without a rebuild."""
+        print("\n[RUNNING]: test_room_changes_refresh_only_their_cells")
+        from unittest import mock
+        from . import map_clusters
+        map_clusters.rebuild_map_clusters()
+
+        def save(room, **changes):
+            """Save and run just the map refresh it schedules; returns how many were scheduled."""
+            for field, value in changes.items():
+                setattr(room, field, value)
+            with self.captureOnCommitCallbacks() as callbacks:
+                room.save()
+            scheduled = [c for c in callbacks if c.__qualname__.startswith('schedule_cell_refresh')]
+            with mock.patch.object(map_clusters._executor, 'submit', lambda job, positions: job(positions)), \
+                    mock.patch.object(map_clusters, 'close_old_connections'):
+                for callback in scheduled:
+                    callback()
+            return len(scheduled)
+
+        self.assertEqual(save(self.patan, latitude=27.7155, longitude=85.3120), 1)
+        self.assertEqual([marker['count'] for marker in self.markers(14)], [3])
+        self.assertEqual(save(self.thamel[1], status='Occupied'), 1)
+        self.assertEqual([marker['count'] for marker in self.markers(14)], [2])
+        # Saves that leave the map untouched schedule nothing
+        self.assertEqual(save(self.thamel[0], title='Renamed'), 0)
+
+        incremental = {zoom: self.markers(zoom) for zoom in (6, 10, 14)}
+        map_clusters.rebuild_map_clusters()
+        self.assertEqual(incremental, {zoom: self.markers(zoom) for zoom in (6, 10, 14)})
+        print("[RESULT]: SUCCESS - Incremental refresh matches a rebuild.")
+
+
+    def test_refresh_reads_only_street_level_cells(self):
+        """Saves read no extra row, and a refresh loads rooms from the max-zoom cell alone."""
+        print("\n[RUNNING]: test_refresh_reads_only_street_level_cells")
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import map_clusters
+        map_clusters.rebuild_map_clusters()
+
+        room = Room.objects.get(pk=self.patan.pk)
+        room.latitude, room.longitude = 27.7155, 85.3120
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks():
+            room.save()
+        reads = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'FROM "OwnerRooms_room"' in q['sql']]
+        self.assertEqual(reads, [])
+
+        with mock.patch.object(map_clusters, 'load_points', wraps=map_clusters.load_points) as loaded:
+            map_clusters.refresh_cells([(27.7155, 85.3120), (27.6727, 85.3253)])
+        self.assertTrue(loaded.called)
+        for call in loaded.call_args_list:
+            south, west, north, east = call.args[0]
+            self.assertLess(north - south, 0.01)
+        incremental = {zoom: self.markers(zoom) for zoom in (6, 10, 14)}
+        map_clusters.rebuild_map_clusters()
+        self.assertEqual(incremental, {zoom: self.markers(zoom) for zoom in (6, 10, 14)})
+        print("[RESULT]: SUCCESS - Refresh stayed within street-level cells.")
+
+
+def decode_tile(data):
+    """Minimal MVT reader for tests: [(feature id, (x, y), {key: value}), ...] of the first layer."""
+    import struct
+
+    def fields(buf):
+        i = 0
+        while i < len(buf):
+            key, i = varint(buf, i)
+            field, wire = key >> 3, key & 7
+            if wire == 0:
+                value, i = varint(buf, i)
+            elif wire == 1:
+                value, i = buf[i:i + 8], i + 8
+            else:
+                length, i = varint(buf, i)
+                value, i = buf[i:i + length], i + length
+            yield field, value
+
+    def varint(buf, i):
+        shift = result = 0
+        while True:
+            byte = buf[i]
+            result |= (byte & 0x7f) << shift
+            i += 1
+            if byte < 0x80:
+                return result, i
+            shift += 7
+
+    def packed(buf):
+        values, i = [], 0
+        while i < len(buf):
+            value, i = varint(buf, i)
+            values.append(value)
+        return values
+
+    layer = next((value for field, value in fields(data) if field == 3), b'')
+    keys, values, features = [], [], []
+    for field, value in fields(layer):
+        if field == 3:
+            keys.append(value.decode())
+        elif field == 4:
+            kind, raw = next(fields(value))
+            values.append(raw.decode() if kind == 1 else struct.unpack('<d', raw)[0] if kind == 3 else raw)
+        elif field == 2:
+            features.append(dict(fields(value)))
+    decoded = []
+    for feature in features:
+        tags = packed(feature[2])
+        _, x, y = packed(feature[4])
+        decoded.append((feature[1], (x >> 1, y >> 1), {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}))
+    return decoded
+
+
+class RoomVectorTileTests(TestCase):
+    """
+    UNIT TESTS — Room Vector Tiles
+    Tests MVT encoding, the disk cache and per-tile invalidation.
+    """
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        from django.test import Client
+        from django.test.utils import override_settings
+        cache.clear()
+        self.tile_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(ROOM_TILE_CACHE_DIR=self.tile_dir)
+        self.settings_override.enable()
+        self.owner = User.objects.create_user(
+            username='tile_owner@gmail.com', email='tile_owner@gmail.com', password='123', role='Owner'
+        )
+        self.client = Client()
+        self.client.force_login(self.owner)
+        self.room = Room.objects.create(owner=self.owner, title='Tile Room', location='Thamel', price=5500,
+                                        room_type='Single', latitude=27.7152, longitude=85.3123)
+        Room.objects.create(owner=self.owner, title='Far Room', location='Pokhara', price=4000,
+                            latitude=28.2096, longitude=83.9856)
+
+    def tearDown(self):
+        import shutil
+        self.settings_override.disable()
+        shutil.rmtree(self.tile_dir, ignore_errors=True)
+
+    def tile_url(self, z, lat=27.7152, lng=85.3123):
+        from .vector_tiles import tile_of
+        x, y = tile_of(lat, lng, z)
+        return f'/api/rooms/tiles/{z}/{x}/{y}.pbf'
+
+    def test_tile_encodes_rooms_and_is_cached(self):
+        """A tile should hold only its own rooms with their attributes, then be served from disk."""
+        print("\n[RUNNING]: test_tile_encodes_rooms_and_is_cached")
+        response = self.client.get(self.tile_url(12))
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        features = decode_tile(response.content)
+        self.assertEqual(len(features), 1)
+        room_id, (x, y), attributes = features[0]
+        self.assertEqual(room_id, self.room.id)
+        self.assertTrue(0 <= x < 4096 and 0 <= y < 4096)
+        self.assertEqual(attributes, {'price': 5500.0, 'room_type': 'Single', 'gender_preference': 'Any', 'title': 'Tile Room'})
+
+        # Both rooms share the world tile
+        self.assertEqual(len(decode_tile(self.client.get('/api/rooms/tiles/0/0/0.pbf').content)), 2)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.get(self.tile_url(12))
+        self.assertEqual(again.content, response.content)
+        self.assertFalse([q for q in queries.captured_queries if 'OwnerRooms_room' in q['sql']])
+        not_modified = self.client.get(self.tile_url(12), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get('/api/rooms/tiles/30/0/0.pbf').status_code, 404)
+        print("[RESULT]: SUCCESS - Tile encoded and cached on disk.")
+
+    def test_room_change_invalidates_only_its_tiles(self):
+        """Moving a room should drop the tiles it left and entered, leaving other tiles cached."""
+        print("\n[RUNNING]: test_room_change_invalidates_only_its_tiles")
+        import os
+        from .vector_tiles import invalidate_tiles
+        before = self.client.get(self.tile_url(12))
+        far = self.client.get(self.tile_url(12, 28.2096, 83.9856))
+        cached = sum(len(files) for _, _, files in os.walk(self.tile_dir))
+        self.assertEqual(cached, 2)
+
+        old = (self.room.latitude, self.room.longitude)
+        self.room.latitude, self.room.longitude = 27.6727, 85.3253
+        self.room.save()
+        # Runs after commit in production; called directly here
+        invalidate_tiles([old, (self.room.latitude, self.room.longitude)])
+
+        after = self.client.get(self.tile_url(12))
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(decode_tile(after.content), [])
+        self.assertEqual(self.client.get(self.tile_url(12, 28.2096, 83.9856))['ETag'], far['ETag'])
+        moved = decode_tile(self.client.get(self.tile_url(12, 27.6727, 85.3253)).content)
+        self.assertEqual([feature[0] for feature in moved], [self.room.id])
+        print("[RESULT]: SUCCESS - Only touched tiles were invalidated.")
+
+
+class BookingAvailabilityTests(TestCase):
+    """
+    INTEGRATION TESTS — Booking Availability
+    Tests date-range overlap checks, the available_from/available_to search and occupancy syncing.
+    """
+    def setUp(self):
+        import json
+        from django.core.cache import cache
+        from django.test import Client
+        cache.clear()
+        self.json = json
+        self.client = Client()
+        self.tenant = User.objects.create_user(
+            username='avail_tenant@gmail.com', email='avail_tenant@gmail.com', password='123',
+            role='Tenant', is_identity_verified=True
+        )
+        self.owner = User.objects.create_user(
+            username='avail_owner@gmail.com', email='avail_owner@gmail.com', password='123',
+            role='Owner', is_identity_verified=True
+        )
+        self.room = Room.objects.create(owner=self.owner, title='Calendar Room', location='Lalitpur', price=6000)
+        self.other = Room.objects.create(owner=self.owner, title='Free Room', location='Lalitpur', price=6500)
+        self.today = date.today()
+
+    def book(self, start, end, status='Confirmed', room=None):
+        return Booking.objects.create(
+            tenant=self.tenant, room=room or self.room, start_date=self.today + timedelta(days=start),
+            end_date=self.today + timedelta(days=end), monthly_rent=6000, status=status
+        )
+
+    def request_booking(self, start, end):
+        self.client.force_login(self.tenant)
+        return self.client.post('/api/bookings/', data=self.json.dumps({
+            'room_id': self.room.id,
+            'start_date': str(self.today + timedelta(days=start)),
+            'end_date': str(self.today + timedelta(days=end)),
+            'monthly_rent': 6000
+        }), content_type='application/json')
+
+    def test_overlapping_request_is_rejected(self):
+        """Requests overlapping a confirmed stay fail; later dates and pending overlaps are fine."""
+        print("\n[RUNNING]: test_overlapping_request_is_rejected")
+        self.book(10, 40)
+        self.book(50, 60, status='Pending')
+        response = self.request_booking(40, 45)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already booked', str(response.json()))
+        self.assertEqual(self.request_booking(41, 55).status_code, 201)
+        self.assertEqual(self.request_booking(20, 10).status_code, 400)
+        print("[RESULT]: SUCCESS - Only conflicting date ranges were rejected.")
+
+    def test_confirming_a_conflicting_request_fails(self):
+        """An owner can't confirm a pending request whose dates are already taken."""
+        print("\n[RUNNING]: test_confirming_a_conflicting_request_fails")
+        self.book(0, 30)
+        pending = self.book(20, 50, status='Pending')
+        self.client.force_login(self.owner)
+        response = self.client.patch(
+            f'/api/bookings/{pending.id}/', data=self.json.dumps({'status': 'Confirmed'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'Pending')
+        print("[RESULT]: SUCCESS - Conflicting confirmation was refused.")
+
+    def test_available_dates_filter(self):
+        """?available_from/&available_to hide rooms with a confirmed booking in the window."""
+        print("\n[RUNNING]: test_available_dates_filter")
+        self.book(10, 40)
+        self.book(5, 20, status='Cancelled', room=self.other)
+        self.client.force_login(self.tenant)
+
+        def titles(**params):
+            response = self.client.get('/api/rooms/', params)
+            return sorted(room['title'] for room in response.json())
+
+        self.assertEqual(titles(available_from=str(self.today), available_to=str(self.today + timedelta(days=15))),
+                         ['Free Room'])
+        self.assertEqual(titles(available_from=str(self.today + timedelta(days=41))),
+                         ['Calendar Room', 'Free Room'])
+        # Cached search results are dropped when a booking is confirmed
+        self.book(50, 60, room=self.other)
+        self.assertEqual(titles(available_from=str(self.today + timedelta(days=41))), ['Calendar Room'])
+        self.assertEqual(titles(available_from='not-a-date'), ['Calendar Room', 'Free Room'])
+        print("[RESULT]: SUCCESS - Date filter matched the booking calendar.")
+
+    def test_occupancy_follows_booking_dates(self):
+        """Confirming a future stay leaves the room Available until the nightly sync starts it."""
+        print("\n[RUNNING]: test_occupancy_follows_booking_dates")
+        import io
+        from django.core.management import call_command
+        from .availability import sync_all_room_statuses
+        pending = self.book(3, 30, status='Pending')
+        self.client.force_login(self.owner)
+        self.client.patch(
+            f'/api/bookings/{pending.id}/', data=self.json.dumps({'status': 'Confirmed'}),
+            content_type='application/json'
+        )
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'Available')
+
+        self.assertEqual(sync_all_room_statuses(self.today + timedelta(days=3)), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'Occupied')
+        self.assertEqual(sync_all_room_statuses(self.today + timedelta(days=31)), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'Available')
+
+        out = io.StringIO()
+        call_command('sync_room_occupancy', stdout=out)
+        self.assertIn('Updated 0 room status(es)', out.getvalue())
+        print("[RESULT]: SUCCESS - Room status followed the stay's dates.")
+
+    def test_benchmark_command_rolls_back(self):
+        """The benchmark runs end to end and leaves no synthetic data behind."""
+        print("\n[RUNNING]: test_benchmark_command_rolls_back")
+        import io
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command('benchmark_availability', rooms=20, years=2, checks=10, stdout=out)
+        self.assertIn('Overlap check', out.getvalue())
+        self.assertIn('rolled back', out.getvalue())
+        self.assertEqual(Room.objects.count(), 2)
+        print("[RESULT]: SUCCESS - Benchmark ran and rolled back.")
+
+
+class BookingStateTests(TestCase):
+    """
+    UNIT TESTS — Booking State Machine
+    Tests allowed transitions, idempotency keys and repeated payment callbacks.
+    """
+    def setUp(self):
+        self.tenant = User.objects.create_user(
+            username='state_tenant@gmail.com', email='state_tenant@gmail.com', password='123',
+            role='Tenant', is_identity_verified=True
+        )
+        self.owner = User.objects.create_user(
+            username='state_owner@gmail.com', email='state_owner@gmail.com', password='123',
+            role='Owner', is_identity_verified=True
+        )
+        self.room = Room.objects.create(owner=self.owner, title='State Room', location='Pokhara', price=7000)
+        self.booking = Booking.objects.create(
+            tenant=self.tenant, room=self.room, start_date=date.today(),
+            end_date=date.today() + timedelta(days=60), monthly_rent=7000
+        )
+
+    def patch_status(self, new_status, key=None):
+        import json
+        from django.test import Client
+        client = Client()
+        client.force_login(self.owner)
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return client.patch(
+            f'/api/bookings/{self.booking.id}/', data=json.dumps({'status': new_status}),
+            content_type='application/json', **headers
+        )
+
+    def test_confirmation_applies_once(self):
+        """Confirming twice yields one transition, one rent payment and one notification."""
+        print("\n[RUNNING]: test_confirmation_applies_once")
+        from notifications.models import Notification
+        from payments.models import Payment
+        self.assertEqual(self.patch_status('Confirmed').status_code, 200)
+        self.assertEqual(self.patch_status('Confirmed').status_code, 200)
+        self.assertEqual(self.booking.transitions.count(), 1)
+        self.assertEqual(Payment.objects.filter(booking=self.booking).count(), 1)
+        self.assertEqual(Notification.objects.filter(notification_type='booking_confirmed').count(), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'Occupied')
+        print("[RESULT]: SUCCESS - Repeated confirmation was a no-op.")
+
+    def test_idempotency_key_and_invalid_transitions(self):
+        """A reused Idempotency-Key is ignored; terminal states can't be reopened."""
+        print("\n[RUNNING]: test_idempotency_key_and_invalid_transitions")
+        self.assertEqual(self.patch_status('Confirmed', key='click-1').status_code, 200)
+        # A retried request carrying the same key must not apply a different change
+        self.assertEqual(self.patch_status('Cancelled', key='click-1').status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'Confirmed')
+
+        self.assertEqual(self.patch_status('Completed').status_code, 200)
+        response = self.patch_status('Confirmed')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cannot be changed', str(response.json()))
+        print("[RESULT]: SUCCESS - Keys and transitions were enforced.")
+
+    def test_repeated_payment_callback(self):
+        """A second gateway report of the same payment changes nothing."""
+        print("\n[RUNNING]: test_repeated_payment_callback")
+        from payments.models import Payment
+        from .booking_state import record_payment
+        payment = Payment.objects.create(
+            booking=self.booking, amount=7000, due_date=date.today() + timedelta(days=30)
+        )
+        payment, changed = record_payment(payment.id, 'Khalti', 'pidx-1')
+        self.assertTrue(changed)
+        self.assertFalse(record_payment(payment.id, 'Khalti', 'pidx-1')[1])
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'Confirmed')
+        self.assertEqual(list(self.booking.transitions.values_list('key', flat=True)), ['Khalti:pidx-1'])
+        print("[RESULT]: SUCCESS - Payment was applied exactly once.")
+
+
+class BookingConcurrencyTests(TransactionTestCase):
+    """
+    INTEGRATION TESTS — Concurrent Booking Confirmation
+    Tests that racing confirmations and payment callbacks leave one consistent outcome.
+    """
+    def setUp(self):
+        from unittest import mock
+        from . import map_clusters, recommendations, vector_tiles
+        # Room saves schedule background jobs; keep them out of the race
+        for module in (map_clusters, recommendations, vector_tiles):
+            patcher = mock.patch.object(module._executor, 'submit')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.tenant = User.objects.create_user(
+            username='race_tenant@gmail.com', email='race_tenant@gmail.com', password='123', role='Tenant'
+        )
+        self.owner = User.objects.create_user(
+            username='race_owner@gmail.com', email='race_owner@gmail.com', password='123', role='Owner'
+        )
+        self.room = Room.objects.create(owner=self.owner, title='Race Room', location='Butwal', price=8000)
+
+    def book(self, days):
+        return Booking.objects.create(
+            tenant=self.tenant, room=self.room, start_date=date.today(),
+            end_date=date.today() + timedelta(days=days), monthly_rent=8000
+        )
+
+    def race(self, calls):
+        """Run `calls` at once on separate threads (and connections); returns their results."""
+        import threading
+        import time
+        from django.db import OperationalError, connection
+        results, errors = [], []
+        barrier = threading.Barrier(len(calls))
+
+        def worker(call):
+            barrier.wait()
+            try:
+                for _ in range(500):
+                    try:
+                        results.append(call())
+                        return
+                    except OperationalError:
+                        # The shared-cache SQLite test database reports "locked" instead of waiting
+                        time.sleep(0.005)
+                errors.append('gave up waiting for the lock')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(call,)) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_racing_confirmations(self):
+        """Of two overlapping requests confirmed at once, exactly one wins."""
+        print("\n[RUNNING]: test_racing_confirmations")
+        from payments.models import Payment
+        from .booking_state import TransitionError, transition_booking
+        first, second = self.book(30), self.book(45)
+
+        def confirm(booking_id):
+            try:
+                return transition_booking(booking_id, 'Confirmed')[1]
+            except TransitionError:
+                return 'refused'
+
+        results = self.race([lambda b=booking: confirm(b.id) for booking in (first, second) * 4])
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(sorted(Booking.objects.values_list('status', flat=True)), ['Confirmed', 'Pending'])
+        self.assertEqual(Payment.objects.count(), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'Occupied')
+        print("[RESULT]: SUCCESS - One confirmation won the race.")
+
+    def test_racing_payment_callbacks(self):
+        """A payment reported by several callbacks at once is recorded once."""
+        print("\n[RUNNING]: test_racing_payment_callbacks")
+        from payments.models import Payment
+        from .booking_state import record_payment
+        from .models import BookingTransition
+        booking = self.book(30)
+        payment = Payment.objects.create(booking=booking, amount=8000, due_date=date.today() + timedelta(days=30))
+
+        results = self.race([lambda: record_payment(payment.id, 'eSewa', 'txn-1')[1]] * 6)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(BookingTransition.objects.filter(booking=booking).count(), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'Occupied')
+        print("[RESULT]: SUCCESS - The payment was applied once.")
+
+
+class OwnerTenantDirectoryTests(TestCase):
+    """
+    INTEGRATION TESTS — Owner Tenant Directory
+    Tests the paginated, searchable directory and that it costs the same number of queries at any size.
+    """
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.owner = User.objects.create_user(username='dir_owner@gmail.com', password='123', role='Owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.today = date.today()
+
+    def lease(self, name, title='Directory Room'):
+        tenant = User.objects.create_user(
+            username=f'{name.lower()}@gmail.com', email=f'{name.lower()}@gmail.com', password='123',
+            full_name=name, role='Tenant'
+        )
+        room = Room.objects.create(owner=self.owner, title=title, location='Bhaktapur', price=4000)
+        return Booking.objects.create(
+            tenant=tenant, room=room, monthly_rent=4000, status='Active',
+            start_date=self.today, end_date=self.today + timedelta(days=200)
+        )
+
+    def directory(self, query=''):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/owner/tenants/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_rent_status_and_filters(self):
+        """Rows carry their latest payment's status; search, room filter and paging apply on the server."""
+        print("\n[RUNNING]: test_rent_status_and_filters")
+        from payments.models import Payment
+        anita = self.lease('Anita', 'Garden Room')
+        self.lease('Bikash')
+        Payment.objects.create(booking=anita, amount=4000, due_date=self.today, status='Paid')
+        Payment.objects.create(booking=anita, amount=4000, due_date=self.today + timedelta(days=30))
+
+        data, _ = self.directory()
+        statuses = {row['tenant']['full_name']: row['rent_status'] for row in data['tenants']}
+        self.assertEqual(statuses, {'Anita': 'Pending', 'Bikash': 'Paid'})
+        self.assertEqual(data['stats'], {
+            'total_tenants': 2, 'active_leases': 2, 'pending_rent': 1, 'maintenance_requests': 0
+        })
+        self.assertEqual(data['rooms'], ['Directory Room', 'Garden Room'])
+
+        data, _ = self.directory('?search=anit')
+        self.assertEqual([row['id'] for row in data['tenants']], [anita.id])
+        data, _ = self.directory('?room=Directory Room')
+        self.assertEqual([row['tenant']['full_name'] for row in data['tenants']], ['Bikash'])
+        data, _ = self.directory('?page=2&page_size=1')
+        self.assertEqual((len(data['tenants']), data['pagination']['total'], data['pagination']['pages']), (1, 2, 2))
+        print("[RESULT]: SUCCESS - Directory filtered and paginated.")
+
+    def test_constant_queries(self):
+        """Ten times the leases costs no extra queries."""
+        print("\n[RUNNING]: test_constant_queries")
+        from payments.models import Payment
+        for i in range(2):
+            Payment.objects.create(booking=self.lease(f'Few{i}'), amount=4000, due_date=self.today)
+        _, few = self.directory()
+        for i in range(20):
+            Payment.objects.create(booking=self.lease(f'Many{i}'), amount=4000, due_date=self.today)
+        data, many = self.directory()
+        self.assertEqual(len(data['tenants']), 20)
+        self.assertEqual(few, many)
+        print(f"[RESULT]: SUCCESS - {many} queries for 2 and 22 leases.")
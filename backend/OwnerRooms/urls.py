@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     RoomViewSet, BookingViewSet, VisitViewSet,
     RoomReviewViewSet, ComplaintViewSet, tenant_dashboard,
-    owner_tenant_management, admin_dashboard_stats
+    owner_tenant_management, admin_dashboard_stats, room_tile
 )
 
 router = DefaultRouter()
@@ -17,5 +17,6 @@ urlpatterns = [
     path('tenant/dashboard/', tenant_dashboard, name='tenant-dashboard'),
     path('owner/tenants/', owner_tenant_management, name='owner-tenant-management'),
     path('admin/dashboard/', admin_dashboard_stats, name='admin-dashboard-stats'),
+    path('rooms/tiles/<int:z>/<int:x>/<int:y>.pbf', room_tile, name='room-tile'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,204 @@
+import logging
+import os
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from stayspot.cache import invalidate_tags, tag_versions
+from .map_clusters import grid_bounds, grid_cell, world_xy
+
+logger = logging.getLogger(__name__)
+
+# Mapbox Vector Tiles (https://github.com/mapbox/vector-tile-spec, v2.1) with one
+# point layer, 'rooms'. Encoded here directly: a tile is a handful of protobuf
+# messages, so no protobuf dependency is needed.
+LAYER_NAME = 'rooms'
+EXTENT = 4096
+ATTRIBUTES = ('price', 'room_type', 'gender_preference', 'title')
+CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='room-tiles')
+
+
+# Protobuf wire format
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, data):
+    return _key(field, 2) + _varint(len(data)) + data
+
+
+def _uint_field(field, value):
+    return _key(field, 0) + _varint(value)
+
+
+def _packed_field(field, values):
+    return _bytes_field(field, b''.join(_varint(value) for value in values))
+
+
+def _value(value):
+    """A Layer.Value message: strings, doubles, or non-negative ints."""
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode())
+    if isinstance(value, int) and value >= 0:
+        return _uint_field(5, value)
+    return _key(3, 1) + struct.pack('<d', float(value))
+
+
+def encode_tile(features):
+    """
+    Encode [(tile_x, tile_y, room_id, {attribute: value}), ...] (coordinates in
+    0..EXTENT) as a one-layer vector tile.
+    """
+    keys, values = {}, {}
+    encoded = []
+    for px, py, room_id, attributes in features:
+        tags = []
+        for key, value in attributes.items():
+            if value is None or value == '':
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        # MoveTo(1) with one point, relative to the origin
+        geometry = [(1 & 0x7) | (1 << 3), _zigzag(px), _zigzag(py)]
+        encoded.append(_bytes_field(2, (
+            _uint_field(1, room_id)
+            + _packed_field(2, tags)
+            + _uint_field(3, 1)  # GeomType POINT
+            + _packed_field(4, geometry)
+        )))
+
+    layer = (
+        _uint_field(15, 2)
+        + _bytes_field(1, LAYER_NAME.encode())
+        + b''.join(encoded)
+        + b''.join(_bytes_field(3, key.encode()) for key in keys)
+        + b''.join(_bytes_field(4, _value(value)) for _, value in values)
+        + _uint_field(5, EXTENT)
+    )
+    return _bytes_field(3, layer) if encoded else b''
+
+
+# Tile coordinates
+
+def tile_of(lat, lng, z):
+    return grid_cell(lat, lng, 1 << z)
+
+
+def tile_bounds(z, x, y):
+    """(south, west, north, east) of a tile."""
+    return grid_bounds(x, y, 1 << z)
+
+
+def render_tile(z, x, y):
+    """Vector tile bytes for the Available rooms inside tile z/x/y."""
+    from .models import Room
+    south, west, north, east = tile_bounds(z, x, y)
+    pad = 1e-6
+    rooms = Room.objects.filter(
+        status='Available',
+        latitude__gte=south - pad, latitude__lte=north + pad,
+        longitude__gte=west - pad, longitude__lte=east + pad
+    ).values_list('id', 'latitude', 'longitude', *ATTRIBUTES)
+
+    n = 1 << z
+    features = []
+    for room_id, lat, lng, *attributes in rooms:
+        lat, lng = float(lat), float(lng)
+        if tile_of(lat, lng, z) != (x, y):
+            continue
+        wx, wy = world_xy(lat, lng)
+        px = min(int((wx * n - x) * EXTENT), EXTENT - 1)
+        py = min(int((wy * n - y) * EXTENT), EXTENT - 1)
+        values = dict(zip(ATTRIBUTES, attributes))
+        values['price'] = float(values['price'])
+        features.append((px, py, room_id, values))
+    return encode_tile(features)
+
+
+# Disk cache: one file per (z, x, y, tile version)
+
+def _tag(z, x, y):
+    return f'room-tile:{z}/{x}/{y}'
+
+
+def tile_version(z, x, y):
+    return tag_versions([_tag(z, x, y)])[0]
+
+
+def _tile_dir(z, x):
+    return os.path.join(settings.ROOM_TILE_CACHE_DIR, str(z), str(x))
+
+
+def cached_tile(z, x, y):
+    """(tile bytes, version): read from disk, rendering and storing it on a miss."""
+    version = tile_version(z, x, y)
+    directory = _tile_dir(z, x)
+    path = os.path.join(directory, f'{y}-{version}.pbf')
+    try:
+        with open(path, 'rb') as f:
+            return f.read(), version
+    except FileNotFoundError:
+        pass
+
+    data = render_tile(z, x, y)
+    os.makedirs(directory, exist_ok=True)
+    # Write then rename so a concurrent reader never sees a partial tile
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return data, version
+
+
+def invalidate_tiles(positions):
+    """Bump the version of, and delete, every cached tile holding one of `positions`."""
+    tiles = set()
+    for lat, lng in positions:
+        if lat is None or lng is None:
+            continue
+        for z in range(settings.ROOM_TILE_MAX_ZOOM + 1):
+            tiles.add((z, *tile_of(float(lat), float(lng), z)))
+
+    invalidate_tags(*[_tag(*tile) for tile in tiles])
+    for z, x, y in tiles:
+        directory = _tile_dir(z, x)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if name.startswith(f'{y}-'):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+    return len(tiles)
+
+
+def _run(positions):
+    try:
+        invalidate_tiles(positions)
+    except Exception as e:
+        logger.error(f"Map tile invalidation for {positions} failed: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_tile_invalidation(positions):
+    positions = list(positions)
+    transaction.on_commit(lambda: _executor.submit(_run, positions))
@@ -0,0 +1,219 @@
+import atexit
+import hashlib
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from time import monotonic
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = 11
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+class HyperLogLog:
+    """
+    Fixed-size unique-count sketch (2048 one-byte registers, ~2% error).
+    Sketches merge by taking the max of each register, so stored daily
+    sketches can be combined into unique viewers over any date range.
+    """
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers else bytearray(HLL_REGISTERS)
+
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+        index = x >> (64 - HLL_PRECISION)
+        rest = x & ((1 << (64 - HLL_PRECISION)) - 1)
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        m = HLL_REGISTERS
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+
+class ViewBuffer:
+    """
+    Collects room views in memory between flushes. Any number of views of
+    the same room collapse into one counter, so a flush is a handful of
+    `views = views + n` updates plus one batched insert into the event log.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._events = []
+        self._timer = None
+        self._due = None
+
+    def add(self, room_id, viewer=None):
+        """Record a view. Returns the number of views now pending across all rooms."""
+        with self._lock:
+            self._counts[room_id] += 1
+            self._events.append((room_id, viewer, timezone.now()))
+            return len(self._events)
+
+    def pending(self, room_id):
+        with self._lock:
+            return self._counts.get(room_id, 0)
+
+    def drain(self):
+        """Take everything buffered so far and clear the flush slot."""
+        with self._lock:
+            batch = (self._counts, self._events)
+            self._counts, self._events = Counter(), []
+            self._timer = self._due = None
+            return batch
+
+    def requeue(self, counts, events):
+        """Put a drained batch back (its flush failed), ahead of views recorded since."""
+        with self._lock:
+            self._counts.update(counts)
+            self._events[:0] = events
+
+    def schedule(self, delay, callback):
+        """Run `callback` on a timer thread in `delay` seconds, unless a flush is already due by then."""
+        due = monotonic() + delay
+        with self._lock:
+            if self._timer is not None:
+                if self._due <= due:
+                    return
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, callback)
+            self._timer.daemon = True
+            self._due = due
+            self._timer.start()
+
+
+view_buffer = ViewBuffer()
+
+
+def apply_views(counts, events):
+    """Persist a drained batch: one UPDATE per distinct increment, then the raw events, atomically."""
+    from accounts.models import User
+    from .models import Room, RoomViewEvent
+
+    by_increment = defaultdict(list)
+    for room_id, n in counts.items():
+        by_increment[n].append(room_id)
+    with transaction.atomic():
+        # update() skips save(), so updated_at and the other columns are untouched
+        for n, room_ids in by_increment.items():
+            Room.objects.filter(id__in=room_ids).update(views=F('views') + n)
+
+        # Rooms and viewers deleted since the view was recorded would violate the FK
+        existing = set(Room.objects.filter(id__in=list(counts)).values_list('id', flat=True))
+        viewers = {viewer for _, viewer, _ in events if viewer is not None}
+        live = set(User.objects.filter(id__in=viewers).values_list('id', flat=True)) if viewers else set()
+        RoomViewEvent.objects.bulk_create(
+            [
+                RoomViewEvent(room_id=room_id, viewer_id=viewer if viewer in live else None, viewed_at=viewed_at)
+                for room_id, viewer, viewed_at in events
+                if room_id in existing
+            ],
+            batch_size=500
+        )
+
+
+def flush_views():
+    """
+    Write out whatever the buffer holds. Safe to call from any thread; if the
+    write fails the batch goes back into the buffer and is retried later.
+    """
+    counts, events = view_buffer.drain()
+    if not counts:
+        return
+    close_old_connections()
+    try:
+        apply_views(counts, events)
+    except Exception as e:
+        logger.error(f"Flushing {len(events)} room view(s) failed, will retry: {str(e)}")
+        view_buffer.requeue(counts, events)
+        view_buffer.schedule(max(settings.ROOM_VIEW_FLUSH_SECONDS, 1), flush_views)
+    finally:
+        close_old_connections()
+
+
+def record_view(room_id, viewer=None):
+    """
+    Count one view of a room; `viewer` is the viewing user's id, kept for the
+    unique-viewer estimate when ROOM_VIEW_UNIQUE is on. Nothing is written on
+    the request: a full buffer (or ROOM_VIEW_FLUSH_SECONDS of 0) only moves
+    the background flush up to now.
+    """
+    if not settings.ROOM_VIEW_UNIQUE:
+        viewer = None
+    pending = view_buffer.add(room_id, viewer)
+    if settings.ROOM_VIEW_FLUSH_SECONDS <= 0 or pending >= settings.ROOM_VIEW_FLUSH_MAX:
+        view_buffer.schedule(0, flush_views)
+    else:
+        view_buffer.schedule(settings.ROOM_VIEW_FLUSH_SECONDS, flush_views)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rollup_daily_stats(day):
+    """
+    Build RoomViewStats for one (local) day from the view events, visits and
+    bookings created that day. Safe to re-run: each room's row is rewritten.
+    Returns the number of rooms rolled up.
+    """
+    from .models import Booking, RoomViewEvent, RoomViewStats, Visit
+
+    start, end = _day_bounds(day)
+    window = {'created_at__gte': start, 'created_at__lt': end}
+    rows = defaultdict(lambda: {'views': 0, 'visits': 0, 'bookings': 0, 'sketch': HyperLogLog()})
+
+    events = RoomViewEvent.objects.filter(viewed_at__gte=start, viewed_at__lt=end)
+    for room_id, viewer_id in events.values_list('room_id', 'viewer_id').iterator():
+        rows[room_id]['views'] += 1
+        if viewer_id is not None:
+            rows[room_id]['sketch'].add(viewer_id)
+    for room_id, n in Visit.objects.filter(**window).values('room_id').annotate(n=Count('id')).values_list('room_id', 'n'):
+        rows[room_id]['visits'] = n
+    for room_id, n in Booking.objects.filter(**window).values('room_id').annotate(n=Count('id')).values_list('room_id', 'n'):
+        rows[room_id]['bookings'] = n
+
+    with transaction.atomic():
+        for room_id, row in rows.items():
+            sketch = row.pop('sketch')
+            RoomViewStats.objects.update_or_create(
+                room_id=room_id,
+                date=day,
+                defaults={**row, 'unique_viewers': sketch.count(), 'sketch': sketch.to_bytes()}
+            )
+    return len(rows)
+
+
+def prune_view_events(before):
+    """Delete raw view events older than `before` (a date) once they are rolled up."""
+    from .models import RoomViewEvent
+    start, _ = _day_bounds(before)
+    return RoomViewEvent.objects.filter(viewed_at__lt=start).delete()[0]
+
+
+# Don't lose the last window of views on a clean shutdown (apply_views
+# schedules no background jobs, so it runs fine after executors shut down)
+atexit.register(flush_views)
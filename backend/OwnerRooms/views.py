@@ -1,6 +1,11 @@
 
+import logging
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
@@ -11,14 +16,41 @@ from payments.models import Payment
 from .serializers import (
     RoomSerializer, BookingSerializer, VisitSerializer,
     TenantDashboardSerializer, RoomReviewSerializer,
-    ComplaintSerializer
+    ComplaintSerializer, RoomImageSerializer
 )
 # PaymentSerializer imported locally in tenant_dashboard to avoid circular import
 from chat.models import Conversation, Message
 from chat.serializers import MessageSerializer
 from notifications.utils import send_notification
+from .images import schedule_image_processing, validate_room_images, bulk_store_room_images
+from .viewcounts import HyperLogLog, record_view, view_buffer
+from .recommendations import recommended_room_ids, recommended_rooms
+from .preferences import record_search
+from .availability import BLOCKING_STATUSES, available_rooms, lock_room, overlapping_bookings, sync_room_status
+from .booking_state import TransitionError, transition_booking
+from .map_clusters import COLUMNS as MAP_COLUMNS, map_markers
+from .vector_tiles import CONTENT_TYPE as TILE_CONTENT_TYPE, cached_tile, tile_version
+from .search_cache import AVAILABILITY_PARAMS, METRICS as SEARCH_METRICS, cached_room_ids
+from .payload_cache import METRICS as PAYLOAD_METRICS
+from .tenants import directory_page, directory_rooms, directory_stats
+from stayspot.cache import read_metrics
+from stayspot.sparse_fields import SparseFieldsViewMixin
+
+logger = logging.getLogger(__name__)
+
+# `?<param>=true` amenity filters and the Room fields they require
+AMENITY_FILTERS = {
+    'wifi': 'wifi', 'ac': 'ac', 'tv': 'tv', 'parking': 'parking', 'water_supply': 'water_supply',
+    'attached_bathroom': 'attached_bathroom', 'cctv': 'cctv', 'kitchen': 'kitchen_access', 'furniture': 'furnished',
+}
+# Every query param get_queryset filters on; any of them makes a tenant's room list
+# a search rather than their personalized feed
+SEARCH_FILTERS = (
+    'location', 'gender_preference', 'room_type', 'min_price', 'max_price', 'lat', 'lng', 'radius',
+    *AMENITY_FILTERS, *AVAILABILITY_PARAMS,
+)
 
-class RoomViewSet(viewsets.ModelViewSet):
+class RoomViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = RoomSerializer
     permission_classes = [IsAuthenticated]
     
@@ -47,42 +79,31 @@ class RoomViewSet(viewsets.ModelViewSet):
         if room_type:
             queryset = queryset.filter(room_type=room_type)
         
-        # Amenities
-        wifi = self.request.query_params.get('wifi')
-        ac = self.request.query_params.get('ac')
-        tv = self.request.query_params.get('tv')
-        parking = self.request.query_params.get('parking')
-        water_supply = self.request.query_params.get('water_supply')
-        attached_bathroom = self.request.query_params.get('attached_bathroom')
-        cctv = self.request.query_params.get('cctv')
-        kitchen = self.request.query_params.get('kitchen')
-        furniture = self.request.query_params.get('furniture')
+        # Boolean amenity filters (see AMENITY_FILTERS)
+        for param, field in AMENITY_FILTERS.items():
+            if self.request.query_params.get(param) == 'true':
+                queryset = queryset.filter(**{field: True})
 
         # Price Range
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
 
-        # Distance Search
-        lat = self.request.query_params.get('lat')
-        lng = self.request.query_params.get('lng')
-        radius = self.request.query_params.get('radius') # in km
-        
-        # Boolean Filters
-        if wifi == 'true': queryset = queryset.filter(wifi=True)
-        if ac == 'true': queryset = queryset.filter(ac=True)
-        if tv == 'true': queryset = queryset.filter(tv=True)
-        if parking == 'true': queryset = queryset.filter(parking=True)
-        if water_supply == 'true': queryset = queryset.filter(water_supply=True)
-        if attached_bathroom == 'true': queryset = queryset.filter(attached_bathroom=True)
-        if cctv == 'true': queryset = queryset.filter(cctv=True)
-        if kitchen == 'true': queryset = queryset.filter(kitchen=True)
-        if furniture == 'true': queryset = queryset.filter(furniture=True)
-
         if min_price:
             queryset = queryset.filter(price__gte=min_price)
         if max_price:
             queryset = queryset.filter(price__lte=max_price)
 
+        # Date availability: no confirmed booking overlaps [available_from, available_to]
+        available_from, available_to = (self.request.query_params.get(param) for param in AVAILABILITY_PARAMS)
+        if available_from or available_to:
+            try:
+                start = parse_date(available_from) if available_from else None
+                end = parse_date(available_to) if available_to else None
+            except ValueError:
+                start = end = None
+            if start or end:
+                queryset = available_rooms(queryset, start, end)
+
         # Distance Search
         lat = self.request.query_params.get('lat')
         lng = self.request.query_params.get('lng')
@@ -130,62 +151,74 @@ class RoomViewSet(viewsets.ModelViewSet):
                     queryset = queryset.filter(q_location)
                 pass
             
-        # Update user preferences if filtering (only for Tenants)
-        if user.role == 'Tenant':
-            if (location or gender or room_type or min_price or max_price or wifi or ac or tv):
-                self.update_user_preferences(user, location, gender, room_type, wifi, ac, tv)
+        if self.is_personalized():
+            # No active filters: rank by the tenant's precomputed recommendations
+            from django.db.models import Case, When, IntegerField, Value
+            ids = recommended_room_ids(user)
+            if ids:
+                rank = Case(
+                    *[When(id=room_id, then=Value(i)) for i, room_id in enumerate(ids)],
+                    default=Value(len(ids)),
+                    output_field=IntegerField()
+                )
+                queryset = queryset.annotate(pref_rank=rank).order_by('pref_rank', '-created_at')
             else:
-                # If no active filters were applied, sort by the user's saved preferences
-                try:
-                    pref = user.search_preference
-                    # Build Q objects for ranking 
-                    from django.db.models import Case, When, IntegerField, Value
-                    
-                    # We will assign a "score" to each room based on how many preferences it matches
-                    score_cases = []
-                    
-                    if pref.location:
-                        score_cases.append(When(location__icontains=pref.location, then=Value(1)))
-                    if pref.gender_preference and pref.gender_preference != 'Any':
-                        score_cases.append(When(gender_preference=pref.gender_preference, then=Value(1)))
-                    if pref.room_type:
-                        score_cases.append(When(room_type=pref.room_type, then=Value(1)))
-                    if pref.wifi:
-                        score_cases.append(When(wifi=True, then=Value(1)))
-                    if pref.ac:
-                        score_cases.append(When(ac=True, then=Value(1)))
-                    if pref.tv:
-                        score_cases.append(When(tv=True, then=Value(1)))
-                        
-                    if score_cases:
-                        # Annotate the queryset with the total score
-                        queryset = queryset.annotate(
-                            pref_score=sum(Case(*score_cases, default=Value(0), output_field=IntegerField()) for _ in [1]) 
-                            # Django 1.11+ doesn't easily let you sum multiple Case statements like this in one step
-                            # A better approach is to add them inside the annotation:
-                        )
-                        # Actually doing sum of Multiple Cases:
-                        annotations = {}
-                        score_fields = []
-                        for i, case in enumerate(score_cases):
-                            field_name = f'score_part_{i}'
-                            annotations[field_name] = Case(case, default=Value(0), output_field=IntegerField())
-                            score_fields.append(field_name)
-                            
-                        if annotations:
-                            queryset = queryset.annotate(**annotations)
-                            # Sum up the parts
-                            from django.db.models import F
-                            total_score_expr = sum(F(f) for f in score_fields) if len(score_fields) > 1 else F(score_fields[0])
-                            queryset = queryset.annotate(total_pref_score=total_score_expr).order_by('-total_pref_score', '-created_at')
-                        
-                except UserSearchPreference.DoesNotExist:
-                    queryset = queryset.order_by('-created_at')
+                queryset = queryset.order_by('-created_at')
         else:
              queryset = queryset.order_by('-created_at')
 
         return queryset
 
+    def is_personalized(self):
+        """A tenant listing rooms without search filters gets their own ranking."""
+        params = self.request.query_params
+        return self.request.user.role == 'Tenant' and not any(params.get(key) for key in SEARCH_FILTERS)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Room search served from cache: the ordered id list is cached per
+        normalized query and role, and each room's payload is cached separately
+        (see RoomSerializer).
+        """
+        personalized = self.is_personalized()
+        if request.user.role == 'Tenant' and not personalized:
+            # Preference learning is buffered and flushed in batches; the search stays read-only
+            record_search(request.user.id, request.query_params)
+
+        ids = cached_room_ids(request, personalized, lambda: self.get_queryset().values_list('id', flat=True))
+
+        rooms = self.filter_queryset(Room.objects.all()).in_bulk(ids)
+        # Rooms deleted since the id list was cached are simply skipped
+        ordered = [rooms[room_id] for room_id in ids if room_id in rooms]
+        return Response(self.get_serializer(ordered, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Hit/miss counters for the room search and payload caches (admin only)."""
+        if request.user.role != 'Admin':
+            return Response({'error': 'Only admins can view cache stats.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(read_metrics(SEARCH_METRICS + PAYLOAD_METRICS))
+
+    @action(detail=False, methods=['get'])
+    def map(self, request):
+        """
+        Clustered map markers for a viewport: ?bbox=west,south,east,north&zoom=12.
+        Each marker is a row of `columns`; room_id is set when it is a single room.
+        """
+        try:
+            west, south, east, north = (float(value) for value in request.query_params.get('bbox', '').split(','))
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            return Response(
+                {'error': 'bbox (west,south,east,north) and zoom are required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90 and 0 <= zoom <= 22):
+            return Response({'error': 'bbox or zoom out of range.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        zoom, markers = map_markers((west, south, east, north), zoom)
+        return Response({'zoom': zoom, 'columns': MAP_COLUMNS, 'markers': markers})
+
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
         room = self.get_object()
@@ -193,19 +226,6 @@ class RoomViewSet(viewsets.ModelViewSet):
         serializer = RoomReviewSerializer(reviews, many=True)
         return Response(serializer.data)
     
-    def update_user_preferences(self, user, location, gender, room_type, wifi, ac, tv):
-        pref, created = UserSearchPreference.objects.get_or_create(user=user)
-        if location: pref.location = location
-        if gender: pref.gender_preference = gender
-        if room_type: pref.room_type = room_type
-        
-        # Handle string 'true' / 'false' / None
-        if wifi is not None: pref.wifi = (wifi == 'true' or wifi == True)
-        if ac is not None: pref.ac = (ac == 'true' or ac == True)
-        if tv is not None: pref.tv = (tv == 'true' or tv == True)
-        
-        pref.save()
-
     def perform_create(self, serializer):
         user = self.request.user
         if not user.is_identity_verified and user.role != 'Admin':
@@ -219,36 +239,12 @@ class RoomViewSet(viewsets.ModelViewSet):
         if user.role != 'Tenant':
             return Response({'error': 'Only tenants have suggestions'}, status=status.HTTP_400_BAD_REQUEST)
             
-        queryset = Room.objects.filter(status='Available')
-        
-        try:
-            pref = user.search_preference
-            # Build query based on preferences
-            q_objects = Q()
-            if pref.location:
-                q_objects |= Q(location__icontains=pref.location)
-            if pref.gender_preference and pref.gender_preference != 'Any':
-                q_objects |= Q(gender_preference=pref.gender_preference)
-            if pref.room_type:
-                q_objects |= Q(room_type=pref.room_type)
-            if pref.wifi:
-                q_objects |= Q(wifi=True)
-            if pref.ac:
-                q_objects |= Q(ac=True)
-            if pref.tv:
-                q_objects |= Q(tv=True)
-            
-            if q_objects:
-                queryset = queryset.filter(q_objects).distinct()
-        except UserSearchPreference.DoesNotExist:
-            # No preferences yet, just return recent available rooms
-            pass
-            
+        # Served from the precomputed top-K (OwnerRooms.recommendations)
+        queryset = recommended_rooms(user, 6)
+
         # Fallback to recent available rooms if no matches or no preferences
-        if not queryset.exists():
+        if not queryset:
             queryset = Room.objects.filter(status='Available')[:6]
-        else:
-            queryset = queryset.order_by('-created_at')[:6]
             
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
@@ -258,12 +254,36 @@ class RoomViewSet(viewsets.ModelViewSet):
         room = self.get_object()
         images = request.FILES.getlist('images')
         
-        for image in images:
-            RoomImage.objects.create(room=room, image=image)
+        created = [RoomImage.objects.create(room=room, image=image) for image in images]
+        schedule_image_processing(image.id for image in created)
         
         serializer = self.get_serializer(room)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'])
+    def bulk_upload_images(self, request, pk=None):
+        """
+        Upload many images at once. All files are validated before anything is
+        written; rows are inserted atomically and only the new images are returned.
+        """
+        room = self.get_object()
+        if request.user.role != 'Admin' and room.owner_id != request.user.id:
+            return Response({'error': 'You do not own this room.'}, status=status.HTTP_403_FORBIDDEN)
+
+        files = request.FILES.getlist('images')
+        errors = validate_room_images(files)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            images = bulk_store_room_images(room, files)
+        except Exception as e:
+            logger.exception(f"Bulk image upload for room {room.id} failed: {str(e)}")
+            return Response({'error': 'Upload failed, no images were saved. Please try again.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        serializer = RoomImageSerializer(images, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['delete'], url_path='images/(?P<image_id>[^/.]+)')
     def delete_image(self, request, pk=None, image_id=None):
         room = self.get_object()
@@ -300,14 +320,85 @@ class RoomViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def increment_views(self, request, pk=None):
+        """
+        Count a detail-page view. Views are buffered and flushed in batches
+        (OwnerRooms.viewcounts), so the returned total includes pending views.
+        """
         room = self.get_object()
-        room.views += 1
-        room.save()
-        return Response({'views': room.views})
+        record_view(room.id, viewer=request.user.id)
+        return Response({'views': room.views + view_buffer.pending(room.id)})
+
+    @action(detail=True, methods=['get'])
+    def view_stats(self, request, pk=None):
+        """
+        Daily views and estimated unique viewers for the last `days` days (owner/admin
+        only), from the nightly rollups; `views` is the live total.
+        """
+        from datetime import timedelta
+        room = self.get_object()
+        if request.user.role != 'Admin' and room.owner_id != request.user.id:
+            return Response({'error': 'You do not own this room.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            days = min(int(request.query_params.get('days', 30)), 365)
+        except ValueError:
+            return Response({'error': 'days must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.localdate() - timedelta(days=days - 1)
+        stats = room.view_stats.filter(date__gte=since).values('date', 'views', 'unique_viewers')
+        return Response({'views': room.views + view_buffer.pending(room.id), 'daily': list(stats)})
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """
+        Daily views, unique viewers, visits and bookings for the last `days` days
+        (owner/admin only). Reads the nightly RoomViewStats rollups only.
+        """
+        from datetime import timedelta
+        room = self.get_object()
+        if request.user.role != 'Admin' and room.owner_id != request.user.id:
+            return Response({'error': 'You do not own this room.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            days = min(int(request.query_params.get('days', 30)), 365)
+        except ValueError:
+            return Response({'error': 'days must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.localdate() - timedelta(days=days)
+        rows = list(room.view_stats.filter(date__gte=since).order_by('date'))
+
+        unique = HyperLogLog()
+        for row in rows:
+            if row.sketch:
+                unique.merge(HyperLogLog(bytes(row.sketch)))
+        views = sum(row.views for row in rows)
+        visits = sum(row.visits for row in rows)
+        bookings = sum(row.bookings for row in rows)
+
+        return Response({
+            'room_id': room.id,
+            'since': since,
+            'totals': {
+                'views': views,
+                'unique_viewers': unique.count(),
+                'visits': visits,
+                'bookings': bookings,
+                'visits_per_view': round(visits / views, 4) if views else 0,
+                'bookings_per_view': round(bookings / views, 4) if views else 0,
+            },
+            'daily': [
+                {
+                    'date': row.date,
+                    'views': row.views,
+                    'unique_viewers': row.unique_viewers,
+                    'visits': row.visits,
+                    'bookings': row.bookings,
+                }
+                for row in rows
+            ]
+        })
 
 
 # New ViewSets for tenant dashboard features
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     
@@ -337,43 +428,22 @@ class BookingViewSet(viewsets.ModelViewSet):
                     pass
                 elif booking.room.owner_id != user.id:
                     raise serializers.ValidationError("You do not own this room.")
-                    
-        serializer.save()
-
-        # Update Room status based on booking status
-        if new_status in ['Confirmed', 'Active']:
-            booking.room.status = 'Occupied'
-            booking.room.save()
-            
-            # Auto-create Payment if confirmed
-            from payments.models import Payment
-            from dateutil.relativedelta import relativedelta
-            
-            # Use 1 month after start date as the first due date
-            first_due_date = booking.start_date + relativedelta(months=1)
-            
-            # If the booking is very short (ends before 1 month), set due date to end_date
-            if booking.end_date and first_due_date > booking.end_date:
-                first_due_date = booking.end_date
-            
-            # Check if initial rent payment exists for this specific booking and period
-            if not Payment.objects.filter(booking=booking, payment_type='Rent', due_date=first_due_date).exists():
-                Payment.objects.create(
-                    booking=booking,
-                    amount=booking.monthly_rent,
-                    due_date=first_due_date,
-                    status='Pending',
-                    payment_type='Rent'
-                )
-
 
-        elif new_status in ['Cancelled', 'Rejected', 'Completed']:
-            # If a booking is cancelled/rejected/completed, room becomes available again
-            booking.room.status = 'Available'
-            booking.room.save()
+        # Status, dates and the room change together under the room and booking locks
+        key = self.request.headers.get('Idempotency-Key')
+        try:
+            booking, changed = transition_booking(
+                booking.id, new_status,
+                key=f'booking:{booking.id}:{key[:100]}' if key else None,
+                actor=user,
+                changes={field: value for field, value in serializer.validated_data.items() if field != 'status'}
+            )
+        except TransitionError as e:
+            raise serializers.ValidationError({"error": str(e)})
+        serializer.instance = booking
 
-        # Send notification about status change
-        if new_status:
+        # Send notification about status change (once, however often the request is retried)
+        if changed:
             recipient = booking.room.owner if user.role == 'Tenant' else booking.tenant
             notif_type = f'booking_{new_status.lower()}'
             send_notification(
@@ -387,11 +457,6 @@ class BookingViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         recipient = instance.room.owner if self.request.user.role == 'Tenant' else instance.tenant
         
-        # If the booking was confirmed/active, make the room available again upon deletion
-        if instance.status in ['Confirmed', 'Active']:
-            instance.room.status = 'Available'
-            instance.room.save()
-
         # Send notification before deletion
         send_notification(
             recipient=recipient,
@@ -400,20 +465,29 @@ class BookingViewSet(viewsets.ModelViewSet):
             text=f"Booking for {instance.room.title} has been deleted/cancelled.",
             related_id=instance.id
         )
+        room, held_dates = instance.room, instance.status in BLOCKING_STATUSES
         instance.delete()
+
+        # If the booking was confirmed/active, the room may be available again
+        if held_dates:
+            sync_room_status(room)
     
     def perform_create(self, serializer):
         user = self.request.user
         if not user.is_identity_verified and user.role != 'Admin':
             raise serializers.ValidationError({"error": "Your identity document is pending verification by an administrator." if user.identity_document else "You must provide an identity document before this action."})
         
-        # Check if room is already occupied
-        room_id = serializer.validated_data.get('room').id
-        room = Room.objects.get(id=room_id)
-        if room.status not in ['Available']:
-             raise serializers.ValidationError({"error": "This room is already occupied/unavailable."})
-
-        booking = serializer.save(tenant=user)
+        # Occupied rooms can still be booked for dates after the current stay
+        room = serializer.validated_data.get('room')
+        if room.status not in ['Available', 'Occupied']:
+             raise serializers.ValidationError({"error": "This room is unavailable."})
+
+        start, end = serializer.validated_data['start_date'], serializer.validated_data['end_date']
+        with transaction.atomic():
+            lock_room(room.id)
+            if overlapping_bookings(room.id, start, end).exists():
+                raise serializers.ValidationError({"error": "This room is already booked for those dates."})
+            booking = serializer.save(tenant=user)
         
         # Notify room owner about new booking request
         send_notification(
@@ -425,7 +499,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         )
 
 
-class VisitViewSet(viewsets.ModelViewSet):
+class VisitViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = VisitSerializer
     permission_classes = [IsAuthenticated]
     
@@ -553,38 +627,9 @@ def tenant_dashboard(request):
         Q(conversation__owner=user) | Q(conversation__tenant=user)
     ).order_by('-timestamp')[:3]
     
-    # Get suggested rooms (fallback to any available if no preferences)
-    suggested_rooms = Room.objects.filter(status='Available')
-
-    
-    try:
-        pref = user.search_preference
-
-        q_objects = Q()
-        if pref.location:
-            q_objects |= Q(location__icontains=pref.location)
-        if pref.gender_preference and pref.gender_preference != 'Any':
-            q_objects |= Q(gender_preference=pref.gender_preference)
-        if pref.room_type:
-            q_objects |= Q(room_type=pref.room_type)
-        if pref.wifi:
-            q_objects |= Q(wifi=True)
-        if pref.ac:
-            q_objects |= Q(ac=True)
-        if pref.tv:
-            q_objects |= Q(tv=True)
-        
-        if q_objects:
-            suggested_rooms = suggested_rooms.filter(q_objects).distinct()
+    # Get suggested rooms from the precomputed recommendations (fallback to any available)
+    suggested_rooms = recommended_rooms(user, 3) or Room.objects.filter(status='Available').order_by('-created_at')[:3]
 
-        
-        suggested_rooms = suggested_rooms.order_by('-created_at')[:3]
-    except Exception as e:
-
-        suggested_rooms = suggested_rooms.order_by('-created_at')[:3]
-    
-
-    
     # Serialize data and return
     from payments.serializers import PaymentSerializer
     return Response({
@@ -595,51 +640,67 @@ def tenant_dashboard(request):
         'suggested_rooms': RoomSerializer(suggested_rooms, many=True, context={'request': request}).data,
     })
 
+def room_tile(request, z, x, y):
+    """
+    Vector tile (MVT) of Available rooms: /api/rooms/tiles/{z}/{x}/{y}.pbf.
+    A plain Django view, since the body is binary rather than a DRF-rendered payload.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed.'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=403)
+    if z > settings.ROOM_TILE_MAX_ZOOM or x >= 1 << z or y >= 1 << z:
+        return JsonResponse({'error': 'Tile out of range.'}, status=404)
+
+    etag = f'"{z}-{x}-{y}-{tile_version(z, x, y)}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    else:
+        data, version = cached_tile(z, x, y)
+        response = HttpResponse(data, content_type=TILE_CONTENT_TYPE)
+        etag = f'"{z}-{x}-{y}-{version}"'
+    response['ETag'] = etag
+    # Tiles change in place when a room moves; clients revalidate with the ETag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def owner_tenant_management(request):
     """
     Endpoint for owner's tenant management dashboard.
-    Returns: stats and tenant directory.
+    Returns: stats and one page of the tenant directory (?page=, ?page_size=,
+    ?search= over tenant names/emails, ?room= a room title).
     """
     user = request.user
     if user.role != 'Owner':
         return Response({'error': 'Only owners can access this endpoint'}, status=status.HTTP_403_FORBIDDEN)
 
-    # Get all active/confirmed bookings for the owner's rooms
-    active_bookings = Booking.objects.filter(
-        room__owner=user,
-        status__in=['Active', 'Confirmed']
-    ).select_related('tenant', 'room')
-
-    # Calculate Stats
-    total_tenants = active_bookings.values('tenant').distinct().count()
-    active_leases = active_bookings.count()
-    
-    # Pending Rent: Count of payments with 'Pending' status for owner's bookings
-    pending_rent_count = Payment.objects.filter(
-        booking__room__owner=user,
-        status='Pending'
-    ).count()
-
-    # Maintenance Requests: Complaints for owner's rooms that are maintenance and pending
-    maintenance_requests_count = Complaint.objects.filter(
-        owner=user,
-        complaint_type='Maintenance',
-        status='Pending'
-    ).count()
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = int(request.query_params.get('page_size', settings.OWNER_TENANTS_PAGE_SIZE))
+        page_size = min(max(page_size, 1), settings.OWNER_TENANTS_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'page and page_size must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # A constant number of queries however many leases the owner has
+    bookings, total = directory_page(
+        user, search=request.query_params.get('search', '').strip(),
+        room=request.query_params.get('room'), page=page, page_size=page_size
+    )
 
     # Prepare Tenant Directory
+    today = timezone.now().date()
     tenant_directory = []
-    for booking in active_bookings:
-        # Get the latest payment status for this booking
-        latest_payment = Payment.objects.filter(booking=booking).order_by('-due_date').first()
-        rent_status = latest_payment.status if latest_payment else 'Paid' # Default to Paid if no payment record found
+    for booking in bookings:
+        # Latest payment status, annotated by directory_page; Paid if there is no payment record yet
+        rent_status = booking.rent_status or 'Paid'
         
         # Calculate Lease Status (Simulated for mockup consistency)
         lease_status = booking.status
         # If end_date is within 30 days, mark as 'Expiring Soon'
-        if booking.end_date and (booking.end_date - timezone.now().date()).days <= 30:
+        if booking.end_date and (booking.end_date - today).days <= 30:
             lease_status = 'Expiring Soon'
 
         tenant_directory.append({
@@ -657,16 +718,18 @@ def owner_tenant_management(request):
         })
 
     return Response({
-        'stats': {
-            'total_tenants': total_tenants,
-            'active_leases': active_leases,
-            'pending_rent': pending_rent_count,
-            'maintenance_requests': maintenance_requests_count
+        'stats': directory_stats(user),
+        'tenants': tenant_directory,
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'pages': (total + page_size - 1) // page_size,
         },
-        'tenants': tenant_directory
+        'rooms': directory_rooms(user),
     })
 
-class RoomReviewViewSet(viewsets.ModelViewSet):
+class RoomReviewViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = RoomReviewSerializer
     permission_classes = [IsAuthenticated]
 
@@ -718,7 +781,7 @@ class RoomReviewViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ComplaintViewSet(viewsets.ModelViewSet):
+class ComplaintViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = ComplaintSerializer
     permission_classes = [IsAuthenticated]
 
@@ -800,16 +863,16 @@ def admin_dashboard_stats(request):
     active_complaints = Complaint.objects.filter(status__in=['Pending', 'Investigating']).count()
     
     # 1a. Financial Stats
-    from payments.models import Payment
+    from payments.models import OwnerBalance
     from django.db.models import Sum
     from django.utils import timezone
     
-    all_paid = Payment.objects.filter(status='Paid')
-    total_revenue = all_paid.aggregate(Sum('amount'))['amount__sum'] or 0
+    # One ledger balance row per owner, not one row per payment
+    total_revenue = OwnerBalance.objects.filter(period__isnull=True).aggregate(Sum('received'))['received__sum'] or 0
     
     now = timezone.now()
-    month_paid = all_paid.filter(paid_date__month=now.month, paid_date__year=now.year)
-    this_month_revenue = month_paid.aggregate(Sum('amount'))['amount__sum'] or 0
+    month_balances = OwnerBalance.objects.filter(period=now.date().replace(day=1))
+    this_month_revenue = month_balances.aggregate(Sum('received'))['received__sum'] or 0
     
     # 2. Complaint Status Breakdown
     complaint_stats = {
@@ -6,3 +6,10 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py createcachetable
+python manage.py rebuild_map_clusters
+# Bring room statuses up to date on deploy; this must also run once a day
+# (e.g. a Render cron job: `python manage.py sync_room_occupancy` at 00:05)
+python manage.py sync_room_occupancy
+# Room view stats come from a nightly rollup (`python manage.py rollup_room_stats` at 00:15)
+# Abandoned chat uploads are expired hourly (`python manage.py expire_chat_uploads` at :30)
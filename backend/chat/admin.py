@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, Message, ConversationReceipt
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
@@ -16,3 +16,8 @@ class MessageAdmin(admin.ModelAdmin):
     def text_preview(self, obj):
         return obj.text[:50] + '...' if obj.text and len(obj.text) > 50 else obj.text
     text_preview.short_description = 'Message Text'
+
+@admin.register(ConversationReceipt)
+class ConversationReceiptAdmin(admin.ModelAdmin):
+    list_display = ['id', 'conversation', 'user', 'last_delivered_id', 'last_seen_id', 'updated_at']
+    search_fields = ['user__full_name']
@@ -5,6 +5,7 @@ from .models import Conversation, Message
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from notifications.utils import send_notification
+from .receipts import queue_receipt, LATEST
 
 User = get_user_model()
 
@@ -68,16 +69,30 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 }
             )
         
+        elif event_type == 'receipt':
+            # Client acknowledges the highest message id it has delivered/seen
+            kind = data.get('kind')
+            message_id = data.get('message_id')
+            user_id = self.get_user_id(data)
+            if kind not in ('delivered', 'seen') or not user_id:
+                return
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return
+            queue_receipt(self.conversation_id, self.room_group_name, user_id, kind, message_id)
+
         elif event_type == 'message_seen':
-            # Broadcast that message was seen
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat.seen',
-                    'user_id': data.get('user_id'),
-                    'conversation_id': self.conversation_id
-                }
-            )
+            # Legacy clients: seen everything up to the latest message
+            user_id = self.get_user_id(data)
+            if user_id:
+                queue_receipt(self.conversation_id, self.room_group_name, user_id, 'seen', LATEST)
+
+    def get_user_id(self, data):
+        user = self.scope.get('user')
+        if user and user.is_authenticated:
+            return user.id
+        return data.get('user_id')
 
     # Receive message from room group
     async def chat_message(self, event):
@@ -92,11 +107,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'id': event.get('msg_id')
         }))
 
-    async def chat_seen(self, event):
+    async def chat_receipts(self, event):
+        # One compact frame per flush: {user_id: [delivered_id, seen_id]}
         await self.send(text_data=json.dumps({
-            'type': 'seen',
-            'user_id': event.get('user_id'),
-            'conversation_id': event.get('conversation_id')
+            'type': 'receipts',
+            'conversation_id': event.get('conversation_id'),
+            'receipts': event.get('receipts')
         }))
 
     @database_sync_to_async
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chat.media import expire_uploads
+
+
+class Command(BaseCommand):
+    help = 'Deletes abandoned chunked chat uploads and their partial files (run hourly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.CHAT_UPLOAD_EXPIRE_HOURS,
+                            help='Expire uploads with no chunk received for this long')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        uploads, files = expire_uploads(cutoff)
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {uploads} upload(s) and {files} orphaned partial file(s) older than {cutoff:%Y-%m-%d %H:%M}."
+        ))
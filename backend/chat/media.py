@@ -0,0 +1,225 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+from mediastore.storage import retain
+from .models import ChatUpload, Message
+
+logger = logging.getLogger(__name__)
+
+# Longest edge, in pixels, of each generated WebP preview
+THUMBNAIL_SIZES = (160, 480)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-thumbnails')
+
+
+def file_sha256(fileobj):
+    """SHA-256 hex digest of a Django File, read chunk by chunk."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in fileobj.chunks():
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def find_duplicate(content_hash, kind, *scope):
+    """An earlier message that already stores the same bytes in the same field."""
+    return Message.objects.filter(*scope, content_hash=content_hash).exclude(
+        **{kind: ''}
+    ).exclude(**{f'{kind}__isnull': True}).order_by('id').first()
+
+
+def find_declared_duplicate(content_hash, kind, uploader, conversation, size):
+    """
+    The stored copy a client may reuse by declaring its hash instead of sending
+    the bytes. The hash is only the client's word, so the match is limited to
+    media this uploader sent before or that is already in this conversation,
+    and the stored blob must also have the declared size.
+    """
+    duplicate = find_duplicate(content_hash, kind, Q(sender=uploader) | Q(conversation=conversation))
+    if not duplicate:
+        return None
+    try:
+        stored_size = getattr(duplicate, kind).size
+    except OSError:
+        return None
+    return duplicate if stored_size == size else None
+
+
+def create_media_message(conversation, sender, text, kind, fileobj=None, filename=None, content_hash=None,
+                         duplicate=None):
+    """
+    Create a media message, reusing the stored blob of an identical earlier
+    upload instead of writing the same bytes again. Images get their
+    thumbnails generated off the request thread.
+    """
+    if content_hash is None:
+        content_hash = file_sha256(fileobj)
+    message = Message(conversation=conversation, sender=sender, text=text, content_hash=content_hash)
+
+    if duplicate is None and fileobj is not None:
+        # Hash computed from the received bytes: safe to match any stored copy
+        duplicate = find_duplicate(content_hash, kind)
+    if duplicate:
+        setattr(message, kind, getattr(duplicate, kind).name)
+        message.thumbnails = duplicate.thumbnails
+        for name in [getattr(duplicate, kind).name, *duplicate.thumbnails.values()]:
+            retain(name)
+    elif fileobj is None:
+        raise ValueError("No stored media matches this content hash")
+    else:
+        getattr(message, kind).save(filename, fileobj, save=False)
+    message.save()
+
+    if kind == 'image' and not message.thumbnails:
+        schedule_thumbnails(message.id)
+    return message
+
+
+def schedule_thumbnails(message_id):
+    """Queue thumbnail generation once the message row is committed."""
+    transaction.on_commit(lambda: _executor.submit(_run_thumbnail_job, message_id))
+
+
+def _run_thumbnail_job(message_id):
+    try:
+        generate_thumbnails(message_id)
+    except Exception as e:
+        logger.error(f"Thumbnail generation failed for message {message_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def generate_thumbnails(message_id):
+    """
+    Render every THUMBNAIL_SIZES preview as WebP and record them on the message.
+    Previews already made for the same bytes are reused, with a reference of
+    this message's own, instead of being rendered again.
+    """
+    message = Message.objects.get(id=message_id)
+    if not message.image:
+        return {}
+
+    shared = None
+    if message.content_hash:
+        shared = Message.objects.filter(content_hash=message.content_hash).exclude(
+            id=message.id
+        ).exclude(thumbnails={}).values_list('thumbnails', flat=True).first()
+    if shared:
+        thumbnails = shared
+        for name in thumbnails.values():
+            retain(name)
+    else:
+        thumbnails = {}
+        with message.image.open('rb') as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+            for size in THUMBNAIL_SIZES:
+                preview = image.copy()
+                preview.thumbnail((size, size))
+                buffer = io.BytesIO()
+                preview.save(buffer, format='WEBP', quality=80)
+                name = f"chat_thumbnails/{message.content_hash or message.id}_{size}.webp"
+                thumbnails[str(size)] = default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    if not Message.objects.filter(id=message.id, thumbnails={}).update(thumbnails=thumbnails):
+        # Already has previews (e.g. copied from a duplicate meanwhile): give back ours
+        for name in thumbnails.values():
+            default_storage.delete(name)
+        return Message.objects.get(id=message.id).thumbnails
+    return thumbnails
+
+
+# Chunked, resumable uploads
+
+def partial_path(upload):
+    return os.path.join(settings.CHAT_UPLOAD_TEMP_DIR, f"{upload.id}.part")
+
+
+def append_chunk(upload, data):
+    """
+    Append a chunk to the partial file and advance the upload offset. The
+    caller holds the upload row locked (select_for_update) from the offset
+    check until the transaction commits.
+    """
+    os.makedirs(settings.CHAT_UPLOAD_TEMP_DIR, exist_ok=True)
+    with open(partial_path(upload), 'ab') as part:
+        # Drop any bytes past the acknowledged offset left by an interrupted request
+        part.truncate(upload.received_bytes)
+        part.write(data)
+    upload.received_bytes += len(data)
+    upload.save(update_fields=['received_bytes', 'updated_at'])
+
+
+def discard_partial(upload):
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def expire_uploads(cutoff):
+    """
+    Delete uploads still in progress but untouched since `cutoff`, with their
+    partial files, and any partial file older than that with no upload row
+    (e.g. its conversation was deleted). Returns (uploads, files) removed.
+    """
+    stale = ChatUpload.objects.filter(status='Uploading', updated_at__lt=cutoff)
+    for upload in stale.iterator():
+        discard_partial(upload)
+    uploads, _ = stale.delete()
+
+    files = 0
+    if os.path.isdir(settings.CHAT_UPLOAD_TEMP_DIR):
+        known = {f"{upload_id}.part" for upload_id in ChatUpload.objects.values_list('id', flat=True)}
+        for entry in os.scandir(settings.CHAT_UPLOAD_TEMP_DIR):
+            if entry.name.endswith('.part') and entry.name not in known \
+                    and entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+                files += 1
+    return uploads, files
+
+
+def complete_upload(upload, text=''):
+    """
+    Turn a fully received upload into a message and clean up the partial file.
+    Raises ValueError if the bytes do not match the hash the client declared.
+    """
+    kind = 'image' if upload.is_image else 'file'
+    if upload.received_bytes == 0 and upload.sha256:
+        # Deduplicated at start: the blob already exists, nothing was sent
+        duplicate = find_declared_duplicate(
+            upload.sha256, kind, upload.uploader, upload.conversation, upload.total_size
+        )
+        if not duplicate:
+            raise ValueError("No stored media matches this content hash")
+        message = create_media_message(
+            upload.conversation, upload.uploader, text, kind,
+            content_hash=upload.sha256, duplicate=duplicate
+        )
+    else:
+        with open(partial_path(upload), 'rb') as part:
+            fileobj = File(part)
+            content_hash = file_sha256(fileobj)
+            if upload.sha256 and upload.sha256 != content_hash:
+                raise ValueError("Uploaded content does not match the declared sha256")
+            message = create_media_message(
+                upload.conversation, upload.uploader, text, kind,
+                fileobj=fileobj, filename=upload.filename, content_hash=content_hash
+            )
+        discard_partial(upload)
+
+    upload.status = 'Complete'
+    upload.message = message
+    upload.save(update_fields=['status', 'message', 'updated_at'])
+    return message
@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.conf import settings
 
@@ -38,8 +39,77 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    # Media dedup + generated previews
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    thumbnails = models.JSONField(default=dict, blank=True)  # {"160": "chat_thumbnails/<hash>_160.webp"}
+
     class Meta:
         ordering = ['timestamp']
 
     def __str__(self):
         return f"Message from {self.sender.full_name} at {self.timestamp}"
+
+
+class ConversationReceipt(models.Model):
+    """Highest message id each participant has acknowledged in a conversation."""
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='receipts'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_receipts'
+    )
+    last_delivered_id = models.PositiveBigIntegerField(default=0)
+    last_seen_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('conversation', 'user')
+
+    def __str__(self):
+        return f"Receipt for {self.user.full_name} in conversation {self.conversation_id}"
+
+
+class ChatUpload(models.Model):
+    """A resumable, chunked media upload that becomes a Message once complete."""
+    STATUS_CHOICES = [
+        ('Uploading', 'Uploading'),
+        ('Complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='uploads'
+    )
+    uploader = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_uploads'
+    )
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    total_size = models.PositiveBigIntegerField()
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)  # Optional client-declared hash
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Uploading')
+    message = models.OneToOneField(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.received_bytes}/{self.total_size})"
+
+    @property
+    def is_image(self):
+        return self.content_type.startswith('image/')
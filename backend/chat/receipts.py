@@ -0,0 +1,124 @@
+import asyncio
+import sys
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Max, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Conversation, ConversationReceipt, Message
+
+# Legacy `message_seen` events carry no message id; they acknowledge everything
+# up to the latest message, which is resolved when the batch is flushed.
+LATEST = sys.maxsize
+
+
+class ReceiptBuffer:
+    """
+    Collects delivered/seen acknowledgements per conversation in memory.
+    Only the highest message id per user survives, so any number of acks
+    between two flushes collapse into a single write.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._scheduled = set()
+
+    def add(self, conversation_id, user_id, kind, message_id):
+        """Record an ack. Returns True if the conversation needs a flush scheduled."""
+        acks = self._pending.setdefault(conversation_id, {}).setdefault(
+            user_id, {'delivered': 0, 'seen': 0}
+        )
+        acks[kind] = max(acks[kind], message_id)
+        # Seeing a message implies it was delivered
+        acks['delivered'] = max(acks['delivered'], acks['seen'])
+
+        if conversation_id in self._scheduled:
+            return False
+        self._scheduled.add(conversation_id)
+        return True
+
+    def drain(self, conversation_id):
+        """Take all pending acks for a conversation and clear its flush slot."""
+        self._scheduled.discard(conversation_id)
+        return self._pending.pop(conversation_id, {})
+
+
+receipt_buffer = ReceiptBuffer()
+_flush_tasks = set()
+
+
+def apply_receipts(conversation_id, batch):
+    """
+    Persist a batch of acks ({user_id: {'delivered': id, 'seen': id}}).
+    Returns the compact broadcast payload {user_id: [delivered_id, seen_id]}.
+
+    Receipts only ever move forward (GREATEST in the UPDATE, so a concurrent
+    flush can't roll them back), and acks from users who aren't participants
+    of the conversation are dropped.
+    """
+    conversation = Conversation.objects.filter(id=conversation_id).values('owner_id', 'tenant_id').first()
+    if conversation is None:
+        return {}
+    participants = {conversation['owner_id'], conversation['tenant_id']}
+    batch = {user_id: acks for user_id, acks in batch.items() if int(user_id) in participants}
+    if not batch:
+        return {}
+
+    latest_id = Message.objects.filter(conversation_id=conversation_id).aggregate(
+        latest=Max('id')
+    )['latest'] or 0
+
+    for user_id, acks in batch.items():
+        seen = min(acks.get('seen', 0), latest_id)
+        delivered = max(min(acks.get('delivered', 0), latest_id), seen)
+
+        ConversationReceipt.objects.get_or_create(conversation_id=conversation_id, user_id=user_id)
+        advanced = ConversationReceipt.objects.filter(
+            Q(last_delivered_id__lt=delivered) | Q(last_seen_id__lt=seen),
+            conversation_id=conversation_id,
+            user_id=user_id
+        ).update(
+            last_delivered_id=Greatest('last_delivered_id', delivered),
+            last_seen_id=Greatest('last_seen_id', seen),
+            updated_at=timezone.now()
+        )
+        if advanced and seen:
+            Message.objects.filter(
+                conversation_id=conversation_id,
+                id__lte=seen,
+                is_read=False
+            ).exclude(sender_id=user_id).update(is_read=True)
+
+    receipts = ConversationReceipt.objects.filter(
+        conversation_id=conversation_id, user_id__in=batch
+    ).values_list('user_id', 'last_delivered_id', 'last_seen_id')
+    return {str(user_id): [delivered, seen] for user_id, delivered, seen in receipts}
+
+
+async def flush_receipts(conversation_id, group_name):
+    """Wait out the flush window, then write and broadcast the batch once."""
+    await asyncio.sleep(settings.CHAT_RECEIPT_FLUSH_MS / 1000)
+    batch = receipt_buffer.drain(conversation_id)
+    if not batch:
+        return
+
+    payload = await database_sync_to_async(apply_receipts)(conversation_id, batch)
+    if not payload:
+        return
+    await get_channel_layer().group_send(
+        group_name,
+        {
+            'type': 'chat.receipts',
+            'conversation_id': conversation_id,
+            'receipts': payload
+        }
+    )
+
+
+def queue_receipt(conversation_id, group_name, user_id, kind, message_id):
+    """Buffer an ack and make sure exactly one flush is pending for the conversation."""
+    if receipt_buffer.add(conversation_id, user_id, kind, message_id):
+        task = asyncio.ensure_future(flush_receipts(conversation_id, group_name))
+        _flush_tasks.add(task)
+        task.add_done_callback(_flush_tasks.discard)
@@ -1,28 +1,37 @@
 from rest_framework import serializers
+from django.core.files.storage import default_storage
 from .models import Conversation, Message
 from django.contrib.auth import get_user_model
+from stayspot.sparse_fields import SparseFieldsMixin
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'full_name', 'role', 'username']
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sender_name = serializers.ReadOnlyField(source='sender.full_name')
+    thumbnail_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
-        fields = ['id', 'conversation', 'sender', 'sender_name', 'text', 'image', 'file', 'is_read', 'timestamp']
+        fields = ['id', 'conversation', 'sender', 'sender_name', 'text', 'image', 'file', 'thumbnail_urls', 'is_read', 'timestamp']
+        field_dependencies = {'thumbnail_urls': ['thumbnails']}
 
-class ConversationSerializer(serializers.ModelSerializer):
+    def get_thumbnail_urls(self, obj):
+        # {"160": url, "480": url}; empty until the background pipeline has run
+        return {size: default_storage.url(name) for size, name in (obj.thumbnails or {}).items()}
+
+class ConversationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     other_user = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
 
     class Meta:
         model = Conversation
         fields = ['id', 'owner', 'tenant', 'other_user', 'last_message', 'updated_at']
+        field_dependencies = {'other_user': ['owner', 'tenant'], 'last_message': ['messages']}
 
     def get_other_user(self, obj):
         request_user = self.context.get('request').user
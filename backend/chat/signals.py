@@ -0,0 +1,17 @@
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from mediastore.storage import is_blob
+from .models import Message
+
+
+# Every message holds its own reference to its media and previews (duplicates
+# retain the shared blob), so each deleted message releases its own. Plain
+# files may be shared by duplicates without any count, so they are left alone.
+
+@receiver(post_delete, sender=Message)
+def release_message_files(sender, instance, **kwargs):
+    names = [instance.image.name if instance.image else None, instance.file.name if instance.file else None]
+    for name in [*names, *(instance.thumbnails or {}).values()]:
+        if is_blob(name):
+            default_storage.delete(name)
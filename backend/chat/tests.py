@@ -171,3 +171,277 @@ class ChatIntegrationTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIsInstance(response.json(), list)
         print("[RESULT]: SUCCESS - Authenticated chat API call returned 200 OK.")
+
+
+class ChatReceiptTests(TestCase):
+    """
+    UNIT TESTS — Batched Delivery/Seen Receipts
+    Tests ack coalescing in the buffer and the single batched DB write.
+    """
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='rcpt_owner@gmail.com', email='rcpt_owner@gmail.com', password='123',
+            full_name='Receipt Owner', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='rcpt_tenant@gmail.com', email='rcpt_tenant@gmail.com', password='123',
+            full_name='Receipt Tenant', role='Tenant'
+        )
+        self.conversation = Conversation.objects.create(owner=self.owner, tenant=self.tenant)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.owner, text=f'msg {i}')
+            for i in range(3)
+        ]
+
+    def test_buffer_keeps_highest_ack_and_schedules_once(self):
+        """Many acks between flushes should collapse to the max id with one flush scheduled."""
+        print("\n[RUNNING]: test_buffer_keeps_highest_ack_and_schedules_once")
+        from .receipts import ReceiptBuffer
+        buffer = ReceiptBuffer()
+        self.assertTrue(buffer.add(1, 7, 'delivered', 10))
+        self.assertFalse(buffer.add(1, 7, 'seen', 8))
+        self.assertFalse(buffer.add(1, 7, 'seen', 5))
+        batch = buffer.drain(1)
+        self.assertEqual(batch, {7: {'delivered': 10, 'seen': 8}})
+        self.assertTrue(buffer.add(1, 7, 'seen', 12))
+        print("[RESULT]: SUCCESS - Acks coalesced and flush scheduled once per window.")
+
+    def test_apply_receipts_marks_only_acknowledged_messages(self):
+        """Seen receipt should mark messages up to its id as read, and nothing after."""
+        print("\n[RUNNING]: test_apply_receipts_marks_only_acknowledged_messages")
+        from .receipts import apply_receipts
+        from .models import ConversationReceipt
+        seen_id = self.messages[1].id
+        payload = apply_receipts(self.conversation.id, {self.tenant.id: {'delivered': seen_id, 'seen': seen_id}})
+        self.assertEqual(payload, {str(self.tenant.id): [seen_id, seen_id]})
+        read_flags = list(Message.objects.filter(conversation=self.conversation).values_list('is_read', flat=True))
+        self.assertEqual(read_flags, [True, True, False])
+        receipt = ConversationReceipt.objects.get(conversation=self.conversation, user=self.tenant)
+        self.assertEqual(receipt.last_seen_id, seen_id)
+        print("[RESULT]: SUCCESS - Receipt persisted and only acknowledged messages marked read.")
+
+    def test_apply_receipts_never_moves_back_or_admits_strangers(self):
+        """An older ack must not lower a stored receipt, and non-participants get no rows."""
+        print("\n[RUNNING]: test_apply_receipts_never_moves_back_or_admits_strangers")
+        from .receipts import apply_receipts
+        from .models import ConversationReceipt
+        stranger = User.objects.create_user(
+            username='rcpt_stranger@gmail.com', email='rcpt_stranger@gmail.com', password='123',
+            full_name='Receipt Stranger', role='Tenant'
+        )
+        newest, older = self.messages[2].id, self.messages[0].id
+        apply_receipts(self.conversation.id, {self.tenant.id: {'delivered': newest, 'seen': newest}})
+        payload = apply_receipts(self.conversation.id, {
+            self.tenant.id: {'delivered': older, 'seen': older},
+            stranger.id: {'delivered': newest, 'seen': newest},
+            999999: {'delivered': newest, 'seen': newest},
+        })
+        self.assertEqual(payload, {str(self.tenant.id): [newest, newest]})
+        self.assertEqual(
+            list(ConversationReceipt.objects.filter(conversation=self.conversation).values_list('user_id', flat=True)),
+            [self.tenant.id]
+        )
+        print("[RESULT]: SUCCESS - Receipts only move forward, for participants only.")
+
+    def test_mark_as_read_api_without_up_to_marks_all(self):
+        """REST mark_as_read should still mark the whole conversation when no id is sent."""
+        print("\n[RUNNING]: test_mark_as_read_api_without_up_to_marks_all")
+        from django.test import Client
+        client = Client()
+        client.force_login(self.tenant)
+        response = client.post(f'/api/chat/{self.conversation.id}/mark_as_read/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Message.objects.filter(conversation=self.conversation, is_read=False).exists())
+        last_id = self.messages[-1].id
+        self.assertEqual(response.json()['receipts'][str(self.tenant.id)], [last_id, last_id])
+        print("[RESULT]: SUCCESS - Legacy mark_as_read clamps to the latest message.")
+
+
+class ChatMediaUploadTests(TestCase):
+    """
+    INTEGRATION TESTS — Chunked Media Uploads
+    Tests resumable chunk upload, content-hash dedup and WebP thumbnails.
+    """
+    def setUp(self):
+        import io
+        import tempfile
+        from PIL import Image
+        from django.test import Client, override_settings
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.tmp.name,
+            CHAT_UPLOAD_TEMP_DIR=f"{self.tmp.name}/partial",
+            CHAT_UPLOAD_CHUNK_BYTES=1024
+        )
+        self.settings_override.enable()
+
+        self.owner = User.objects.create_user(
+            username='media_owner@gmail.com', email='media_owner@gmail.com', password='123',
+            full_name='Media Owner', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='media_tenant@gmail.com', email='media_tenant@gmail.com', password='123',
+            full_name='Media Tenant', role='Tenant'
+        )
+        self.conversation = Conversation.objects.create(owner=self.owner, tenant=self.tenant)
+        self.client = Client()
+        self.client.force_login(self.tenant)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), color=(200, 30, 30)).save(buffer, format='PNG')
+        self.image_bytes = buffer.getvalue()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def upload_in_chunks(self, data, **extra):
+        base = f'/api/chat/{self.conversation.id}/uploads/'
+        start = self.client.post(base, {
+            'filename': 'room.png', 'content_type': 'image/png', 'size': len(data), **extra
+        })
+        self.assertEqual(start.status_code, 201)
+        state = start.json()
+        if state['status'] == 'Complete':
+            return state
+        url = f"{base}{state['upload_id']}/"
+        for offset in range(0, len(data), state['chunk_size']):
+            chunk = data[offset:offset + state['chunk_size']]
+            response = self.client.put(f'{url}?offset={offset}', data=chunk, content_type='application/octet-stream')
+            self.assertEqual(response.status_code, 200)
+        return self.client.post(f'{url}complete/', {'text': 'photo'}).json()
+
+    def test_chunked_upload_creates_message_and_thumbnails(self):
+        """All chunks + complete should produce an image message with WebP previews."""
+        print("\n[RUNNING]: test_chunked_upload_creates_message_and_thumbnails")
+        from .media import generate_thumbnails
+        from .serializers import MessageSerializer
+        state = self.upload_in_chunks(self.image_bytes)
+        self.assertEqual(state['status'], 'Complete')
+        message = Message.objects.get(id=state['message']['id'])
+        self.assertTrue(message.image.name.endswith('.png'))
+
+        thumbnails = generate_thumbnails(message.id)
+        self.assertEqual(set(thumbnails), {'160', '480'})
+        message.refresh_from_db()
+        urls = MessageSerializer(message).data['thumbnail_urls']
+        self.assertTrue(urls['160'].endswith('.webp'))
+        print("[RESULT]: SUCCESS - Chunked upload stored and thumbnails generated.")
+
+    def test_shared_thumbnails_are_referenced_per_message(self):
+        """Duplicates reuse one set of previews, each message holds its own references and releases them."""
+        print("\n[RUNNING]: test_shared_thumbnails_are_referenced_per_message")
+        from mediastore.models import MediaBlob
+        from .media import generate_thumbnails
+        first = Message.objects.get(id=self.upload_in_chunks(self.image_bytes)['message']['id'])
+        second = Message.objects.get(id=self.upload_in_chunks(self.image_bytes)['message']['id'])
+        thumbnails = generate_thumbnails(first.id)
+        self.assertEqual(generate_thumbnails(second.id), thumbnails)
+
+        names = [first.image.name, *thumbnails.values()]
+        self.assertTrue(all(name.startswith('blobs/') for name in names))
+        self.assertEqual(list(MediaBlob.objects.filter(name__in=names).values_list('ref_count', flat=True)), [2] * 3)
+
+        # A cascade delete still releases every message's references
+        self.conversation.delete()
+        self.assertEqual(list(MediaBlob.objects.filter(name__in=names).values_list('ref_count', flat=True)), [0] * 3)
+        print("[RESULT]: SUCCESS - Thumbnail references follow the messages.")
+
+    def test_out_of_order_chunk_returns_resume_offset(self):
+        """A chunk sent at the wrong offset should be rejected with the offset to resume from."""
+        print("\n[RUNNING]: test_out_of_order_chunk_returns_resume_offset")
+        start = self.client.post(f'/api/chat/{self.conversation.id}/uploads/', {
+            'filename': 'room.png', 'content_type': 'image/png', 'size': len(self.image_bytes)
+        }).json()
+        url = f"/api/chat/{self.conversation.id}/uploads/{start['upload_id']}/"
+        response = self.client.put(f'{url}?offset=1024', data=b'x' * 10, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 0)
+        print("[RESULT]: SUCCESS - Out-of-order chunk rejected with resume offset.")
+
+    def test_abandoned_uploads_expire(self):
+        """Idle unfinished uploads and partial files without a row are removed; active ones stay."""
+        print("\n[RUNNING]: test_abandoned_uploads_expire")
+        import io
+        import os
+        from datetime import timedelta
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .media import partial_path
+        from .models import ChatUpload
+        base = f'/api/chat/{self.conversation.id}/uploads/'
+        uploads = []
+        for _ in range(2):
+            state = self.client.post(base, {
+                'filename': 'room.png', 'content_type': 'image/png', 'size': len(self.image_bytes)
+            }).json()
+            self.client.put(f"{base}{state['upload_id']}/?offset=0", data=self.image_bytes[:1024],
+                            content_type='application/octet-stream')
+            uploads.append(ChatUpload.objects.get(id=state['upload_id']))
+        stale, active = uploads
+        ChatUpload.objects.filter(id=stale.id).update(updated_at=timezone.now() - timedelta(days=2))
+        orphan = os.path.join(self.tmp.name, 'partial', 'gone.part')
+        with open(orphan, 'wb') as part:
+            part.write(b'x')
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(orphan, (old, old))
+
+        call_command('expire_chat_uploads', stdout=io.StringIO())
+        self.assertEqual(list(ChatUpload.objects.values_list('id', flat=True)), [active.id])
+        self.assertFalse(os.path.exists(partial_path(stale)))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(partial_path(active)))
+        print("[RESULT]: SUCCESS - Abandoned uploads expired.")
+
+    def test_known_hash_is_deduplicated_without_upload(self):
+        """Declaring the sha256 of stored media should complete instantly and reuse the blob."""
+        print("\n[RUNNING]: test_known_hash_is_deduplicated_without_upload")
+        import hashlib
+        first = self.upload_in_chunks(self.image_bytes)
+        digest = hashlib.sha256(self.image_bytes).hexdigest()
+        second = self.upload_in_chunks(self.image_bytes, sha256=digest)
+        self.assertEqual(second['offset'], 0)
+        self.assertEqual(second['message']['image'], first['message']['image'])
+        print("[RESULT]: SUCCESS - Duplicate media reused without re-uploading bytes.")
+
+    def test_declared_hash_only_reuses_media_the_uploader_can_see(self):
+        """A known hash from another conversation, or with the wrong size, must still send its bytes."""
+        print("\n[RUNNING]: test_declared_hash_only_reuses_media_the_uploader_can_see")
+        import hashlib
+        first = self.upload_in_chunks(self.image_bytes)
+        digest = hashlib.sha256(self.image_bytes).hexdigest()
+
+        wrong_size = self.client.post(f'/api/chat/{self.conversation.id}/uploads/', {
+            'filename': 'room.png', 'content_type': 'image/png', 'size': len(self.image_bytes) + 1, 'sha256': digest
+        }).json()
+        self.assertEqual(wrong_size['status'], 'Uploading')
+
+        stranger = User.objects.create_user(
+            username='media_stranger@gmail.com', email='media_stranger@gmail.com', password='123',
+            full_name='Media Stranger', role='Tenant'
+        )
+        self.conversation = Conversation.objects.create(owner=self.owner, tenant=stranger)
+        self.client.force_login(stranger)
+        start = self.client.post(f'/api/chat/{self.conversation.id}/uploads/', {
+            'filename': 'room.png', 'content_type': 'image/png', 'size': len(self.image_bytes), 'sha256': digest
+        }).json()
+        self.assertEqual(start['status'], 'Uploading')
+        self.assertIsNone(start['message'])
+        self.assertFalse(Message.objects.filter(conversation=self.conversation).exists())
+
+        # Sending the real bytes still shares the stored blob
+        second = self.upload_in_chunks(self.image_bytes, sha256=digest)
+        self.assertEqual(second['message']['image'], first['message']['image'])
+        print("[RESULT]: SUCCESS - Declared hashes only skip the upload for visible, same-size media.")
+
+    def test_send_media_rejects_oversized_file(self):
+        """send_media should enforce the configured size limit."""
+        print("\n[RUNNING]: test_send_media_rejects_oversized_file")
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        with override_settings(CHAT_UPLOAD_MAX_BYTES=100):
+            response = self.client.post(f'/api/chat/{self.conversation.id}/send_media/', {
+                'image': SimpleUploadedFile('big.png', self.image_bytes, content_type='image/png')
+            })
+        self.assertEqual(response.status_code, 400)
+        print("[RESULT]: SUCCESS - Oversized media rejected.")
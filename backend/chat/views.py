@@ -1,11 +1,16 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Q
-from .models import Conversation, Message
+from django.conf import settings
+from .models import Conversation, Message, ChatUpload
 from .serializers import ConversationSerializer, MessageSerializer, UserSerializer
 from django.contrib.auth import get_user_model
 from notifications.utils import send_notification
+from stayspot.sparse_fields import sparse_kwargs, sparse_queryset
+from .receipts import apply_receipts, LATEST
+from .media import create_media_message, append_chunk, complete_upload, discard_partial, find_declared_duplicate
 
 User = get_user_model()
 
@@ -14,10 +19,12 @@ class ChatViewSet(viewsets.ViewSet):
 
     def list(self, request):
         """List all conversations for the current user."""
+        sparse = sparse_kwargs(request)
         conversations = Conversation.objects.filter(
             Q(owner=request.user) | Q(tenant=request.user)
         ).order_by('-updated_at')
-        serializer = ConversationSerializer(conversations, many=True, context={'request': request})
+        conversations = sparse_queryset(conversations, ConversationSerializer, **sparse)
+        serializer = ConversationSerializer(conversations, many=True, context={'request': request}, **sparse)
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
@@ -58,8 +65,9 @@ class ChatViewSet(viewsets.ViewSet):
         # Mark messages as read when fetched
         Message.objects.filter(conversation=conversation, is_read=False).exclude(sender=request.user).update(is_read=True)
 
-        messages = conversation.messages.all()
-        serializer = MessageSerializer(messages, many=True)
+        sparse = sparse_kwargs(request)
+        messages = sparse_queryset(conversation.messages.all(), MessageSerializer, **sparse)
+        serializer = MessageSerializer(messages, many=True, **sparse)
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
@@ -72,8 +80,15 @@ class ChatViewSet(viewsets.ViewSet):
         except Conversation.DoesNotExist:
             return Response({"error": "Conversation not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        Message.objects.filter(conversation=conversation, is_read=False).exclude(sender=request.user).update(is_read=True)
-        return Response({"message": "Messages marked as read"})
+        # Optional `up_to` message id; without it everything so far counts as seen
+        up_to = request.data.get('up_to')
+        try:
+            up_to = int(up_to) if up_to else LATEST
+        except (TypeError, ValueError):
+            return Response({"error": "up_to must be a message id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        receipts = apply_receipts(conversation.id, {request.user.id: {'delivered': up_to, 'seen': up_to}})
+        return Response({"message": "Messages marked as read", "receipts": receipts})
 
     @action(detail=True, methods=['post'])
     def send_media(self, request, pk=None):
@@ -92,27 +107,174 @@ class ChatViewSet(viewsets.ViewSet):
         if not image and not file and not text:
             return Response({"error": "No content provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=request.user,
-            text=text,
-            image=image,
-            file=file
-        )
+        upload = image or file
+        if upload and upload.size > settings.CHAT_UPLOAD_MAX_BYTES:
+            return Response(
+                {"error": f"File exceeds the {settings.CHAT_UPLOAD_MAX_BYTES // (1024 * 1024)} MB limit"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if upload:
+            kind = 'image' if image else 'file'
+            message = create_media_message(conversation, request.user, text, kind, fileobj=upload, filename=upload.name)
+        else:
+            message = Message.objects.create(conversation=conversation, sender=request.user, text=text)
 
         # Update conversation timestamp
         conversation.save() 
 
-        # Send global notification to the other user
-        recipient = conversation.tenant if conversation.owner == request.user else conversation.owner
         media_type = 'image' if image else 'file' if file else 'message'
+        self.notify_recipient(conversation, request.user, media_type)
+
+        serializer = MessageSerializer(message)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post'], url_path='uploads')
+    def start_upload(self, request, pk=None):
+        """
+        Start a chunked, resumable media upload.
+        If the client declares the sha256 and size of media it sent before, or
+        that is already in this conversation, the message is created straight
+        away and no bytes need to be sent.
+        """
+        conversation = self.get_conversation(request, pk)
+        if not conversation:
+            return Response({"error": "Conversation not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        filename = request.data.get('filename')
+        content_type = request.data.get('content_type', '')
+        sha256 = (request.data.get('sha256') or '').lower()
+        try:
+            total_size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            total_size = 0
+
+        if not filename or total_size <= 0:
+            return Response({"error": "filename and size are required"}, status=status.HTTP_400_BAD_REQUEST)
+        if total_size > settings.CHAT_UPLOAD_MAX_BYTES:
+            return Response(
+                {"error": f"File exceeds the {settings.CHAT_UPLOAD_MAX_BYTES // (1024 * 1024)} MB limit"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        upload = ChatUpload.objects.create(
+            conversation=conversation,
+            uploader=request.user,
+            filename=filename,
+            content_type=content_type,
+            total_size=total_size,
+            sha256=sha256
+        )
+
+        kind = 'image' if upload.is_image else 'file'
+        if sha256 and find_declared_duplicate(sha256, kind, request.user, conversation, total_size):
+            message = complete_upload(upload, request.data.get('text', ''))
+            conversation.save()
+            self.notify_recipient(conversation, request.user, kind)
+            return Response(self.upload_state(upload, message), status=status.HTTP_201_CREATED)
+
+        return Response(self.upload_state(upload), status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'put'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)')
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """
+        GET returns the current offset so an interrupted client can resume.
+        PUT appends a raw chunk at the `offset` query param (must equal the current offset).
+        """
+        if request.method == 'GET':
+            upload = self.get_upload(request, pk, upload_id)
+            if not upload:
+                return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(self.upload_state(upload, upload.message))
+
+        data = request.body
+        with transaction.atomic():
+            # Concurrent PUTs for one upload (a retried request) append one at a time
+            upload = self.get_upload(request, pk, upload_id, lock=True)
+            if not upload:
+                return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+            if upload.status == 'Complete':
+                return Response(self.upload_state(upload, upload.message))
+
+            try:
+                offset = int(request.query_params.get('offset', upload.received_bytes))
+            except (TypeError, ValueError):
+                return Response({"error": "offset must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            if offset != upload.received_bytes:
+                # Client is out of sync; tell it where to resume from
+                return Response(self.upload_state(upload), status=status.HTTP_409_CONFLICT)
+
+            if not data:
+                return Response({"error": "Empty chunk"}, status=status.HTTP_400_BAD_REQUEST)
+            if len(data) > settings.CHAT_UPLOAD_CHUNK_BYTES:
+                return Response(
+                    {"error": f"Chunks must be at most {settings.CHAT_UPLOAD_CHUNK_BYTES} bytes"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if upload.received_bytes + len(data) > upload.total_size:
+                return Response({"error": "Chunk exceeds the declared file size"}, status=status.HTTP_400_BAD_REQUEST)
+
+            append_chunk(upload, data)
+        return Response(self.upload_state(upload))
+
+    @action(detail=True, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/complete')
+    def finish_upload(self, request, pk=None, upload_id=None):
+        """Finish a chunked upload and post it to the conversation as a message."""
+        upload = self.get_upload(request, pk, upload_id)
+        if not upload:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if upload.status == 'Complete':
+            return Response(self.upload_state(upload, upload.message))
+        if upload.received_bytes != upload.total_size:
+            return Response(
+                {"error": "Upload is incomplete", **self.upload_state(upload)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            message = complete_upload(upload, request.data.get('text', ''))
+        except ValueError as e:
+            # Corrupted transfer: start the bytes over
+            discard_partial(upload)
+            upload.received_bytes = 0
+            upload.save(update_fields=['received_bytes', 'updated_at'])
+            return Response({"error": str(e), **self.upload_state(upload)}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload.conversation.save()
+        self.notify_recipient(upload.conversation, request.user, 'image' if upload.is_image else 'file')
+        return Response(self.upload_state(upload, message))
+
+    def get_conversation(self, request, pk):
+        return Conversation.objects.filter(
+            Q(id=pk) & (Q(owner=request.user) | Q(tenant=request.user))
+        ).first()
+
+    def get_upload(self, request, pk, upload_id, lock=False):
+        uploads = ChatUpload.objects.filter(
+            id=upload_id, conversation_id=pk, uploader=request.user
+        ).select_related('conversation', 'message')
+        if lock:
+            uploads = uploads.select_for_update(of=('self',))
+        return uploads.first()
+
+    def upload_state(self, upload, message=None):
+        return {
+            "upload_id": str(upload.id),
+            "offset": upload.received_bytes,
+            "size": upload.total_size,
+            "chunk_size": settings.CHAT_UPLOAD_CHUNK_BYTES,
+            "status": upload.status,
+            "message": MessageSerializer(message).data if message else None,
+        }
+
+    def notify_recipient(self, conversation, sender, media_type):
+        """Send global notification to the other user."""
+        recipient = conversation.tenant if conversation.owner == sender else conversation.owner
         send_notification(
             recipient=recipient,
-            actor=request.user,
+            actor=sender,
             notification_type='message',
-            text=f"New {media_type} from {request.user.full_name}",
+            text=f"New {media_type} from {sender.full_name}",
             related_id=conversation.id
         )
-
-        serializer = MessageSerializer(message)
-        return Response(serializer.data)
@@ -0,0 +1,66 @@
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from mediastore.models import MediaBlob
+from mediastore.storage import BLOB_PREFIX
+from mediastore.utils import count_blob_references
+
+
+class Command(BaseCommand):
+    help = 'Removes media blobs that are no longer referenced by any row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rescan', action='store_true',
+                            help='Recount references from the database before collecting')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Keep unreferenced blobs touched more recently than this (in-flight uploads)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        root = os.path.join(default_storage.location, BLOB_PREFIX)
+
+        if options['rescan']:
+            fixed = self.rescan(dry_run)
+            self.stdout.write(f"Corrected reference counts on {fixed} blob(s).")
+
+        removed = 0
+        freed = 0
+        for blob in MediaBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff).iterator():
+            removed += 1
+            freed += blob.size
+            if not dry_run:
+                path = default_storage.path(blob.name)
+                if os.path.exists(path):
+                    os.remove(path)
+                blob.delete()
+
+        # Files on disk with no MediaBlob row (e.g. an interrupted save)
+        known = set(MediaBlob.objects.values_list('name', flat=True))
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, default_storage.location).replace(os.sep, '/')
+                mtime = datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc)
+                if name not in known and mtime < cutoff:
+                    removed += 1
+                    freed += os.path.getsize(path)
+                    if not dry_run:
+                        os.remove(path)
+
+        verb = "Would remove" if dry_run else "Removed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} orphaned blob(s), {freed / (1024 * 1024):.1f} MB."))
+
+    def rescan(self, dry_run):
+        counts = count_blob_references()
+        fixed = 0
+        for blob in MediaBlob.objects.iterator():
+            actual = counts.get(blob.name, 0)
+            if blob.ref_count != actual:
+                fixed += 1
+                if not dry_run:
+                    MediaBlob.objects.filter(id=blob.id).update(ref_count=actual, updated_at=timezone.now())
+        return fixed
@@ -0,0 +1,79 @@
+import os
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from mediastore.storage import ContentAddressedStorage, is_blob, retain
+from mediastore.utils import iter_media_fields, rewrite_json_strings
+
+
+class Command(BaseCommand):
+    help = 'Moves the existing media tree (room_images/, chat_images/, ...) into the content-addressed blob store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be converted')
+        parser.add_argument('--delete-originals', action='store_true',
+                            help='Remove the legacy files once every reference has been rewritten')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("DEFAULT_FILE_STORAGE is not the content-addressed storage (is MEDIA_DEDUP off?)")
+
+        self.dry_run = options['dry_run']
+        self.legacy = FileSystemStorage()
+        self.converted = {}  # legacy name -> blob name
+        self.missing = set()
+        rows = 0
+
+        for model, field in iter_media_fields():
+            manager = model._default_manager
+            if isinstance(field, models.FileField):
+                queryset = manager.exclude(**{f'{field.name}__isnull': True}).exclude(
+                    **{field.name: ''}
+                ).exclude(**{f'{field.name}__startswith': 'blobs/'})
+                for pk, name in queryset.values_list('pk', field.name).iterator():
+                    new_name = self.convert(name)
+                    if new_name and not self.dry_run:
+                        manager.filter(pk=pk).update(**{field.name: new_name})
+                        rows += 1
+            else:
+                queryset = manager.exclude(**{f'{field.name}__isnull': True})
+                for pk, value in queryset.values_list('pk', field.name).iterator():
+                    new_value = rewrite_json_strings(value, self.convert_json_string)
+                    if new_value != value and not self.dry_run:
+                        manager.filter(pk=pk).update(**{field.name: new_value})
+                        rows += 1
+
+        if options['delete_originals'] and not self.dry_run:
+            for name in self.converted:
+                self.legacy.delete(name)
+
+        distinct = len(set(self.converted.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted {len(self.converted)} file(s) into {distinct} blob(s); rewrote {rows} row(s)."
+        ))
+        if self.missing:
+            self.stdout.write(self.style.WARNING(f"{len(self.missing)} referenced file(s) were missing on disk."))
+
+    def convert(self, name):
+        """Store a legacy file as a blob (once) and add a reference for this row."""
+        if name in self.converted:
+            if not self.dry_run:
+                retain(self.converted[name])
+            return self.converted[name]
+        if not self.legacy.exists(name):
+            self.missing.add(name)
+            return None
+        if self.dry_run:
+            self.converted[name] = name
+            return name
+
+        with self.legacy.open(name, 'rb') as f:
+            self.converted[name] = default_storage.save(name, File(f, name=os.path.basename(name)))
+        return self.converted[name]
+
+    def convert_json_string(self, value):
+        # Only strings that are existing legacy media paths get rewritten
+        if is_blob(value) or '/' not in value or (value not in self.converted and not self.legacy.exists(value)):
+            return value
+        return self.convert(value) or value
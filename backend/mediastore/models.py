@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class MediaBlob(models.Model):
+    """
+    One stored file in the content-addressed media store.
+    Every FileField/ImageField that saves the same bytes shares the blob;
+    ref_count tracks how many saves still point at it.
+    """
+    name = models.CharField(max_length=255, unique=True)  # blobs/ab/<sha256>.<ext>
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
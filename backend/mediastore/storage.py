@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs/'
+
+
+def blob_name(sha256, ext):
+    return f"{BLOB_PREFIX}{sha256[:2]}/{sha256}{ext}"
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def retain(name):
+    """Add a reference to an already stored blob that is being reused by name."""
+    from .models import MediaBlob
+    if is_blob(name):
+        MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that stores each distinct file once, under its SHA-256.
+
+    The `upload_to` path only contributes the file extension; the stored name
+    is always blobs/<aa>/<sha256><ext>. Saving bytes that already exist just
+    adds a reference, and delete() drops one. Blobs are only removed from disk
+    by the gc_media command once nothing references them.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save, so there is nothing to de-collide
+        return name
+
+    def _save(self, name, content):
+        name, sha256, size = self.write_blob(name, content)
+        self.add_reference(name, sha256, size)
+        return name
+
+    def write_blob(self, name, content):
+        """
+        Write content to its blob path (skipped if already present) without
+        touching the database, so it is safe to call from worker threads.
+        Returns (blob_name, sha256, size); add_reference() must follow.
+        """
+        ext = os.path.splitext(name)[1].lower()
+        blob_dir = os.path.join(self.location, BLOB_PREFIX)
+        os.makedirs(blob_dir, exist_ok=True)
+
+        # Hash while spooling to a temp file so the upload is read only once
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=blob_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            name = blob_name(digest.hexdigest(), ext)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name, digest.hexdigest(), size
+
+    def add_reference(self, name, sha256, size):
+        from .models import MediaBlob
+        MediaBlob.objects.get_or_create(name=name, defaults={'sha256': sha256, 'size': size})
+        MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+    def delete(self, name):
+        from .models import MediaBlob
+
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        if not is_blob(name):
+            # Legacy path written before the media tree was migrated
+            return super().delete(name)
+        MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1, updated_at=timezone.now())
@@ -0,0 +1,72 @@
+from django.test import TestCase
+from django.core.files.base import ContentFile
+from .models import MediaBlob
+from .storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(TestCase):
+    """
+    UNIT TESTS — Content-Addressed Media Storage
+    Tests blob dedup, reference counting and garbage collection.
+    """
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_same_bytes_share_one_blob(self):
+        """Saving identical content twice should store one file with two references."""
+        print("\n[RUNNING]: test_same_bytes_share_one_blob")
+        first = self.storage.save('room_images/a.jpg', ContentFile(b'same photo'))
+        second = self.storage.save('profile_photos/b.JPG', ContentFile(b'same photo'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('blobs/'))
+        self.assertEqual(MediaBlob.objects.get(name=first).ref_count, 2)
+        print("[RESULT]: SUCCESS - Duplicate upload deduplicated into one blob.")
+
+    def test_delete_decrements_and_gc_removes_orphans(self):
+        """delete() should only drop a reference; gc_media removes unreferenced blobs."""
+        print("\n[RUNNING]: test_delete_decrements_and_gc_removes_orphans")
+        from django.core.management import call_command
+        from django.test import override_settings
+        name = self.storage.save('room_images/a.jpg', ContentFile(b'orphan soon'))
+        self.storage.save('room_images/b.jpg', ContentFile(b'orphan soon'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.storage.delete(name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+
+        with override_settings(MEDIA_ROOT=self.tmp.name):
+            call_command('gc_media', grace_minutes=0, stdout=open('/dev/null', 'w'))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        print("[RESULT]: SUCCESS - Orphaned blob collected after last reference dropped.")
+
+    def test_room_image_delete_releases_reference(self):
+        """Deleting a RoomImage should decrement its blob's reference count."""
+        print("\n[RUNNING]: test_room_image_delete_releases_reference")
+        from django.test import override_settings
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from accounts.models import User
+        from OwnerRooms.models import Room, RoomImage
+        owner = User.objects.create_user(username='cas_o@gmail.com', email='cas_o@gmail.com', password='123', role='Owner')
+        room_a = Room.objects.create(owner=owner, title='A', location='Loc', price=1000)
+        room_b = Room.objects.create(owner=owner, title='B', location='Loc', price=1000)
+        with override_settings(MEDIA_ROOT=self.tmp.name):
+            image_a = RoomImage.objects.create(room=room_a, image=SimpleUploadedFile('x.jpg', b'shared bytes'))
+            RoomImage.objects.create(room=room_b, image=SimpleUploadedFile('y.jpg', b'shared bytes'))
+            blob = MediaBlob.objects.get(name=image_a.image.name)
+            self.assertEqual(blob.ref_count, 2)
+            image_a.delete()
+            blob.refresh_from_db()
+            self.assertEqual(blob.ref_count, 1)
+            # Queryset and cascade deletes skip Model.delete() but must release too
+            RoomImage.objects.create(room=room_a, image=SimpleUploadedFile('z.jpg', b'shared bytes'))
+            RoomImage.objects.filter(room=room_a).delete()
+            room_b.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+        print("[RESULT]: SUCCESS - RoomImage delete released one reference.")
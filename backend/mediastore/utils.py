@@ -0,0 +1,53 @@
+from collections import Counter
+from django.apps import apps
+from django.db import models
+from .storage import is_blob
+
+
+def iter_media_fields():
+    """
+    Every (model, field) that can reference stored media: FileField/ImageField
+    columns plus JSON columns holding generated names (variants, thumbnails).
+    """
+    for model in apps.get_models():
+        if model._meta.proxy:
+            continue
+        for field in model._meta.concrete_fields:
+            if isinstance(field, (models.FileField, models.JSONField)):
+                yield model, field
+
+
+def iter_json_strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from iter_json_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_json_strings(item)
+
+
+def rewrite_json_strings(value, rewrite):
+    """Copy of a JSON value with every string passed through rewrite()."""
+    if isinstance(value, str):
+        return rewrite(value)
+    if isinstance(value, dict):
+        return {key: rewrite_json_strings(item, rewrite) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rewrite_json_strings(item, rewrite) for item in value]
+    return value
+
+
+def count_blob_references():
+    """Count how many stored values point at each blob, straight from the database."""
+    counts = Counter()
+    for model, field in iter_media_fields():
+        values = model._default_manager.exclude(**{f'{field.name}__isnull': True}).values_list(field.name, flat=True)
+        for value in values.iterator():
+            if isinstance(field, models.FileField):
+                if is_blob(value):
+                    counts[value] += 1
+            else:
+                counts.update(name for name in iter_json_strings(value) if is_blob(name))
+    return counts
@@ -1,12 +1,14 @@
 from rest_framework import serializers
+from stayspot.sparse_fields import SparseFieldsMixin
 from .models import Notification
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     actor_name = serializers.SerializerMethodField()
     
     class Meta:
         model = Notification
         fields = ['id', 'recipient', 'actor', 'actor_name', 'notification_type', 'text', 'related_id', 'is_read', 'created_at']
+        field_dependencies = {'actor_name': ['actor']}
 
     def get_actor_name(self, obj):
         return obj.actor.full_name if obj.actor else "System"
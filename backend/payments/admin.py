@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import LedgerEntry, Payment
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -7,3 +7,19 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_type', 'due_date']
     search_fields = ['booking__tenant__full_name', 'booking__room__title']
     date_hierarchy = 'due_date'
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    """Read-only: the ledger is append-only."""
+    list_display = ['id', 'kind', 'debit_account', 'credit_account', 'amount', 'booking_id', 'owner_id', 'effective_date']
+    list_filter = ['kind', 'method', 'effective_date']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class PaymentsConfig(AppConfig):
+    name = 'payments'
+
+    def ready(self):
+        from . import signals  # noqa: F401
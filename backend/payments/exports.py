@@ -0,0 +1,241 @@
+import csv
+import hashlib
+import re
+import zipfile
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.db.models import Count, Max
+from .models import Payment
+
+COLUMNS = ['Date', 'Tenant', 'Email', 'Room', 'Payment Method', 'Amount', 'Status', 'Payment Type']
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Leading characters that make a spreadsheet read a CSV cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def filter_payment_logs(queryset, params):
+    """Apply the owner dashboard's year / month / room filters to a payment queryset."""
+    year, month, room_id = params.get('year'), params.get('month'), params.get('room_id')
+    if year and year != 'All' and year.isdigit():
+        queryset = queryset.filter(created_at__year=int(year))
+    if month and month != 'All Months' and month.isdigit():
+        queryset = queryset.filter(created_at__month=int(month))
+    if room_id and room_id != 'All Rooms' and room_id.isdigit():
+        queryset = queryset.filter(booking__room_id=int(room_id))
+    return queryset
+
+
+def export_queryset(owner, params):
+    return filter_payment_logs(Payment.objects.filter(booking__room__owner=owner), params)
+
+
+def export_etag(owner, params, fmt):
+    """
+    A validator for the export that doesn't read the rows: one aggregate over
+    the filtered payments (count, newest id, last save, latest ledger entry),
+    plus the distinct tenant and room names the rows show, so renames count
+    too. Payment edits are seen through save() (updated_at); a bulk update()
+    of an exported column has to go through save() to change the ETag.
+    """
+    payments = export_queryset(owner, params).order_by()
+    stamp = payments.aggregate(
+        count=Count('id', distinct=True), last_id=Max('id'), updated=Max('updated_at'), entry=Max('ledger_entries__id'),
+    )
+    names = payments.values_list(
+        'booking__tenant_id', 'booking__tenant__full_name', 'booking__tenant__email',
+        'booking__room_id', 'booking__room__title',
+    ).distinct().order_by('booking__tenant_id', 'booking__room_id')
+    digest = hashlib.md5(fmt.encode())
+    digest.update(repr(sorted(stamp.items())).encode())
+    digest.update(repr(list(names)).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+ROW_FIELDS = (
+    'paid_date', 'created_at', 'booking__tenant__full_name', 'booking__tenant__email',
+    'booking__room__title', 'payment_method', 'amount', 'status', 'payment_type',
+)
+
+
+def _rows(owner, params):
+    """Export rows, read in chunks through one server-side cursor, newest first."""
+    payments = (
+        export_queryset(owner, params)
+        .order_by('-created_at', '-id')
+        .values_list(*ROW_FIELDS)
+        .iterator(chunk_size=settings.PAYMENT_EXPORT_CHUNK_SIZE)
+    )
+    for paid_date, created_at, tenant, email, room, method, amount, status, payment_type in payments:
+        yield [
+            (paid_date or created_at.date()).isoformat(),
+            tenant,
+            email,
+            room,
+            method or 'Pending',
+            amount,
+            status,
+            payment_type,
+        ]
+
+
+class _Chunks:
+    """File-like sink that hands written data back in pieces of at least `size` bytes."""
+
+    def __init__(self, size=64 * 1024):
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+    def write(self, data):
+        data = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+        self.parts.append(data)
+        self.length += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self, force=False):
+        if self.length < self.size and not (force and self.length):
+            return None
+        data = b''.join(self.parts)
+        self.parts, self.length = [], 0
+        return data
+
+
+def csv_cell(value):
+    """Quote text a spreadsheet would run as a formula (tenant and room names are user input)."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def csv_chunks(owner, params):
+    sink = _Chunks()
+    writer = csv.writer(sink)
+    writer.writerow(COLUMNS)
+    for row in _rows(owner, params):
+        writer.writerow([csv_cell(value) for value in row])
+        data = sink.take()
+        if data:
+            yield data
+    data = sink.take(force=True)
+    if data:
+        yield data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Payments" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, str):
+            cells.append(f'<c t="inlineStr"><is><t>{escape(value)}</t></is></c>')
+        else:
+            cells.append(f'<c><v>{value}</v></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+def _zip_entry(name):
+    # Fixed timestamp, so the same rows always give the same bytes (needed for ranges)
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def xlsx_chunks(owner, params):
+    """
+    A single-sheet workbook, zipped as it is written: the sheet's rows are
+    deflated straight into the response, without building the file first.
+    """
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for name, xml in XLSX_PARTS.items():
+            archive.writestr(_zip_entry(name), xml)
+        with archive.open(_zip_entry('xl/worksheets/sheet1.xml'), 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(COLUMNS)
+            ).encode('utf-8'))
+            for row in _rows(owner, params):
+                sheet.write(_xlsx_row(row).encode('utf-8'))
+                data = sink.take()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    data = sink.take(force=True)
+    if data:
+        yield data
+
+
+EXPORTERS = {'csv': csv_chunks, 'xlsx': xlsx_chunks}
+
+
+def parse_range(header, length):
+    """
+    (start, end) inclusive for a single `bytes=` range of a `length`-byte body,
+    None when the header is absent or not one we serve (whole body instead),
+    and False when it can't be satisfied.
+    """
+    match = RANGE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(length - int(last), 0), length - 1
+    else:
+        start, end = int(first), min(int(last), length - 1) if last else length - 1
+    if start >= length or start > end:
+        return False
+    return start, end
+
+
+def byte_slice(chunks, start, end):
+    """The bytes start..end (inclusive) of a chunk stream, still as a stream."""
+    position = 0
+    for chunk in chunks:
+        chunk_end = position + len(chunk)
+        if chunk_end > start:
+            yield chunk[max(start - position, 0):end + 1 - position]
+        position = chunk_end
+        if position > end:
+            return
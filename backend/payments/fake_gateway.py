@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ESEWA_STATUS_PATH = '/api/epay/transaction/status/'
+KHALTI_INITIATE_PATH = '/api/v2/epayment/initiate/'
+KHALTI_LOOKUP_PATH = '/api/v2/epayment/lookup/'
+
+
+class FakeGateway:
+    """
+    Local stand-in for the eSewa status API and Khalti's initiate/lookup APIs,
+    for tests and latency benchmarks. Use as a context manager; `settings()`
+    gives the overrides that point the app at it.
+
+    `latency` delays every answer, `fail_next` answers that many requests with
+    503 first, and `statuses` overrides the status reported for a given
+    transaction uuid / pidx. Khalti lookups report the amount a pidx was
+    initiated for, else `amounts[pidx]`, else `khalti_amount` (paisa). `requests`, `connections` and `max_in_flight`
+    record what clients did.
+    """
+
+    def __init__(self, latency=0, esewa_status='COMPLETE', khalti_status='Completed', khalti_amount=None):
+        self.latency = latency
+        self.esewa_status = esewa_status
+        self.khalti_status = khalti_status
+        self.khalti_amount = khalti_amount
+        self.amounts = {}
+        self.fail_next = 0
+        self.statuses = {}
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self._server.server_address[1]}{path}'
+
+    def settings(self):
+        return {
+            'ESEWA_STATUS_URL': self.url(ESEWA_STATUS_PATH),
+            'KHALTI_GATEWAY_URL': self.url(KHALTI_INITIATE_PATH),
+            'KHALTI_LOOKUP_URL': self.url(KHALTI_LOOKUP_PATH),
+        }
+
+    def answer(self, method, path, query, body):
+        """(status code, JSON body) for one request."""
+        with self._lock:
+            self.requests.append((method, path))
+            if self.fail_next:
+                self.fail_next -= 1
+                return 503, {'error': 'Service unavailable'}
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return self._route(method, path, query, body)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _route(self, method, path, query, body):
+        if method == 'GET' and path == ESEWA_STATUS_PATH:
+            uuid = query.get('transaction_uuid', [''])[0]
+            return 200, {
+                'status': self.statuses.get(uuid, self.esewa_status),
+                'transaction_uuid': uuid,
+                'total_amount': query.get('total_amount', [''])[0],
+            }
+        if method == 'POST' and path == KHALTI_INITIATE_PATH:
+            pidx = f"fake-{body.get('purchase_order_id', '')}"
+            self.amounts[pidx] = body.get('amount')
+            return 200, {'pidx': pidx, 'payment_url': self.url(f'/pay/{pidx}/')}
+        if method == 'POST' and path == KHALTI_LOOKUP_PATH:
+            pidx = body.get('pidx')
+            answer = {'pidx': pidx, 'status': self.statuses.get(pidx, self.khalti_status)}
+            amount = self.amounts.get(pidx, self.khalti_amount)
+            if amount is not None:
+                answer['total_amount'] = amount
+            return 200, answer
+        return 404, {'error': 'Not found'}
+
+
+def _handler(gateway):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 so clients can keep connections alive
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with gateway._lock:
+                gateway.connections += 1
+
+        def _respond(self, method):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = {}
+            code, payload = gateway.answer(method, url.path, parse_qs(url.query), body)
+            data = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond('GET')
+
+        def do_POST(self):
+            self._respond('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
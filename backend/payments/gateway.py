@@ -0,0 +1,126 @@
+import logging
+import random
+import threading
+import time
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayUnavailable(requests.exceptions.ConnectionError):
+    """The gateway's circuit is open: recent calls failed, so this one isn't attempted."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `cooldown` seconds; then lets a single trial call through (half-open),
+    whose outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class GatewayClient:
+    """
+    HTTP client for one payment gateway: a pooled keep-alive session, strict
+    connect/read timeouts, optional retries with jittered exponential backoff,
+    and a circuit breaker. Timeouts and retries follow settings at call time.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.PAYMENT_GATEWAY_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.breaker = CircuitBreaker(
+            settings.PAYMENT_GATEWAY_BREAKER_THRESHOLD, settings.PAYMENT_GATEWAY_BREAKER_COOLDOWN
+        )
+
+    def request(self, method, url, retry=False, **kwargs):
+        """
+        Send a request and return the response. Connection errors, timeouts
+        and 5xx answers count against the breaker; with `retry` (only for
+        idempotent calls such as status lookups) they are retried up to
+        PAYMENT_GATEWAY_RETRIES times. Raises GatewayUnavailable while the
+        circuit is open.
+        """
+        kwargs.setdefault('timeout', (settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT))
+        attempts = 1 + (settings.PAYMENT_GATEWAY_RETRIES if retry else 0)
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise GatewayUnavailable(f"{self.name} is not responding. Please try again shortly.")
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.breaker.record(False)
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"{self.name} {method} failed ({str(e)}), retrying")
+            else:
+                self.breaker.record(response.status_code < 500)
+                if response.status_code < 500 or attempt == attempts - 1:
+                    return response
+                logger.warning(f"{self.name} {method} returned {response.status_code}, retrying")
+            # Full jitter keeps retries from many workers from arriving together
+            time.sleep(random.uniform(0, settings.PAYMENT_GATEWAY_BACKOFF * 2 ** attempt))
+
+    async def arequest(self, method, url, retry=False, **kwargs):
+        """request() for async (ASGI) callers; runs on a worker thread so the event loop never blocks."""
+        return await sync_to_async(self.request, thread_sensitive=False)(method, url, retry=retry, **kwargs)
+
+
+_clients = {}
+_clients_guard = threading.Lock()
+
+
+def gateway_client(name):
+    """The shared client (one session and breaker per process) for gateway `name`."""
+    with _clients_guard:
+        if name not in _clients:
+            _clients[name] = GatewayClient(name)
+        return _clients[name]
+
+
+def reset_clients():
+    """Drop every client, closing its connections (settings changes, tests)."""
+    with _clients_guard:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
@@ -0,0 +1,182 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from accounts.models import User
+from OwnerRooms.models import Booking
+from .models import BookingBalance, LedgerEntry, OwnerBalance, Payment
+
+RECEIVABLE, INCOME, CASH = 'receivable', 'income', 'cash'
+# (debit, credit) of each kind of entry; its reversal swaps them
+ACCOUNTS = {
+    'Charge': (RECEIVABLE, INCOME),
+    'Credit': (CASH, RECEIVABLE),
+}
+ZERO = Decimal('0')
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _deltas(entry):
+    """(charged, received, receipts) changes one entry makes to the balances it touches."""
+    forward = (entry.debit_account, entry.credit_account) == ACCOUNTS[entry.kind]
+    amount = entry.amount if forward else -entry.amount
+    if entry.kind == 'Charge':
+        return amount, ZERO, 0
+    return ZERO, amount, 1 if forward else -1
+
+
+def _bump(model, lookup, create=True, **deltas):
+    """Add `deltas` to the balance row matching `lookup`, creating it if allowed."""
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return
+    updates['updated_at'] = timezone.now()
+    if model.objects.filter(**lookup).update(**updates) or not create:
+        return
+    try:
+        # Savepoint: a concurrent poster may create the row first
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _apply(entry, create=True):
+    charged, received, receipts = _deltas(entry)
+    _bump(BookingBalance, {'booking_id': entry.booking_id}, create, charged=charged, received=received)
+    for period in (month_of(entry.effective_date), None):
+        _bump(
+            OwnerBalance, {'owner_id': entry.owner_id, 'period': period}, create,
+            charged=charged, received=received, receipts=receipts,
+        )
+
+
+def _posted(payment_id, kind):
+    """Net amount of `kind` already posted for a payment, and the last forward entry."""
+    debit, credit = ACCOUNTS[kind]
+    entries = LedgerEntry.objects.filter(payment_id=payment_id, kind=kind)
+    totals = entries.aggregate(
+        forward=Sum('amount', filter=Q(debit_account=debit)),
+        reversed=Sum('amount', filter=Q(debit_account=credit)),
+    )
+    last = entries.filter(debit_account=debit).order_by('-id').first()
+    return (totals['forward'] or ZERO) - (totals['reversed'] or ZERO), last
+
+
+def sync_payment(payment, deleted=False):
+    """
+    Post the entries that bring the ledger in line with `payment` as it now
+    stands (or with its removal): a charge for its amount and, once it is Paid,
+    a credit for it. Only differences are posted, as new entries, so repeating
+    a call posts nothing. Returns the entries posted.
+    """
+    if deleted:
+        charge_target = credit_target = ZERO
+    else:
+        charge_target = Decimal(str(payment.amount))
+        credit_target = charge_target if payment.status == 'Paid' else ZERO
+
+    posted = []
+    with transaction.atomic():
+        if not deleted:
+            # One sync per payment at a time, so differences aren't posted twice
+            list(Payment.objects.select_for_update().filter(pk=payment.pk).values_list('pk'))
+        owner_id = LedgerEntry.objects.filter(payment_id=payment.pk).values_list('owner_id', flat=True).last()
+        if owner_id is None:
+            owner_id = Booking.objects.filter(pk=payment.booking_id).values_list('room__owner_id', flat=True).first()
+        if owner_id is None:
+            return posted
+
+        for kind, target in (('Charge', charge_target), ('Credit', credit_target)):
+            current, last = _posted(payment.pk, kind)
+            difference = target - current
+            if not difference:
+                continue
+            debit, credit = ACCOUNTS[kind]
+            if difference < 0:
+                # Reversals count against the period the original entry did
+                debit, credit = credit, debit
+                effective_date = last.effective_date if last else payment.due_date
+            elif kind == 'Charge':
+                effective_date = payment.due_date
+            else:
+                effective_date = payment.paid_date or timezone.now().date()
+            entry = LedgerEntry.objects.create(
+                kind=kind, debit_account=debit, credit_account=credit, amount=abs(difference),
+                payment_id=payment.pk, booking_id=payment.booking_id, owner_id=owner_id,
+                method=payment.payment_method if kind == 'Credit' else None,
+                effective_date=effective_date,
+            )
+            # Rows of a booking or owner being deleted are not recreated
+            _apply(entry, create=not deleted)
+            posted.append(entry)
+    return posted
+
+
+def backfill():
+    """Post the missing entries of every payment (e.g. those from before the ledger). Returns entries posted."""
+    return sum(len(sync_payment(payment)) for payment in Payment.objects.order_by('id').iterator(chunk_size=500))
+
+
+def replayed_balances():
+    """
+    Balances recomputed from the ledger alone: ({booking id: (charged, received)},
+    {(owner id, period): (charged, received, receipts)}), for rows that still exist.
+    """
+    def signed(kind):
+        debit = ACCOUNTS[kind][0]
+        return (
+            Sum('amount', filter=Q(kind=kind, debit_account=debit), default=ZERO)
+            - Sum('amount', filter=Q(kind=kind, credit_account=debit), default=ZERO)
+        )
+
+    totals = {
+        'charged': signed('Charge'),
+        'received': signed('Credit'),
+        'receipts': (
+            Count('id', filter=Q(kind='Credit', debit_account=CASH))
+            - Count('id', filter=Q(kind='Credit', credit_account=CASH))
+        ),
+    }
+    entries = LedgerEntry.objects.order_by()
+
+    bookings = {
+        row['booking_id']: (row['charged'], row['received'])
+        for row in entries.filter(booking_id__in=Booking.objects.values('id'))
+        .values('booking_id').annotate(charged=totals['charged'], received=totals['received'])
+    }
+    owner_entries = entries.filter(owner_id__in=User.objects.values('id'))
+    owners = {}
+    for row in owner_entries.annotate(period=TruncMonth('effective_date')).values('owner_id', 'period').annotate(**totals):
+        owners[(row['owner_id'], row['period'])] = (row['charged'], row['received'], row['receipts'])
+    for row in owner_entries.values('owner_id').annotate(**totals):
+        owners[(row['owner_id'], None)] = (row['charged'], row['received'], row['receipts'])
+    return bookings, owners
+
+
+def stored_balances():
+    """The materialized balances, in the same shape as replayed_balances()."""
+    bookings = {b.booking_id: (b.charged, b.received) for b in BookingBalance.objects.all()}
+    owners = {(b.owner_id, b.period): (b.charged, b.received, b.receipts) for b in OwnerBalance.objects.all()}
+    return bookings, owners
+
+
+def rebuild_balances():
+    """Replace every materialized balance with one replayed from the ledger. Returns rows written."""
+    bookings, owners = replayed_balances()
+    with transaction.atomic():
+        BookingBalance.objects.all().delete()
+        OwnerBalance.objects.all().delete()
+        BookingBalance.objects.bulk_create(
+            BookingBalance(booking_id=booking_id, charged=charged, received=received)
+            for booking_id, (charged, received) in bookings.items()
+        )
+        OwnerBalance.objects.bulk_create(
+            OwnerBalance(owner_id=owner_id, period=period, charged=charged, received=received, receipts=receipts)
+            for (owner_id, period), (charged, received, receipts) in owners.items()
+        )
+    return len(bookings) + len(owners)
@@ -0,0 +1,51 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from payments.fake_gateway import KHALTI_LOOKUP_PATH, FakeGateway
+from payments.gateway import GatewayClient
+
+
+class Command(BaseCommand):
+    help = (
+        'Times Khalti-style lookups against a local fake gateway, comparing a fresh connection per '
+        'call with the pooled gateway client'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200, help='Lookups per run')
+        parser.add_argument('--concurrency', type=int, default=4, help='Worker threads issuing lookups')
+        parser.add_argument('--latency', type=float, default=0.005, help='Simulated gateway latency in seconds')
+
+    def handle(self, *args, **options):
+        if options['calls'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--calls and --concurrency must be positive")
+
+        with FakeGateway(latency=options['latency']) as gateway:
+            url = gateway.url(KHALTI_LOOKUP_PATH)
+            payload = json.dumps({'pidx': 'benchmark'})
+            client = GatewayClient('Khalti')
+            runs = [
+                ('new connection per call', lambda: requests.post(url, data=payload, timeout=10)),
+                ('pooled client', lambda: client.request('POST', url, retry=True, data=payload)),
+            ]
+            for label, call in runs:
+                connections = gateway.connections
+                timings = self.run(call, options['calls'], options['concurrency'])
+                timings.sort()
+                self.stdout.write(
+                    f"{label}: mean {sum(timings) / len(timings):.2f}ms, "
+                    f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms, "
+                    f"{gateway.connections - connections} connection(s) opened"
+                )
+            client.session.close()
+
+    def run(self, call, calls, concurrency):
+        def timed(_):
+            started = time.perf_counter()
+            call().raise_for_status()
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(timed, range(calls)))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from payments.webhooks import process_received_events
+
+
+class Command(BaseCommand):
+    help = 'Processes stored payment gateway callbacks still waiting, after a restart or a gateway error (run every few minutes)'
+
+    def handle(self, *args, **options):
+        payments = process_received_events()
+        self.stdout.write(self.style.SUCCESS(f"Processed queued events for {payments} payment(s)."))
@@ -0,0 +1,21 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from payments.reconciliation import reconcile_pending
+
+
+class Command(BaseCommand):
+    help = 'Checks unpaid payments holding an eSewa/Khalti transaction with the gateway and applies the results (run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Payments read per batch (default PAYMENT_RECONCILE_BATCH_SIZE)')
+        parser.add_argument('--concurrency', type=int, help='Concurrent gateway lookups (default PAYMENT_RECONCILE_CONCURRENCY)')
+
+    def handle(self, *args, **options):
+        if any(options[name] is not None and options[name] < 1 for name in ('batch_size', 'concurrency')):
+            raise CommandError("--batch-size and --concurrency must be positive")
+
+        stats = async_to_sync(reconcile_pending)(options['batch_size'], options['concurrency'])
+        self.stdout.write(', '.join(f"{name} {count}" for name, count in stats.items()))
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(f"{stats['failed']} lookup(s) failed; they will be retried next run."))
+        self.stdout.write(self.style.SUCCESS("Payment reconciliation complete."))
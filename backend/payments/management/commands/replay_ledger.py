@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from payments.ledger import backfill, rebuild_balances, replayed_balances, stored_balances
+
+
+def _mismatches(stored, replayed):
+    """Keys whose stored and replayed totals differ; a missing row counts as all zeros."""
+    stored, replayed = ({key: v for key, v in d.items() if any(v)} for d in (stored, replayed))
+    return sorted((key for key in stored.keys() | replayed.keys() if stored.get(key) != replayed.get(key)), key=str)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the booking and owner balances from the payment ledger (or, with --check, only compares them)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true', help='First post missing ledger entries for existing payments')
+        parser.add_argument('--check', action='store_true', help='Report balances that differ from the ledger without changing them')
+
+    def handle(self, *args, **options):
+        if options['backfill'] and options['check']:
+            raise CommandError("--backfill and --check cannot be combined")
+
+        if options['backfill']:
+            self.stdout.write(f"Posted {backfill()} missing ledger entries.")
+
+        if options['check']:
+            (stored_bookings, stored_owners), (bookings, owners) = stored_balances(), replayed_balances()
+            wrong = _mismatches(stored_bookings, bookings) + _mismatches(stored_owners, owners)
+            for key in wrong:
+                self.stdout.write(self.style.WARNING(f"Balance {key} differs from the ledger"))
+            if wrong:
+                raise CommandError(f"{len(wrong)} balance(s) differ from the ledger; run replay_ledger to rebuild them.")
+            self.stdout.write(self.style.SUCCESS("All balances match the ledger."))
+            return
+
+        rows = rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} balance row(s) from the ledger."))
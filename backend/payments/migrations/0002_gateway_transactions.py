@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GatewayTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gateway', models.CharField(choices=[('eSewa', 'eSewa'), ('Khalti', 'Khalti')], max_length=20)),
+                ('reference', models.CharField(max_length=100)),
+                ('gateway_status', models.CharField(blank=True, max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gateway_transactions', to='payments.payment')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gatewaytransaction',
+            constraint=models.UniqueConstraint(fields=('gateway', 'reference'), name='unique_gateway_reference'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_gateway_transactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gateway', models.CharField(choices=[('eSewa', 'eSewa'), ('Khalti', 'Khalti')], max_length=20)),
+                ('dedup_key', models.CharField(max_length=150)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('Received', 'Received'), ('Processed', 'Processed'), ('Failed', 'Failed')], default='Received', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='payments.payment')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['payment', 'status', 'id'], name='payment_event_queue_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='paymentevent',
+            constraint=models.UniqueConstraint(fields=('gateway', 'dedup_key'), name='unique_payment_event'),
+        ),
+    ]
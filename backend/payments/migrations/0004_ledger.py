@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('OwnerRooms', '0027_booking_transitions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0003_payment_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingBalance',
+            fields=[
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='OwnerRooms.booking')),
+                ('charged', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('received', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OwnerBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(blank=True, null=True)),
+                ('charged', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('received', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('receipts', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('Charge', 'Charge'), ('Credit', 'Credit')], max_length=10)),
+                ('debit_account', models.CharField(choices=[('receivable', 'Receivable'), ('income', 'Income'), ('cash', 'Cash')], max_length=20)),
+                ('credit_account', models.CharField(choices=[('receivable', 'Receivable'), ('income', 'Income'), ('cash', 'Cash')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('method', models.CharField(blank=True, choices=[('eSewa', 'eSewa'), ('Khalti', 'Khalti'), ('Cash', 'Cash'), ('Other', 'Other')], max_length=20, null=True)),
+                ('effective_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='OwnerRooms.booking')),
+                ('owner', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+                ('payment', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='payments.payment')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ownerbalance',
+            constraint=models.UniqueConstraint(fields=('owner', 'period'), name='unique_owner_period_balance'),
+        ),
+        migrations.AddConstraint(
+            model_name='ownerbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('period__isnull', True)), fields=('owner',), name='unique_owner_total_balance'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['payment', 'kind'], name='ledger_payment_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['booking', '-due_date', '-id'], name='payment_latest_idx'),
+        ),
+    ]
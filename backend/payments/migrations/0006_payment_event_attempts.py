@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_payment_latest_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentevent',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+    ]
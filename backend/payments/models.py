@@ -1,4 +1,5 @@
 from django.db import models
+from accounts.models import User
 from OwnerRooms.models import Booking
 
 class Payment(models.Model):
@@ -31,10 +32,15 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, null=True, blank=True)
     transaction_id = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'OwnerRooms_payment'
         ordering = ['due_date']
+        indexes = [
+            # A booking's latest payment (tenant directory)
+            models.Index(fields=['booking', '-due_date', '-id'], name='payment_latest_idx'),
+        ]
     
     def __str__(self):
         return f"{self.payment_type} - {self.booking.tenant.full_name} - ₹{self.amount} ({self.status})"
@@ -45,3 +51,155 @@ class Payment(models.Model):
         if self.status == 'Pending' and self.due_date < timezone.now().date():
             self.status = 'Overdue'
         super().save(*args, **kwargs)
+
+
+class GatewayTransaction(models.Model):
+    """
+    A gateway transaction (eSewa transaction code/uuid, Khalti pidx) applied to
+    a payment. Unique per gateway, so one transaction can never pay twice.
+    """
+    GATEWAY_CHOICES = [
+        ('eSewa', 'eSewa'),
+        ('Khalti', 'Khalti'),
+    ]
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='gateway_transactions')
+    gateway = models.CharField(max_length=20, choices=GATEWAY_CHOICES)
+    reference = models.CharField(max_length=100)
+    gateway_status = models.CharField(max_length=30, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'reference'], name='unique_gateway_reference'),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} {self.reference} -> payment {self.payment_id}"
+
+
+class PaymentEvent(models.Model):
+    """A raw gateway callback, stored on receipt and processed later by payments.webhooks."""
+    STATUS_CHOICES = [
+        ('Received', 'Received'),
+        ('Processed', 'Processed'),
+        ('Failed', 'Failed'),
+    ]
+
+    gateway = models.CharField(max_length=20, choices=GatewayTransaction.GATEWAY_CHOICES)
+    # Gateways resend callbacks; one event per (transaction, reported status)
+    dedup_key = models.CharField(max_length=150)
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, null=True, blank=True, related_name='events')
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Received')
+    error = models.TextField(blank=True)
+    # Tries that hit a gateway error; the event stays Received until PAYMENT_EVENT_MAX_ATTEMPTS
+    attempts = models.IntegerField(default=0)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'dedup_key'], name='unique_payment_event'),
+        ]
+        indexes = [
+            models.Index(fields=['payment', 'status', 'id'], name='payment_event_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} {self.dedup_key} ({self.status})"
+
+
+class LedgerEntry(models.Model):
+    """
+    One balanced double-entry posting: `amount` is debited to one account and
+    credited to another. Entries are never changed or deleted; corrections are
+    new entries with the accounts swapped (see payments.ledger).
+
+    Booking, owner and payment are kept as plain references (no constraint, no
+    cascade), so the history outlives the rows it describes.
+    """
+    KIND_CHOICES = [
+        ('Charge', 'Charge'),
+        ('Credit', 'Credit'),
+    ]
+
+    ACCOUNT_CHOICES = [
+        ('receivable', 'Receivable'),  # owed by the tenant
+        ('income', 'Income'),          # rent billed by the owner
+        ('cash', 'Cash'),              # money collected
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    debit_account = models.CharField(max_length=20, choices=ACCOUNT_CHOICES)
+    credit_account = models.CharField(max_length=20, choices=ACCOUNT_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment = models.ForeignKey(
+        Payment, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='ledger_entries'
+    )
+    booking = models.ForeignKey(
+        Booking, on_delete=models.DO_NOTHING, db_constraint=False, related_name='ledger_entries'
+    )
+    owner = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='ledger_entries'
+    )
+    method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHOD_CHOICES, null=True, blank=True)
+    # The day the entry counts for: the due date for charges, the paid date for credits
+    effective_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['payment', 'kind'], name='ledger_payment_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.debit_account} {self.amount} / {self.credit_account}"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Ledger entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only.")
+
+
+class BookingBalance(models.Model):
+    """Running ledger totals of a booking, kept in step with every entry posted."""
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    charged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    received = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def outstanding(self):
+        return self.charged - self.received
+
+
+class OwnerBalance(models.Model):
+    """
+    Running ledger totals of an owner: one row per month (`period` is its first
+    day) plus an all-time row with no period.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balances')
+    period = models.DateField(null=True, blank=True)
+    charged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    received = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Net number of payments received
+    receipts = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'period'], name='unique_owner_period_balance'),
+            models.UniqueConstraint(
+                fields=['owner'], condition=models.Q(period__isnull=True), name='unique_owner_total_balance'
+            ),
+        ]
+
+    @property
+    def outstanding(self):
+        return self.charged - self.received
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from stayspot.cache import count_metric
+from .models import Payment
+from .verification import alookup_status, apply_verified
+
+logger = logging.getLogger(__name__)
+
+# Gateway answers meaning the transaction will never complete; such payments stop being swept
+ABANDONED_STATUSES = {
+    'eSewa': ('NOT_FOUND', 'CANCELED'),
+    'Khalti': ('Expired', 'User canceled'),
+}
+STATS = ('checked', 'verified', 'pending', 'abandoned', 'failed')
+METRICS = tuple(f'payment_reconcile_{name}' for name in STATS)
+
+
+def gateway_of(payment):
+    if payment.payment_method in ('eSewa', 'Khalti'):
+        return payment.payment_method
+    # Khalti initiations from before payment_method was recorded; eSewa uuids start with EPAY-
+    return 'eSewa' if payment.transaction_id.startswith('EPAY-') else 'Khalti'
+
+
+def _next_batch(after_id, batch_size):
+    """Unpaid payments holding a gateway transaction, in id order after `after_id`."""
+    return list(
+        Payment.objects.filter(status__in=['Pending', 'Overdue'], id__gt=after_id)
+        .exclude(transaction_id__isnull=True).exclude(transaction_id='')
+        .exclude(payment_method__in=['Cash', 'Other'])
+        .order_by('id')[:batch_size]
+    )
+
+
+def _apply(payment, gateway, completed, gateway_status):
+    """Apply one lookup result; completed transactions take the verify endpoints' idempotent path."""
+    if completed:
+        apply_verified(payment.id, gateway, payment.transaction_id, gateway_status)
+        return 'verified'
+    if gateway_status in ABANDONED_STATUSES[gateway]:
+        # Unless the tenant started a new transaction meanwhile
+        Payment.objects.filter(
+            pk=payment.pk, status__in=['Pending', 'Overdue'], transaction_id=payment.transaction_id
+        ).update(transaction_id=None)
+        return 'abandoned'
+    return 'pending'
+
+
+def _record_stats(stats):
+    for name, n in stats.items():
+        count_metric(f'payment_reconcile_{name}', n)
+
+
+async def reconcile_pending(batch_size=None, concurrency=None):
+    """
+    Ask the gateways about every unpaid payment holding a transaction id and
+    apply the answers. Lookups run concurrently, at most `concurrency` at a
+    time; database work stays on one thread. Returns this run's stats.
+    """
+    batch_size = batch_size or settings.PAYMENT_RECONCILE_BATCH_SIZE
+    semaphore = asyncio.Semaphore(concurrency or settings.PAYMENT_RECONCILE_CONCURRENCY)
+    stats = dict.fromkeys(STATS, 0)
+
+    async def check(payment):
+        gateway = gateway_of(payment)
+        async with semaphore:
+            try:
+                completed, gateway_status = await alookup_status(gateway, payment, payment.transaction_id)
+            except Exception as e:
+                logger.warning(f"Reconciling payment {payment.id} with {gateway} failed: {str(e)}")
+                stats['failed'] += 1
+                return
+        try:
+            stats[await sync_to_async(_apply)(payment, gateway, completed, gateway_status)] += 1
+        except Exception as e:
+            logger.error(f"Applying {gateway} status {gateway_status} to payment {payment.id} failed: {str(e)}")
+            stats['failed'] += 1
+
+    after_id = 0
+    while True:
+        batch = await sync_to_async(_next_batch)(after_id, batch_size)
+        if not batch:
+            break
+        stats['checked'] += len(batch)
+        await asyncio.gather(*(check(payment) for payment in batch))
+        after_id = batch[-1].id
+
+    await sync_to_async(_record_stats)(stats)
+    return stats
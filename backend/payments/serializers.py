@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from accounts.models import User
+from stayspot.sparse_fields import SparseFieldsMixin
 from .models import Payment
 from OwnerRooms.models import Booking
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     booking = serializers.SerializerMethodField()
     booking_id = serializers.PrimaryKeyRelatedField(
         queryset=Booking.objects.all(), 
@@ -25,3 +26,4 @@ class PaymentSerializer(serializers.ModelSerializer):
             'payment_method', 'transaction_id', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        field_dependencies = {'booking': ['booking']}
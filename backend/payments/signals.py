@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .ledger import sync_payment
+from .models import Payment
+
+
+# Every change to a payment is mirrored into the ledger as new entries
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_payment(instance)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    sync_payment(instance, deleted=True)
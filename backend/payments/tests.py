@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 from datetime import date, timedelta
 from accounts.models import User
@@ -242,3 +242,737 @@ class PaymentIntegrationTests(TestCase):
         # Even if unauthorized, it checks if the endpoint exists and responds
         self.assertIn(response.status_code, [200, 403])
         print(f"[RESULT]: SUCCESS - Trigger reminders endpoint responded (Status {response.status_code}).")
+
+
+class PaymentVerificationTests(TestCase):
+    """
+    INTEGRATION TESTS — Gateway Verification
+    Tests that verifications apply once and skip the gateway when already verified.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        from django.test import Client
+        cache.clear()
+        self.client = Client()
+        self.owner = User.objects.create_user(
+            username='verify_owner@gmail.com', email='verify_owner@gmail.com', password='123', role='Owner'
+        )
+        self.tenant = User.objects.create_user(
+            username='verify_tenant@gmail.com', email='verify_tenant@gmail.com', password='123', role='Tenant'
+        )
+        self.room = Room.objects.create(owner=self.owner, title='Verify Room', location='Loc', price=2000)
+        self.booking = Booking.objects.create(
+            tenant=self.tenant, room=self.room, monthly_rent=2000, status='Confirmed',
+            start_date=date.today(), end_date=date.today() + timedelta(days=60)
+        )
+        self.payment = Payment.objects.create(
+            booking=self.booking, amount=2000, due_date=date.today() + timedelta(days=30), transaction_id='pidx-1'
+        )
+
+    def test_repeat_verification_skips_gateway(self):
+        """Polling a verified Khalti payment neither calls Khalti nor repeats side effects."""
+        print("\n[RUNNING]: test_repeat_verification_skips_gateway")
+        from django.test import override_settings
+        from notifications.models import Notification
+        from .fake_gateway import FakeGateway
+        from .gateway import reset_clients
+        self.client.force_login(self.tenant)
+        url = f'/api/payments/{self.payment.id}/verify_khalti/'
+        with FakeGateway(khalti_status='Pending', khalti_amount=200000) as gateway, override_settings(**gateway.settings()):
+            self.addCleanup(reset_clients)
+            self.assertEqual(self.client.post(url).json()['status'], 'Pending')
+            # A pending answer isn't kept: the next poll asks again
+            self.client.post(url)
+            self.assertEqual(len(gateway.requests), 2)
+
+            gateway.khalti_status = 'Completed'
+            for _ in range(3):
+                self.assertEqual(self.client.post(url).json()['status'], 'Payment verified successfully')
+            self.assertEqual(len(gateway.requests), 3)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'Paid')
+        self.assertEqual(self.payment.gateway_transactions.count(), 1)
+        self.assertEqual(Notification.objects.filter(notification_type='payment_received').count(), 1)
+        print("[RESULT]: SUCCESS - Verified once, then short-circuited.")
+
+    def test_khalti_lookup_must_match_payment(self):
+        """Only this payment's pidx, for this payment's amount, can pay it."""
+        print("\n[RUNNING]: test_khalti_lookup_must_match_payment")
+        from django.test import override_settings
+        from .fake_gateway import FakeGateway
+        from .gateway import reset_clients
+        self.client.force_login(self.tenant)
+        url = f'/api/payments/{self.payment.id}/verify_khalti/'
+        with FakeGateway(khalti_amount=1000) as gateway, override_settings(**gateway.settings()):
+            self.addCleanup(reset_clients)
+            # A completed pidx from another (cheaper) payment
+            self.assertEqual(self.client.post(url, {'pidx': 'pidx-cheap'}).status_code, 400)
+            self.assertEqual(gateway.requests, [])
+            # This payment's pidx, but Khalti reports a different amount
+            self.assertEqual(self.client.post(url).status_code, 400)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'Pending')
+        print("[RESULT]: SUCCESS - Mismatched pidx and amount refused.")
+
+    def test_reference_cannot_pay_twice(self):
+        """A gateway reference already applied to one payment is refused for another."""
+        print("\n[RUNNING]: test_reference_cannot_pay_twice")
+        from .verification import VerificationError, apply_gateway_transaction
+        other = Payment.objects.create(booking=self.booking, amount=2000, due_date=date.today() + timedelta(days=60))
+        self.assertTrue(apply_gateway_transaction(self.payment.id, 'Khalti', 'pidx-1'))
+        self.assertFalse(apply_gateway_transaction(self.payment.id, 'Khalti', 'pidx-1'))
+        with self.assertRaises(VerificationError):
+            apply_gateway_transaction(other.id, 'Khalti', 'pidx-1')
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'Pending')
+        print("[RESULT]: SUCCESS - The reference was applied once.")
+
+
+class PaymentSingleFlightTests(TransactionTestCase):
+    """
+    INTEGRATION TESTS — Concurrent Verification
+    Tests that simultaneous verifications of one payment share one gateway call.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        owner = User.objects.create_user(username='flight_owner@gmail.com', password='123', role='Owner')
+        tenant = User.objects.create_user(username='flight_tenant@gmail.com', password='123', role='Tenant')
+        room = Room.objects.create(owner=owner, title='Flight Room', location='Loc', price=2000)
+        booking = Booking.objects.create(
+            tenant=tenant, room=room, monthly_rent=2000,
+            start_date=date.today(), end_date=date.today() + timedelta(days=30)
+        )
+        self.payment = Payment.objects.create(booking=booking, amount=2000, due_date=date.today() + timedelta(days=30))
+
+    def test_concurrent_verifications_share_one_lookup(self):
+        """Six simultaneous polls of one payment should reach the gateway once."""
+        print("\n[RUNNING]: test_concurrent_verifications_share_one_lookup")
+        import threading
+        import time
+        from django.db import connection
+        from .verification import verify_payment
+        calls, results = [], []
+        barrier = threading.Barrier(6)
+
+        def lookup():
+            calls.append(1)
+            time.sleep(0.3)
+            return True, 'Completed'
+
+        def poll():
+            barrier.wait()
+            try:
+                results.append(verify_payment(self.payment, 'Khalti', 'pidx-9', lookup))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=poll) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(True, 'Completed')] * 6)
+        print("[RESULT]: SUCCESS - One gateway call served every poll.")
+
+    def test_pending_results_are_not_cached(self):
+        """A pending answer is asked again, and another reference never reuses this one's result."""
+        print("\n[RUNNING]: test_pending_results_are_not_cached")
+        from .verification import verify_payment
+        answers = [(False, 'Pending'), (True, 'Completed')]
+        self.assertEqual(verify_payment(self.payment, 'Khalti', 'pidx-1', lambda: answers.pop(0)), (False, 'Pending'))
+        self.assertEqual(verify_payment(self.payment, 'Khalti', 'pidx-1', lambda: answers.pop(0)), (True, 'Completed'))
+
+        self.payment.status = 'Pending'
+        other = verify_payment(self.payment, 'Khalti', 'pidx-2', lambda: (False, 'Expired'))
+        self.assertEqual(other, (False, 'Expired'))
+        print("[RESULT]: SUCCESS - Only completed verifications cached, per reference.")
+
+
+class GatewayClientTests(TestCase):
+    """
+    UNIT TESTS — Gateway HTTP Client
+    Tests pooling, retries, the circuit breaker and the async variant against a local fake gateway.
+    """
+    def setUp(self):
+        from django.test import override_settings
+        from .fake_gateway import FakeGateway
+        from .gateway import reset_clients
+        self.gateway = FakeGateway().__enter__()
+        self.addCleanup(self.gateway.__exit__, None, None, None)
+        overrides = override_settings(
+            PAYMENT_GATEWAY_BACKOFF=0.001, PAYMENT_GATEWAY_RETRIES=2,
+            PAYMENT_GATEWAY_BREAKER_THRESHOLD=3, PAYMENT_GATEWAY_BREAKER_COOLDOWN=60,
+            **self.gateway.settings()
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(reset_clients)
+        reset_clients()
+
+    def lookup_url(self):
+        from .fake_gateway import KHALTI_LOOKUP_PATH
+        return self.gateway.url(KHALTI_LOOKUP_PATH)
+
+    def test_keep_alive_and_retries(self):
+        """Calls share one connection; lookups retry through transient 503s, initiates don't."""
+        print("\n[RUNNING]: test_keep_alive_and_retries")
+        from .gateway import gateway_client
+        client = gateway_client('Khalti')
+        for _ in range(5):
+            self.assertEqual(client.request('POST', self.lookup_url(), data='{"pidx": "a"}').status_code, 200)
+        self.assertEqual(self.gateway.connections, 1)
+
+        self.gateway.fail_next = 2
+        response = client.request('POST', self.lookup_url(), retry=True, data='{"pidx": "a"}')
+        self.assertEqual(response.json()['status'], 'Completed')
+        self.gateway.fail_next = 1
+        self.assertEqual(client.request('POST', self.lookup_url(), data='{"pidx": "a"}').status_code, 503)
+        print("[RESULT]: SUCCESS - Pooled connection reused and retries applied.")
+
+    def test_circuit_breaker_fails_fast(self):
+        """After repeated failures the view answers 503 without reaching the gateway."""
+        print("\n[RUNNING]: test_circuit_breaker_fails_fast")
+        from accounts.models import User
+        from django.test import Client
+        from .gateway import gateway_client
+        owner = User.objects.create_user(username='gw_owner@gmail.com', password='123', role='Owner')
+        tenant = User.objects.create_user(username='gw_tenant@gmail.com', password='123', role='Tenant')
+        room = Room.objects.create(owner=owner, title='Gateway Room', location='Loc', price=1500)
+        booking = Booking.objects.create(
+            tenant=tenant, room=room, monthly_rent=1500, status='Confirmed',
+            start_date=date.today(), end_date=date.today() + timedelta(days=30)
+        )
+        payment = Payment.objects.create(booking=booking, amount=1500, due_date=date.today() + timedelta(days=30))
+
+        client = Client()
+        client.force_login(tenant)
+        self.gateway.fail_next = 3
+        url = f'/api/payments/{payment.id}/initiate_khalti/'
+        for _ in range(3):
+            self.assertEqual(client.post(url).status_code, 400)
+        self.assertEqual(gateway_client('Khalti').breaker.state, 'open')
+        response = client.post(url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.gateway.requests), 3)
+        print("[RESULT]: SUCCESS - Open circuit failed fast.")
+
+    def test_async_request(self):
+        """arequest() returns the same response for async callers."""
+        print("\n[RUNNING]: test_async_request")
+        from asgiref.sync import async_to_sync
+        from .gateway import gateway_client
+        response = async_to_sync(gateway_client('Khalti').arequest)(
+            'POST', self.lookup_url(), retry=True, data='{"pidx": "b"}'
+        )
+        self.assertEqual(response.json(), {'pidx': 'b', 'status': 'Completed'})
+        print("[RESULT]: SUCCESS - Async variant answered.")
+
+    def test_benchmark_command(self):
+        """The latency benchmark runs against its own fake gateway."""
+        print("\n[RUNNING]: test_benchmark_command")
+        import io
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command('benchmark_gateway', calls=20, concurrency=2, latency=0, stdout=out)
+        self.assertIn('pooled client', out.getvalue())
+        print("[RESULT]: SUCCESS - Benchmark completed.")
+
+
+class PaymentReconciliationTests(TestCase):
+    """
+    INTEGRATION TESTS — Payment Reconciliation
+    Tests the background sweep of pending gateway transactions against a local fake gateway.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        from django.test import override_settings
+        from .fake_gateway import FakeGateway
+        from .gateway import reset_clients
+        cache.clear()
+        self.gateway = FakeGateway(latency=0.05, khalti_status='Pending', khalti_amount=300000).__enter__()
+        self.addCleanup(self.gateway.__exit__, None, None, None)
+        overrides = override_settings(**self.gateway.settings())
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(reset_clients)
+        reset_clients()
+
+        owner = User.objects.create_user(username='rec_owner@gmail.com', password='123', role='Owner')
+        tenant = User.objects.create_user(username='rec_tenant@gmail.com', password='123', role='Tenant')
+        room = Room.objects.create(owner=owner, title='Sweep Room', location='Loc', price=3000)
+        self.booking = Booking.objects.create(
+            tenant=tenant, room=room, monthly_rent=3000, status='Confirmed',
+            start_date=date.today(), end_date=date.today() + timedelta(days=90)
+        )
+
+    def payment(self, transaction_id, method=None, status='Pending'):
+        return Payment.objects.create(
+            booking=self.booking, amount=3000, due_date=date.today() + timedelta(days=30),
+            transaction_id=transaction_id, payment_method=method, status=status
+        )
+
+    def test_sweep_applies_gateway_results(self):
+        """Completed transactions are paid once, abandoned ones dropped, others left pending."""
+        print("\n[RUNNING]: test_sweep_applies_gateway_results")
+        from asgiref.sync import async_to_sync
+        from notifications.models import Notification
+        from .reconciliation import reconcile_pending
+        paid = self.payment('EPAY-1-1700000000', method='eSewa')
+        waiting = [self.payment(f'pidx-wait-{i}', method='Khalti') for i in range(3)]
+        expired = self.payment('pidx-old')  # initiated before payment_method was recorded
+        self.gateway.statuses['pidx-old'] = 'Expired'
+        cash = self.payment('receipt-7', method='Cash')
+        self.payment('pidx-done', method='Khalti', status='Paid')
+
+        stats = async_to_sync(reconcile_pending)(batch_size=2, concurrency=2)
+        self.assertEqual(stats, {'checked': 5, 'verified': 1, 'pending': 3, 'abandoned': 1, 'failed': 0})
+        self.assertLessEqual(self.gateway.max_in_flight, 2)
+        self.assertEqual(len(self.gateway.requests), 5)
+
+        paid.refresh_from_db()
+        expired.refresh_from_db()
+        cash.refresh_from_db()
+        self.assertEqual(paid.status, 'Paid')
+        self.assertIsNone(expired.transaction_id)
+        self.assertEqual(cash.status, 'Pending')
+        self.assertTrue(all(Payment.objects.get(pk=p.pk).status == 'Pending' for p in waiting))
+        self.assertEqual(Notification.objects.filter(notification_type='payment_received').count(), 1)
+
+        # The next run only revisits what is still pending
+        self.gateway.statuses['pidx-wait-0'] = 'Completed'
+        stats = async_to_sync(reconcile_pending)(batch_size=2, concurrency=2)
+        self.assertEqual((stats['checked'], stats['verified']), (3, 1))
+        self.assertEqual(Notification.objects.filter(notification_type='payment_received').count(), 2)
+        print("[RESULT]: SUCCESS - Gateway results applied once each.")
+
+    def test_command_reports_failures(self):
+        """Gateway errors are counted as failures and retried on a later run."""
+        print("\n[RUNNING]: test_command_reports_failures")
+        import io
+        from django.core.management import call_command
+        from django.test import override_settings
+        self.payment('pidx-flaky', method='Khalti')
+        self.gateway.fail_next = 10
+        out = io.StringIO()
+        with override_settings(PAYMENT_GATEWAY_RETRIES=0):
+            call_command('reconcile_payments', stdout=out)
+        self.assertIn('failed 1', out.getvalue())
+        self.assertIn('retried next run', out.getvalue())
+        print("[RESULT]: SUCCESS - Failure reported.")
+
+
+class PaymentWebhookTests(TestCase):
+    """
+    INTEGRATION TESTS — Payment Webhooks
+    Tests callback ingestion (signature check, dedup) and the queued processing of events.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        from django.test import Client
+        cache.clear()
+        self.client = Client()
+        owner = User.objects.create_user(username='hook_owner@gmail.com', password='123', role='Owner')
+        self.tenant = User.objects.create_user(username='hook_tenant@gmail.com', password='123', role='Tenant')
+        room = Room.objects.create(owner=owner, title='Hook Room', location='Loc', price=2500)
+        booking = Booking.objects.create(
+            tenant=self.tenant, room=room, monthly_rent=2500, status='Confirmed',
+            start_date=date.today(), end_date=date.today() + timedelta(days=60)
+        )
+        self.payment = Payment.objects.create(
+            booking=booking, amount=2500, due_date=date.today() + timedelta(days=30),
+            transaction_id=f'EPAY-{0}-1700000000', payment_method='eSewa'
+        )
+
+    def esewa_data(self, status='COMPLETE', code='000AB1', signature=None, payment=None, amount='2500'):
+        import base64
+        import json
+        from .verification import esewa_signature
+        data = {
+            'transaction_code': code, 'status': status, 'total_amount': amount,
+            'transaction_uuid': f'EPAY-{(payment or self.payment).id}-1700000000', 'product_code': 'EPAYTEST',
+            'signed_field_names': 'transaction_code,status,total_amount,transaction_uuid,product_code,signed_field_names',
+        }
+        message = ','.join(f'{field}={data[field]}' for field in data['signed_field_names'].split(','))
+        data['signature'] = signature or esewa_signature(message)
+        return base64.b64encode(json.dumps(data).encode()).decode()
+
+    def post_esewa(self, data):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/payments/webhooks/esewa/', {'data': data})
+        return response, [c for c in callbacks if c.__qualname__.startswith('schedule_event_processing')]
+
+    def test_esewa_callback_is_stored_then_processed(self):
+        """The callback is acknowledged before any payment change, then applied once."""
+        print("\n[RUNNING]: test_esewa_callback_is_stored_then_processed")
+        from notifications.models import Notification
+        from .models import PaymentEvent
+        from .webhooks import process_payment_events
+        response, scheduled = self.post_esewa(self.esewa_data())
+        self.assertEqual(response.json()['status'], 'received')
+        self.assertEqual(len(scheduled), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'Pending')
+
+        # A resent callback is recognised and not queued again
+        response, scheduled = self.post_esewa(self.esewa_data())
+        self.assertEqual(response.json()['status'], 'duplicate')
+        self.assertEqual(scheduled, [])
+
+        process_payment_events(self.payment.id)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'Paid')
+        self.assertEqual(list(PaymentEvent.objects.values_list('status', flat=True)), ['Processed'])
+        self.assertEqual(Notification.objects.filter(notification_type='payment_received').count(), 1)
+        print("[RESULT]: SUCCESS - Event stored, deduplicated and applied once.")
+
+    def test_bad_signature_and_unknown_payment(self):
+        """Forged eSewa data is refused; callbacks matching no payment are not stored."""
+        print("\n[RUNNING]: test_bad_signature_and_unknown_payment")
+        from .models import PaymentEvent
+        response, _ = self.post_esewa(self.esewa_data(signature='forged'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+        response = self.client.get('/api/payments/webhooks/khalti/', {'pidx': 'nobody', 'status': 'Completed'})
+        self.assertEqual(response.json(), {'status': 'ignored'})
+        self.assertFalse(PaymentEvent.objects.exists())
+        self.assertEqual(self.client.post('/api/payments/webhooks/paypal/').status_code, 404)
+        print("[RESULT]: SUCCESS - Bad callbacks handled.")
+
+    def test_events_apply_in_order(self):
+        """A payment's events are processed oldest first; Khalti callbacks are checked with Khalti."""
+        print("\n[RUNNING]: test_events_apply_in_order")
+        from django.test import override_settings
+        from .fake_gateway import FakeGateway
+        from .gateway import reset_clients
+        from .models import PaymentEvent
+        from .webhooks import process_payment_events
+        self.payment.transaction_id, self.payment.payment_method = 'pidx-hook', 'Khalti'
+        self.payment.save()
+        order_id = f'PAY-{self.payment.id}-1700000000'
+        with FakeGateway(khalti_status='Pending', khalti_amount=250000) as gateway, override_settings(**gateway.settings()):
+            self.addCleanup(reset_clients)
+            for state in ('Pending', 'Completed'):
+                self.client.get('/api/payments/webhooks/khalti/', {
+                    'pidx': 'pidx-hook', 'status': state, 'purchase_order_id': order_id
+                })
+            gateway.statuses['pidx-hook'] = 'Completed'
+            process_payment_events(self.payment.id)
+            self.assertEqual(len(gateway.requests), 1)
+
+        events = list(PaymentEvent.objects.values_list('status', 'processed_at'))
+        self.assertEqual([status for status, _ in events], ['Processed', 'Processed'])
+        self.assertLessEqual(events[0][1], events[1][1])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'Paid')
+        print("[RESULT]: SUCCESS - Events applied in order.")
+
+    def test_khalti_callback_cannot_name_another_payment(self):
+        """An unsigned Khalti callback is tied to the payment its pidx was initiated for."""
+        print("\n[RUNNING]: test_khalti_callback_cannot_name_another_payment")
+        from .models import PaymentEvent
+        cheap = Payment.objects.create(
+            booking=self.payment.booking, amount=10, due_date=date.today() + timedelta(days=5),
+            transaction_id='pidx-cheap', payment_method='Khalti'
+        )
+        self.client.get('/api/payments/webhooks/khalti/', {
+            'pidx': 'pidx-cheap', 'status': 'Completed', 'purchase_order_id': f'PAY-{self.payment.id}-1700000000'
+        })
+        self.assertEqual(PaymentEvent.objects.get().payment_id, cheap.id)
+        print("[RESULT]: SUCCESS - Callback bound to the pidx's own payment.")
+
+    def test_esewa_response_cannot_settle_another_payment(self):
+        """A signed eSewa success for payment A is refused when posted to verify payment B."""
+        print("\n[RUNNING]: test_esewa_response_cannot_settle_another_payment")
+        from .models import GatewayTransaction
+        cheap = Payment.objects.create(
+            booking=self.payment.booking, amount=10, due_date=date.today() + timedelta(days=5),
+            transaction_id=f'EPAY-{0}-1700000001', payment_method='eSewa'
+        )
+        self.client.force_login(self.tenant)
+        url = f'/api/payments/{self.payment.id}/verify_esewa/'
+        response = self.client.post(url, {'data': self.esewa_data(payment=cheap, amount='10')})
+        self.assertEqual(response.status_code, 400)
+        # The right uuid with another amount is refused too
+        response = self.client.post(url, {'data': self.esewa_data(amount='10')})
+        self.assertEqual(response.status_code, 400)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'Pending')
+        self.assertFalse(GatewayTransaction.objects.exists())
+
+        response = self.client.post(url, {'data': self.esewa_data()})
+        self.assertEqual(response.json(), {'status': 'Payment verified successfully'})
+        print("[RESULT]: SUCCESS - eSewa data bound to its own payment and amount.")
+
+    def test_gateway_errors_are_retried(self):
+        """An event hitting a gateway outage stays queued for the sweep, up to the attempt limit."""
+        print("\n[RUNNING]: test_gateway_errors_are_retried")
+        from django.test import override_settings
+        from .fake_gateway import FakeGateway
+        from .gateway import GatewayUnavailable, reset_clients
+        from .models import PaymentEvent
+        from unittest.mock import patch
+        from .webhooks import process_payment_events, process_received_events
+        self.payment.transaction_id, self.payment.payment_method = 'pidx-retry', 'Khalti'
+        self.payment.save()
+        with FakeGateway(khalti_amount=250000) as gateway, \
+                override_settings(PAYMENT_GATEWAY_RETRIES=0, PAYMENT_EVENT_MAX_ATTEMPTS=2, **gateway.settings()):
+            self.addCleanup(reset_clients)
+            for state in ('Completed', 'Refunded'):
+                self.client.get('/api/payments/webhooks/khalti/', {'pidx': 'pidx-retry', 'status': state})
+            gateway.fail_next = 1
+            process_payment_events(self.payment.id)
+            first, second = PaymentEvent.objects.all()
+            self.assertEqual((first.status, first.attempts, second.status), ('Received', 1, 'Received'))
+
+            self.assertEqual(process_received_events(), 1)
+        self.assertEqual(list(PaymentEvent.objects.values_list('status', flat=True)), ['Processed', 'Processed'])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'Paid')
+
+        # A gateway that stays down eventually fails the event
+        with override_settings(PAYMENT_EVENT_MAX_ATTEMPTS=1), \
+                patch('payments.webhooks.process_event', side_effect=GatewayUnavailable('down')):
+            event = PaymentEvent.objects.create(
+                gateway='Khalti', dedup_key='pidx-retry:Late', payment=self.payment, payload={'pidx': 'pidx-retry'}
+            )
+            process_payment_events(self.payment.id)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('Failed', 1))
+        print("[RESULT]: SUCCESS - Transient failures retried, then failed.")
+
+
+class PaymentLedgerTests(TestCase):
+    """
+    INTEGRATION TESTS — Payment Ledger
+    Tests that payment changes post balanced ledger entries and keep the materialized balances current.
+    """
+    def setUp(self):
+        self.owner = User.objects.create_user(username='ledger_owner@gmail.com', password='123', role='Owner')
+        self.tenant = User.objects.create_user(username='ledger_tenant@gmail.com', password='123', role='Tenant')
+        room = Room.objects.create(owner=self.owner, title='Ledger Room', location='Loc', price=3000)
+        self.booking = Booking.objects.create(
+            tenant=self.tenant, room=room, monthly_rent=3000, status='Active',
+            start_date=date.today(), end_date=date.today() + timedelta(days=90)
+        )
+        self.payment = Payment.objects.create(
+            booking=self.booking, amount=3000, due_date=date.today() + timedelta(days=5)
+        )
+
+    def owner_total(self):
+        from .models import OwnerBalance
+        return OwnerBalance.objects.get(owner=self.owner, period__isnull=True)
+
+    def test_charges_and_credits_balance(self):
+        """Rent is charged on creation, credited when paid, and reversed by new entries when undone."""
+        print("\n[RUNNING]: test_charges_and_credits_balance")
+        from .models import BookingBalance, LedgerEntry
+        self.assertEqual(BookingBalance.objects.get(booking=self.booking).outstanding, 3000)
+        self.assertEqual(self.owner_total().charged, 3000)
+
+        self.payment.status, self.payment.payment_method = 'Paid', 'Cash'
+        self.payment.paid_date = date.today()
+        self.payment.save()
+        self.payment.save()  # Re-saving posts nothing
+        self.assertEqual(BookingBalance.objects.get(booking=self.booking).outstanding, 0)
+        month = self.owner.balances.get(period=date.today().replace(day=1))
+        self.assertEqual((month.received, month.receipts), (3000, 1))
+
+        self.payment.status = 'Pending'
+        self.payment.save()
+        self.payment.delete()
+        entries = list(LedgerEntry.objects.values_list('kind', 'debit_account', 'credit_account', 'amount'))
+        self.assertEqual(entries, [
+            ('Charge', 'receivable', 'income', 3000), ('Credit', 'cash', 'receivable', 3000),
+            ('Credit', 'receivable', 'cash', 3000), ('Charge', 'income', 'receivable', 3000),
+        ])
+        total = self.owner_total()
+        self.assertEqual((total.charged, total.received, total.receipts), (0, 0, 0))
+        with self.assertRaises(ValueError):
+            LedgerEntry.objects.first().save()
+        print("[RESULT]: SUCCESS - Entries balanced and append-only.")
+
+    def test_gateway_payment_reaches_dashboard(self):
+        """A verified gateway payment is credited and the owner dashboard reads it from the balances."""
+        print("\n[RUNNING]: test_gateway_payment_reaches_dashboard")
+        from rest_framework.test import APIClient
+        from .verification import apply_verified
+        apply_verified(self.payment.id, 'Khalti', 'pidx-ledger')
+        apply_verified(self.payment.id, 'Khalti', 'pidx-ledger')
+        self.assertEqual(self.payment.ledger_entries.get(kind='Credit').method, 'Khalti')
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        stats = client.get('/api/owner/financial/dashboard/').json()['stats']
+        self.assertEqual(float(stats['this_month']['earnings']), 3000)
+        self.assertEqual(stats['this_month']['transactions'], 1)
+        self.assertEqual(float(stats['all_time']['outstanding']), 0)
+        print("[RESULT]: SUCCESS - Dashboard reads ledger balances.")
+
+    def test_replay_rebuilds_balances(self):
+        """replay_ledger backfills payments without entries and rebuilds drifted balances."""
+        print("\n[RUNNING]: test_replay_rebuilds_balances")
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from .models import BookingBalance
+        # bulk_create sends no signals, like payments from before the ledger
+        Payment.objects.bulk_create([Payment(
+            booking=self.booking, amount=500, due_date=date.today(), payment_type='Deposit'
+        )])
+        BookingBalance.objects.filter(booking=self.booking).update(received=999)
+
+        with self.assertRaises(CommandError):
+            call_command('replay_ledger', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('replay_ledger', '--backfill', stdout=out)
+        self.assertIn('Posted 1 missing ledger entries', out.getvalue())
+        balance = BookingBalance.objects.get(booking=self.booking)
+        self.assertEqual((balance.charged, balance.received), (3500, 0))
+        self.assertEqual(self.owner_total().charged, 3500)
+        call_command('replay_ledger', '--check', stdout=StringIO())
+        print("[RESULT]: SUCCESS - Balances rebuilt from the ledger.")
+
+
+class PaymentExportTests(TestCase):
+    """
+    INTEGRATION TESTS — Payment Log Export
+    Tests the streamed CSV/XLSX download of owner payment logs and its byte-range resume.
+    """
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.owner = User.objects.create_user(username='export_owner@gmail.com', password='123', role='Owner')
+        tenant = User.objects.create_user(
+            username='export_tenant@gmail.com', email='export_tenant@gmail.com', password='123',
+            full_name='Export & Tenant', role='Tenant'
+        )
+        self.rooms = [
+            Room.objects.create(owner=self.owner, title=f'Export Room {i}', location='Loc', price=1000)
+            for i in range(2)
+        ]
+        for i, room in enumerate(self.rooms):
+            booking = Booking.objects.create(
+                tenant=tenant, room=room, monthly_rent=1000, status='Active',
+                start_date=date.today(), end_date=date.today() + timedelta(days=90)
+            )
+            for month in range(i + 2):
+                Payment.objects.create(booking=booking, amount=1000 + month, due_date=date.today() + timedelta(days=30 * month))
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def download(self, query='', **headers):
+        response = self.client.get(f'/api/owner/financial/export/{query}', **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_csv_export_streams_filtered_rows(self):
+        """The CSV lists the owner's payments, honours the room filter and is streamed."""
+        print("\n[RUNNING]: test_csv_export_streams_filtered_rows")
+        import csv
+        import io
+        response, body = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0][:2], ['Date', 'Tenant'])
+        self.assertEqual(len(rows), 1 + 5)
+        self.assertEqual(rows[1][1], 'Export & Tenant')
+
+        _, body = self.download(f'?room_id={self.rooms[0].id}')
+        self.assertEqual(len(body.decode().splitlines()), 1 + 2)
+
+        tenant_client = self.client.__class__()
+        tenant_client.force_authenticate(User.objects.get(username='export_tenant@gmail.com'))
+        self.assertEqual(tenant_client.get('/api/owner/financial/export/').status_code, 403)
+        self.assertEqual(self.client.get('/api/owner/financial/export/?type=pdf').status_code, 400)
+        print("[RESULT]: SUCCESS - CSV export streamed.")
+
+    def test_range_requests_resume(self):
+        """Byte ranges return exactly that slice of the full export, guarded by If-Range."""
+        print("\n[RUNNING]: test_range_requests_resume")
+        _, full = self.download()
+        response, part = self.download(HTTP_RANGE='bytes=10-49')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(part, full[10:50])
+        self.assertEqual(response['Content-Range'], f'bytes 10-49/{len(full)}')
+
+        response, part = self.download(HTTP_RANGE='bytes=40-', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual((response.status_code, part), (206, full[40:]))
+        _, part = self.download(HTTP_RANGE='bytes=-15')
+        self.assertEqual(part, full[-15:])
+
+        # A stale ETag gets the whole (changed) export instead of a slice
+        response, _ = self.download(HTTP_RANGE='bytes=40-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.download(HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(response.status_code, 416)
+        print("[RESULT]: SUCCESS - Ranges served.")
+
+    def test_xlsx_export(self):
+        """The XLSX is a valid workbook whose bytes are stable, so it can be resumed too."""
+        print("\n[RUNNING]: test_xlsx_export")
+        import io
+        import zipfile
+        response, body = self.download('?type=xlsx')
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 1 + 5)
+        self.assertIn('Export &amp; Tenant', sheet)
+
+        response, part = self.download('?type=xlsx', HTTP_RANGE='bytes=100-299')
+        self.assertEqual((response.status_code, part), (206, body[100:300]))
+        print("[RESULT]: SUCCESS - XLSX export valid and resumable.")
+
+    def set_first_payment(self, **fields):
+        payment = Payment.objects.order_by('id').first()
+        for name, value in fields.items():
+            setattr(payment, name, value)
+        payment.save()
+
+    def test_etag_follows_exported_rows(self):
+        """Saved payment edits, new payments and renamed tenants or rooms change the ETag without reading the rows."""
+        print("\n[RUNNING]: test_etag_follows_exported_rows")
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .exports import export_etag
+        with CaptureQueriesContext(connection) as queries:
+            export_etag(self.owner, {}, 'csv')
+        self.assertEqual(len(queries.captured_queries), 2)
+
+        response, _ = self.download()
+        etags = {response['ETag']}
+        changes = [
+            lambda: self.set_first_payment(status='Overdue'),
+            lambda: self.set_first_payment(payment_method='Khalti'),
+            lambda: Payment.objects.create(booking=Booking.objects.first(), amount=900, due_date=date.today()),
+            lambda: User.objects.filter(username='export_tenant@gmail.com').update(full_name='Renamed Tenant'),
+            lambda: Room.objects.filter(id=self.rooms[0].id).update(title='Renamed Room'),
+        ]
+        for change in changes:
+            change()
+            response, _ = self.download()
+            self.assertNotIn(response['ETag'], etags)
+            etags.add(response['ETag'])
+        response, _ = self.download()
+        self.assertIn(response['ETag'], etags)
+        print("[RESULT]: SUCCESS - ETag tracks the exported rows.")
+
+    def test_csv_cells_cannot_start_formulas(self):
+        """Names starting with =, +, - or @ are quoted so spreadsheets show them as text."""
+        print("\n[RUNNING]: test_csv_cells_cannot_start_formulas")
+        import csv
+        import io
+        User.objects.filter(username='export_tenant@gmail.com').update(full_name='=HYPERLINK("http://x","y")')
+        Room.objects.filter(id=self.rooms[0].id).update(title='@SUM(A1)')
+        _, body = self.download()
+        rows = list(csv.reader(io.StringIO(body.decode())))[1:]
+        self.assertEqual({row[1] for row in rows}, {'\'=HYPERLINK("http://x","y")'})
+        self.assertIn("'@SUM(A1)", {row[3] for row in rows})
+        self.assertIn('Export Room 1', {row[3] for row in rows})
+        print("[RESULT]: SUCCESS - Formula-like cells escaped.")
@@ -1,13 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PaymentViewSet, owner_financial_dashboard, trigger_reminders, generate_monthly_rents
+from .views import PaymentViewSet, payment_webhook, owner_financial_dashboard, owner_payment_export, trigger_reminders, generate_monthly_rents
 
 router = DefaultRouter()
 router.register(r'payments', PaymentViewSet, basename='payment')
 
 urlpatterns = [
     path('owner/financial/dashboard/', owner_financial_dashboard, name='owner-financial-dashboard'),
+    path('owner/financial/export/', owner_payment_export, name='owner-payment-export'),
     path('trigger-reminders/', trigger_reminders, name='trigger-reminders'),
     path('generate-monthly-rents/', generate_monthly_rents, name='generate-monthly-rents'),
+    path('payments/webhooks/<str:gateway>/', payment_webhook, name='payment-webhook'),
     path('', include(router.urls)),
 ]
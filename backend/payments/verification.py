@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import hmac
+import json
+import re
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from notifications.utils import send_notification
+from stayspot.cache import count_metric, get_or_build
+from OwnerRooms.booking_state import record_payment
+from .gateway import GatewayUnavailable, gateway_client
+from .models import GatewayTransaction, Payment
+
+METRICS = ('payment_verify_short_circuit', 'payment_verify_lookup', 'payment_verify_shared')
+# Our eSewa transaction uuids carry the payment id: EPAY-<id>-<ts>
+ESEWA_PAYMENT_ID = re.compile(r'^EPAY-(\d+)-')
+
+
+class VerificationError(Exception):
+    """The gateway could not verify a payment; `detail` is the API error body."""
+
+    def __init__(self, detail):
+        super().__init__(str(detail))
+        self.detail = detail if isinstance(detail, dict) else {'error': str(detail)}
+
+
+def esewa_amount(payment):
+    # eSewa v2 prefers no decimals if the amount is an integer
+    return str(int(payment.amount)) if payment.amount == int(payment.amount) else str(payment.amount)
+
+
+def esewa_signature(message):
+    """Base64 HMAC-SHA256 of `message` under the eSewa secret key."""
+    digest = hmac.new(settings.ESEWA_SECRET_KEY.encode(), message.encode(), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def decode_esewa_data(encoded_data):
+    """
+    The JSON eSewa v2 sends base64-encoded as `data` (on redirects and callbacks),
+    once its signature over the fields listed in signed_field_names checks out.
+    """
+    response_data = json.loads(base64.b64decode(encoded_data).decode('utf-8'))
+    # Reconstruct the message from the EXACT fields eSewa signed
+    fields = response_data.get('signed_field_names', '').split(',')
+    message = ','.join(f"{field}={response_data.get(field)}" for field in fields)
+    if not hmac.compare_digest(str(response_data.get('signature', '')), esewa_signature(message)):
+        raise VerificationError('Invalid signature verification failed')
+    return response_data
+
+
+def esewa_payment_id(transaction_uuid):
+    """The payment id an eSewa transaction uuid was issued for, or None."""
+    match = ESEWA_PAYMENT_ID.match(transaction_uuid or '')
+    return int(match.group(1)) if match else None
+
+
+def check_esewa_data(payment, data):
+    """
+    Raise VerificationError unless decoded eSewa data is about `payment`: its
+    transaction_uuid was issued for this payment and its total_amount is this
+    payment's amount. The signature only proves eSewa sent the data, not which
+    of our payments it settles.
+    """
+    if esewa_payment_id(data.get('transaction_uuid')) != payment.id:
+        raise VerificationError('This eSewa transaction was not initiated for this payment.')
+    try:
+        amount = Decimal(str(data.get('total_amount', '')).replace(',', ''))
+    except InvalidOperation:
+        raise VerificationError('The eSewa transaction amount does not match this payment.')
+    if amount != payment.amount:
+        raise VerificationError('The eSewa transaction amount does not match this payment.')
+
+
+def status_request(gateway, payment, reference):
+    """(method, url, request kwargs) of the gateway's status lookup for `reference`."""
+    if gateway == 'eSewa':
+        return 'GET', settings.ESEWA_STATUS_URL, {'params': {
+            'product_code': settings.ESEWA_PRODUCT_CODE,
+            'total_amount': esewa_amount(payment),
+            'transaction_uuid': reference,
+        }}
+    return 'POST', settings.KHALTI_LOOKUP_URL, {
+        'headers': {'Authorization': f'Key {settings.KHALTI_SECRET_KEY}', 'Content-Type': 'application/json'},
+        'data': json.dumps({'pidx': reference}),
+    }
+
+
+def khalti_amount(payment):
+    # Khalti amounts are in paisa
+    return int(payment.amount * 100)
+
+
+def read_status(gateway, response, payment):
+    """
+    (completed, gateway_status) from a status lookup response. A Khalti
+    transaction reported complete must be for exactly the payment's amount.
+    """
+    if response.status_code >= 500:
+        # Worth asking again later, unlike a refusal
+        raise GatewayUnavailable(f'{gateway} returned {response.status_code}. Please try again shortly.')
+    if response.status_code != 200:
+        if gateway == 'eSewa':
+            raise VerificationError(f'eSewa returned {response.status_code}. Status lookup failed.')
+        raise VerificationError(response.json())
+    data = response.json()
+    state = data.get('status', '')
+    if gateway == 'eSewa':
+        # The amount is part of the eSewa lookup itself
+        state = state.upper()
+        return state in ['COMPLETE', 'SUCCESS'], state
+    # Case-insensitive, with 'success' as a fallback
+    completed = state.lower() in ['completed', 'success']
+    if completed and str(data.get('total_amount')) != str(khalti_amount(payment)):
+        raise VerificationError('The Khalti transaction amount does not match this payment.')
+    return completed, state
+
+
+def lookup_status(gateway, payment, reference):
+    """Ask the gateway about `reference`; status lookups are read-only, so they are retried."""
+    method, url, kwargs = status_request(gateway, payment, reference)
+    return read_status(gateway, gateway_client(gateway).request(method, url, retry=True, **kwargs), payment)
+
+
+async def alookup_status(gateway, payment, reference):
+    method, url, kwargs = status_request(gateway, payment, reference)
+    return read_status(gateway, await gateway_client(gateway).arequest(method, url, retry=True, **kwargs), payment)
+
+
+def apply_gateway_transaction(payment_id, gateway, reference, gateway_status='', actor=None):
+    """
+    Record a verified gateway transaction and mark its payment Paid, at most once.
+    Returns True if this call paid the payment. A reference already applied to a
+    different payment is refused.
+    """
+    with transaction.atomic():
+        try:
+            # Savepoint so the unique-constraint failure doesn't poison the outer transaction
+            with transaction.atomic():
+                GatewayTransaction.objects.create(
+                    payment_id=payment_id, gateway=gateway, reference=reference, gateway_status=gateway_status
+                )
+        except IntegrityError:
+            owner_id = GatewayTransaction.objects.filter(
+                gateway=gateway, reference=reference
+            ).values_list('payment_id', flat=True).first()
+            if owner_id != payment_id:
+                raise VerificationError(f"This {gateway} transaction was already used for another payment.")
+            return False
+        return record_payment(payment_id, gateway, reference, actor=actor)[1]
+
+
+def _notify_owner(payment_id, gateway):
+    payment = Payment.objects.select_related('booking__room__owner', 'booking__tenant').get(pk=payment_id)
+    try:
+        send_notification(
+            recipient=payment.booking.room.owner,
+            actor=payment.booking.tenant,
+            notification_type='payment_received',
+            text=f"Payment of NPR {payment.amount} received via {gateway} for {payment.booking.room.title}. Booking confirmed.",
+            related_id=payment.id
+        )
+    except Exception:
+        pass
+
+
+def apply_verified(payment_id, gateway, reference, gateway_status='', actor=None):
+    """Apply a transaction the gateway reported complete, notifying the owner the first time."""
+    if apply_gateway_transaction(payment_id, gateway, reference, gateway_status, actor=actor):
+        _notify_owner(payment_id, gateway)
+        return True
+    return False
+
+
+def verify_payment(payment, gateway, reference, lookup, actor=None):
+    """
+    Verify `payment` against its gateway and apply it once. Returns
+    (verified, gateway_status).
+
+    `lookup()` asks the gateway about `reference` and returns
+    (completed, gateway_status), raising VerificationError if it can't tell.
+    An already-Paid payment or applied reference never reaches the gateway,
+    and concurrent calls for one payment and reference share a single lookup.
+    Only completed lookups are cached: a pending one is asked again next time.
+    Side effects (booking confirmation, owner notification) happen once per payment.
+    """
+    if payment.status == 'Paid' or GatewayTransaction.objects.filter(
+        payment=payment, gateway=gateway, reference=reference
+    ).exists():
+        count_metric('payment_verify_short_circuit')
+        return True, 'Paid'
+
+    def verify():
+        count_metric('payment_verify_lookup')
+        completed, gateway_status = lookup()
+        if not completed:
+            return False, gateway_status
+        apply_verified(payment.id, gateway, reference, gateway_status, actor=actor)
+        return True, gateway_status
+
+    result, shared = get_or_build(
+        f'payments:verify:{payment.id}:{gateway}:{reference}', verify, settings.PAYMENT_VERIFY_RESULT_SECONDS,
+        cache_if=lambda result: result[0]
+    )
+    if shared:
+        count_metric('payment_verify_shared')
+    return tuple(result)
@@ -1,22 +1,28 @@
-import hmac
-import hashlib
 import requests
-import base64
 import json
+from datetime import timedelta
 from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets, status, serializers
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Payment
+from stayspot.cache import read_metrics
+from stayspot.sparse_fields import SparseFieldsViewMixin
+from .models import OwnerBalance, Payment
+from .exports import CONTENT_TYPES, EXPORTERS, byte_slice, export_etag, filter_payment_logs, parse_range
+from .gateway import GatewayUnavailable, gateway_client
+from .reconciliation import METRICS as RECONCILE_METRICS
+from .webhooks import ingest_event
+from .verification import METRICS as VERIFY_METRICS, VerificationError, check_esewa_data, decode_esewa_data, esewa_amount, esewa_payment_id, esewa_signature, khalti_amount, lookup_status, verify_payment
 from .serializers import PaymentSerializer
-from notifications.utils import send_notification
 from .utils import trigger_rent_reminders, generate_monthly_payments
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
     
@@ -30,6 +36,13 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return Payment.objects.all()
         return Payment.objects.none()
 
+    @action(detail=False, methods=['get'])
+    def verification_stats(self, request):
+        """Counters for gateway verifications and reconciliation sweeps (admin only)."""
+        if request.user.role != 'Admin':
+            return Response({'error': 'Only admins can view verification stats.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(read_metrics(VERIFY_METRICS + RECONCILE_METRICS))
+
     @action(detail=True, methods=['get'])
     def get_esewa_params(self, request, pk=None):
         """Generates signed parameters for eSewa v2 initiation."""
@@ -38,18 +51,9 @@ class PaymentViewSet(viewsets.ModelViewSet):
         transaction_uuid = f"EPAY-{payment.id}-{int(timezone.now().timestamp())}"
         
         # Consistent amount formatting - eSewa v2 often prefers no decimals if it's an integer
-        amount_str = str(int(payment.amount)) if payment.amount == int(payment.amount) else str(payment.amount)
+        amount_str = esewa_amount(payment)
         data_to_sign = f"total_amount={amount_str},transaction_uuid={transaction_uuid},product_code={settings.ESEWA_PRODUCT_CODE}"
-        
-
-        
-        secret_key = settings.ESEWA_SECRET_KEY
-        signature = hmac.new(
-            secret_key.encode(),
-            data_to_sign.encode(),
-            hashlib.sha256
-        ).digest()
-        signature_base64 = base64.b64encode(signature).decode()
+        signature_base64 = esewa_signature(data_to_sign)
 
         params = {
             "amount": amount_str,
@@ -84,77 +88,28 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Encoded data is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Decode the base64 data from eSewa
-            decoded_bytes = base64.b64decode(encoded_data)
-            decoded_str = decoded_bytes.decode('utf-8')
-            response_data = json.loads(decoded_str)
-            
-            # Verify signature in response
-            # eSewa v2 sends 'data' as a base64 encoded JSON string
-            # Inside that JSON, 'transaction_uuid' contains our original payment ID
-            
-            resp_sig = response_data.get('signature')
-            resp_fields = response_data.get('signed_field_names', '').split(',')
-            
-            # Reconstruct the message string for verification based on EXACT fields sent by eSewa
-            message_parts = []
-            for field in resp_fields:
-                message_parts.append(f"{field}={response_data.get(field)}")
-            message_str = ",".join(message_parts)
-            
-
-            
-            secret_key = settings.ESEWA_SECRET_KEY
-
-
-            # HMAC requires the key and message as bytes, then we base64 encode the digest
-            hmac_obj = hmac.new(secret_key.encode(), message_str.encode(), hashlib.sha256)
-            expected_sig = base64.b64encode(hmac_obj.digest()).decode()
-            
-
-            
-            if resp_sig != expected_sig:
-                 return Response({'error': 'Invalid signature verification failed'}, status=status.HTTP_400_BAD_REQUEST)
+            # eSewa v2 sends 'data' as a base64 encoded, signed JSON string;
+            # its 'transaction_uuid' contains our original payment ID
+            response_data = decode_esewa_data(encoded_data)
 
             esewa_status = response_data.get('status', '').upper()
             if esewa_status not in ['COMPLETE', 'SUCCESS']:
 
                  return Response({'error': f'Payment status is {esewa_status}'}, status=status.HTTP_400_BAD_REQUEST)
+            # A genuine response for another (cheaper) payment must not settle this one
+            check_esewa_data(payment, response_data)
 
             esewa_transaction_code = response_data.get('transaction_code')
             
-            payment.status = 'Paid'
-            payment.paid_date = timezone.now().date()
-            payment.payment_method = 'eSewa'
-            # We keep the transaction_id as the UUID for lookup consistency, 
-            # but we can append or store the esewa code if needed.
-            # Here we'll store the esewa code as the definitive transaction reference.
-            payment.transaction_id = esewa_transaction_code
-            payment.save()
-            # Update Related Statuses
-            booking = payment.booking
-            if booking.status == 'Pending':
-                booking.status = 'Confirmed'
-                booking.save()
-
-            
-            room = booking.room
-            if room.status == 'Available':
-                room.status = 'Rented'
-                room.save()
-
-    
-            # Notify Owner
-            send_notification(
-                recipient=payment.booking.room.owner,
-                actor=payment.booking.tenant,
-                notification_type='payment_received',
-                text=f"Payment of NPR {payment.amount} received via eSewa for {payment.booking.room.title}. Booking confirmed and room marked as Rented.",
-                related_id=payment.id
+            # Store the esewa code as the definitive transaction reference.
+            # Applied once: a repeated callback changes nothing and notifies no one.
+            verify_payment(
+                payment, 'eSewa', esewa_transaction_code, lambda: (True, esewa_status), actor=request.user
             )
-    
             return Response({'status': 'Payment verified successfully'})
-            
+
+        except VerificationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -166,65 +121,22 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         if not transaction_uuid:
             return Response({'error': 'transaction_uuid is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if esewa_payment_id(transaction_uuid) != payment.id:
+            return Response({'error': 'This eSewa transaction was not initiated for this payment.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        product_code = settings.ESEWA_PRODUCT_CODE
-        amount_str = str(int(payment.amount)) if payment.amount == int(payment.amount) else str(payment.amount)
-        
-        # eSewa Status Query URL (v2)
-        # Sandbox: https://uat.esewa.com.np/api/epay/transaction/status/
-        # Product: https://esewa.com.np/api/epay/transaction/status/
-        # NOTE: uat.esewa.com.np often has DNS issues in some regions; 
-        # rc-epay.esewa.com.np is often more reliable for testing.
-        if any(x in settings.ESEWA_GATEWAY_URL.lower() for x in ["uat", "rc-epay", "rc"]):
-            lookup_url = "https://rc-epay.esewa.com.np/api/epay/transaction/status/"
-        else:
-            lookup_url = "https://esewa.com.np/api/epay/transaction/status/"
-            
-        url = f"{lookup_url}?product_code={product_code}&total_amount={amount_str}&transaction_uuid={transaction_uuid}"
-
         try:
-
-            response = requests.get(url, timeout=10)
-
-            if response.status_code == 200:
-                data = response.json()
-
-                esewa_status = data.get('status', '').upper()
-                
-                if esewa_status in ['COMPLETE', 'SUCCESS']:
-                    if payment.status != 'Paid':
-                        payment.status = 'Paid'
-                        payment.paid_date = timezone.now().date()
-                        payment.payment_method = 'eSewa'
-                        payment.transaction_id = transaction_uuid
-                        payment.save()
-                        
-                        # Update related statuses
-                        booking = payment.booking
-                        if booking.status == 'Pending':
-                            booking.status = 'Confirmed'
-                            booking.save()
-                        
-                        room = booking.room
-                        if room.status == 'Available':
-                            room.status = 'Rented'
-                            room.save()
-
-                        # Notify Owner
-                        try:
-                            send_notification(
-                                recipient=payment.booking.room.owner,
-                                actor=payment.booking.tenant,
-                                notification_type='payment_received',
-                                text=f"Payment of NPR {payment.amount} verified via eSewa lookup for {payment.booking.room.title}. Booking confirmed.",
-                                related_id=payment.id
-                            )
-                        except: pass
-                        
-                    return Response({'status': 'Payment verified successfully'})
-                return Response({'status': esewa_status, 'message': 'Payment not complete'})
-            else:
-                return Response({'error': f'eSewa returned {response.status_code}. Status lookup failed.'}, status=status.HTTP_400_BAD_REQUEST)
+            # eSewa Status Query API; skipped entirely once the payment is verified
+            verified, esewa_status = verify_payment(
+                payment, 'eSewa', transaction_uuid,
+                lambda: lookup_status('eSewa', payment, transaction_uuid), actor=request.user
+            )
+            if verified:
+                return Response({'status': 'Payment verified successfully'})
+            return Response({'status': esewa_status, 'message': 'Payment not complete'})
+        except VerificationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except GatewayUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except requests.exceptions.ConnectionError:
             return Response({'error': 'Failed to connect to eSewa server. Please check your internet connection or try again later.'}, status=status.HTTP_400_BAD_REQUEST)
         except requests.exceptions.Timeout:
@@ -245,7 +157,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
         payload = json.dumps({
             "return_url": return_url,
             "website_url": settings.FRONTEND_URL,
-            "amount": int(float(payment.amount) * 100),
+            "amount": khalti_amount(payment),
             "purchase_order_id": f"PAY-{payment.id}-{int(timezone.now().timestamp())}",
             "purchase_order_name": f"Payment for {payment.payment_type}",
             "customer_info": {
@@ -262,14 +174,19 @@ class PaymentViewSet(viewsets.ModelViewSet):
         }
 
         try:
-            response = requests.post(url, headers=headers, data=payload)
+            # Not retried: a repeated initiate would open a second Khalti payment
+            response = gateway_client('Khalti').request('POST', url, headers=headers, data=payload)
             if response.status_code == 200:
                 data = response.json()
                 payment.transaction_id = data.get('pidx')
+                # Lets the reconciliation sweep know which gateway to ask
+                payment.payment_method = 'Khalti'
                 payment.save()
                 return Response(data)
             else:
                 return Response(response.json(), status=status.HTTP_400_BAD_REQUEST)
+        except GatewayUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -282,62 +199,49 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         if not pidx:
             return Response({'error': 'pidx is required. Please initiate payment or contact support.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        url = settings.KHALTI_LOOKUP_URL
-        payload = json.dumps({"pidx": pidx})
-        headers = {
-            'Authorization': f'Key {settings.KHALTI_SECRET_KEY}',
-            'Content-Type': 'application/json',
-        }
+        # Only the transaction initiated for this payment can pay it
+        if pidx != payment.transaction_id:
+            return Response({'error': 'This pidx was not initiated for this payment.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            response = requests.post(url, headers=headers, data=payload)
-            if response.status_code == 200:
-                data = response.json()
-
-                # Use case-insensitive check and include 'success' as a fallback
-                khalti_state = data.get('status', '').lower()
-                if khalti_state in ['completed', 'success']:
-                    payment.status = 'Paid'
-                    payment.paid_date = timezone.now().date()
-                    payment.payment_method = 'Khalti'
-                    payment.transaction_id = pidx # Update transaction ID with the verified pidx
-                    payment.save()
-
-                    # Update Related Statuses
-                    booking = payment.booking
-                    if booking.status == 'Pending':
-                        booking.status = 'Confirmed'
-                        booking.save()
-
-                    
-                    room = booking.room
-                    if room.status == 'Available':
-                        room.status = 'Rented'
-                        room.save()
-
-
-                    try:
-                        # Notify Owner
-                        send_notification(
-                            recipient=payment.booking.room.owner,
-                            actor=payment.booking.tenant,
-                            notification_type='payment_received',
-                            text=f"Payment of NPR {payment.amount} received via Khalti for {payment.booking.room.title}. Booking confirmed and room marked as Rented.",
-                            related_id=payment.id
-                        )
-                    except Exception as ne:
-                        pass
-
-
-                    return Response({'status': 'Payment verified successfully'})
-                return Response({'status': data.get('status'), 'message': 'Payment state is not Completed'})
-            else:
-
-                return Response(response.json(), status=status.HTTP_400_BAD_REQUEST)
+            # The verified pidx becomes the transaction ID; repeated lookups skip Khalti
+            verified, khalti_state = verify_payment(
+                payment, 'Khalti', pidx, lambda: lookup_status('Khalti', payment, pidx), actor=request.user
+            )
+            if verified:
+                return Response({'status': 'Payment verified successfully'})
+            return Response({'status': khalti_state, 'message': 'Payment state is not Completed'})
+        except VerificationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except GatewayUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+WEBHOOK_GATEWAYS = {'esewa': 'eSewa', 'khalti': 'Khalti'}
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def payment_webhook(request, gateway):
+    """
+    Server-to-server payment callbacks (/api/payments/webhooks/esewa/ and /khalti/).
+    The raw event is stored and acknowledged at once; applying it happens in the
+    background, so the gateway never waits on our writes or notifications.
+    """
+    if gateway not in WEBHOOK_GATEWAYS:
+        return Response({'error': 'Unknown gateway'}, status=status.HTTP_404_NOT_FOUND)
+    params = request.data if request.method == 'POST' else request.query_params
+    try:
+        event, created = ingest_event(WEBHOOK_GATEWAYS[gateway], params)
+    except VerificationError as e:
+        return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    if event is None:
+        return Response({'status': 'ignored'})
+    return Response({'status': 'received' if created else 'duplicate', 'event': event.id})
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def owner_financial_dashboard(request):
@@ -349,30 +253,34 @@ def owner_financial_dashboard(request):
     if user.role != 'Owner':
         return Response({'error': 'Only owners can access this endpoint'}, status=status.HTTP_403_FORBIDDEN)
 
-    # Filter params
-    month = request.query_params.get('month') # '1' to '12' or 'All Months'
-    year = request.query_params.get('year') # e.g., '2024'
-    room_id = request.query_params.get('room_id') # 'All Rooms' or ID
+    # Filter params (see filter_payment_logs): month '1'-'12' or 'All Months',
+    # year e.g. '2024', room_id or 'All Rooms'
 
     # Base queryset for owner's payments
     owner_payments = Payment.objects.filter(booking__room__owner=user)
-    paid_payments = owner_payments.filter(status='Paid')
 
-    # Current Month Stats
+    # Earnings come from the owner's ledger balances: this month, last month and all time
     now = timezone.now()
-    current_month_paid = paid_payments.filter(paid_date__month=now.month, paid_date__year=now.year)
-    this_month_earnings = sum(p.amount for p in current_month_paid)
-    this_month_count = current_month_paid.count()
+    this_month = now.date().replace(day=1)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    balances = {
+        b.period: b for b in OwnerBalance.objects.filter(owner=user).filter(
+            Q(period__in=[this_month, last_month]) | Q(period__isnull=True)
+        )
+    }
+    empty = OwnerBalance(owner=user)
+
+    # Current Month Stats
+    this_month_earnings = balances.get(this_month, empty).received
+    this_month_count = balances.get(this_month, empty).receipts
 
     # Last Month Stats
-    last_month_val = now.month - 1 if now.month > 1 else 12
-    last_month_year = now.year if now.month > 1 else now.year - 1
-    last_month_paid = paid_payments.filter(paid_date__month=last_month_val, paid_date__year=last_month_year)
-    last_month_earnings = sum(p.amount for p in last_month_paid)
-    last_month_count = last_month_paid.count()
+    last_month_earnings = balances.get(last_month, empty).received
+    last_month_count = balances.get(last_month, empty).receipts
 
     # All-Time Earnings
-    all_time_earnings = sum(p.amount for p in paid_payments)
+    all_time_earnings = balances.get(None, empty).received
+    outstanding = balances.get(None, empty).outstanding
 
     # Percentage changes (simplified)
     this_month_change = 0
@@ -380,16 +288,10 @@ def owner_financial_dashboard(request):
         this_month_change = ((this_month_earnings - last_month_earnings) / last_month_earnings) * 100
 
     # Apply Filters to Logs
-    logs_queryset = owner_payments.select_related('booking__tenant', 'booking__room').order_by('-created_at')
-    
-    if year and year != 'All' and year.isdigit():
-        logs_queryset = logs_queryset.filter(created_at__year=int(year))
-    
-    if month and month != 'All Months' and month.isdigit():
-        logs_queryset = logs_queryset.filter(created_at__month=int(month))
-        
-    if room_id and room_id != 'All Rooms' and room_id.isdigit():
-        logs_queryset = logs_queryset.filter(booking__room_id=int(room_id))
+    logs_queryset = filter_payment_logs(
+        owner_payments.select_related('booking__tenant', 'booking__room').order_by('-created_at'),
+        request.query_params
+    )
 
     # Prepare logs data
     logs_data = []
@@ -428,6 +330,7 @@ def owner_financial_dashboard(request):
             },
             'all_time': {
                 'earnings': all_time_earnings,
+                'outstanding': outstanding,
                 'since': user.date_joined.strftime('%B %Y')
             }
         },
@@ -437,6 +340,53 @@ def owner_financial_dashboard(request):
         }
     })
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def owner_payment_export(request):
+    """
+    Download of the owner's payment logs as CSV (or ?type=xlsx), with the
+    dashboard's month/year/room filters. Rows are streamed from the database as
+    the file is written, so memory use doesn't grow with the history.
+
+    Single byte ranges are served so large downloads can resume (If-Range with
+    the ETag guards against a changed export). The ETag comes from one
+    aggregate query (see export_etag), so a plain download reads the rows once;
+    a range request generates the export twice, once to measure it and once to
+    send the slice.
+    """
+    user = request.user
+    if user.role != 'Owner':
+        return Response({'error': 'Only owners can access this endpoint'}, status=status.HTTP_403_FORBIDDEN)
+    fmt = request.query_params.get('type', 'csv')
+    if fmt not in EXPORTERS:
+        return Response({'error': 'type must be csv or xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+
+    params = request.query_params
+    etag = export_etag(user, params, fmt)
+    chunks = lambda: EXPORTERS[fmt](user, params)
+    byte_range = None
+    if request.headers.get('Range') and request.headers.get('If-Range', etag) == etag:
+        length = sum(len(chunk) for chunk in chunks())
+        byte_range = parse_range(request.headers['Range'], length)
+        if byte_range is False:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{length}'
+            return response
+
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            byte_slice(chunks(), start, end), status=status.HTTP_206_PARTIAL_CONTENT, content_type=CONTENT_TYPES[fmt]
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{length}'
+        response['Content-Length'] = end - start + 1
+    else:
+        response = StreamingHttpResponse(chunks(), content_type=CONTENT_TYPES[fmt])
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="payments.{fmt}"'
+    return response
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def trigger_reminders(request):
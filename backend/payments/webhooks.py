@@ -0,0 +1,169 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from .models import Payment, PaymentEvent
+from .verification import (
+    VerificationError, apply_verified, check_esewa_data, decode_esewa_data, esewa_payment_id, lookup_status
+)
+
+logger = logging.getLogger(__name__)
+
+# How long one worker may hold a payment's event queue before another can take over
+QUEUE_LOCK_SECONDS = 60
+# Gateway trouble worth retrying (GatewayUnavailable is a ConnectionError)
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='payment-events')
+
+
+def _payment_id(gateway, reference):
+    """
+    The payment a callback is about. The eSewa uuid is covered by the signature;
+    an unsigned Khalti callback only counts for the payment its pidx was
+    initiated for, whatever else the caller claims.
+    """
+    if gateway == 'eSewa':
+        payment_id = esewa_payment_id(reference)
+        if payment_id is not None and Payment.objects.filter(pk=payment_id).exists():
+            return payment_id
+        return None
+    return Payment.objects.filter(transaction_id=reference).values_list('id', flat=True).first()
+
+
+def parse_callback(gateway, params):
+    """
+    (dedup key, payment id, payload) for a callback. eSewa callbacks carry the
+    signed `data` blob and are rejected unless the signature checks out; Khalti
+    callbacks are unsigned, so they are only a hint to look the pidx up.
+    """
+    if gateway == 'eSewa':
+        encoded = params.get('data')
+        if not encoded:
+            raise VerificationError('Encoded data is required')
+        try:
+            data = decode_esewa_data(encoded)
+        except VerificationError:
+            raise
+        except Exception:
+            raise VerificationError('Malformed eSewa data')
+        uuid, status = data.get('transaction_uuid', ''), str(data.get('status', '')).upper()
+        return f'{uuid}:{status}', _payment_id(gateway, uuid), data
+
+    pidx = params.get('pidx')
+    if not pidx:
+        raise VerificationError('pidx is required')
+    data = {key: params.get(key) for key in params}
+    return f"{pidx}:{params.get('status', '')}", _payment_id(gateway, pidx), data
+
+
+def ingest_event(gateway, params):
+    """
+    Store a callback and queue its payment for processing. Returns (event,
+    created); callbacks matching no payment are only logged, as (None, False).
+    """
+    dedup_key, payment_id, payload = parse_callback(gateway, params)
+    if payment_id is None:
+        logger.warning(f"Ignoring {gateway} callback {dedup_key[:150]}: no matching payment")
+        return None, False
+    try:
+        with transaction.atomic():
+            event = PaymentEvent.objects.create(
+                gateway=gateway, dedup_key=dedup_key[:150], payment_id=payment_id, payload=payload
+            )
+            schedule_event_processing(payment_id)
+    except IntegrityError:
+        return PaymentEvent.objects.get(gateway=gateway, dedup_key=dedup_key[:150]), False
+    return event, True
+
+
+def process_event(event):
+    """Apply one event through the idempotent verification path."""
+    payment = event.payment
+    if payment.status == 'Paid':
+        return
+    if event.gateway == 'eSewa':
+        # Signature already checked on receipt
+        completed = event.payload.get('status', '').upper() in ['COMPLETE', 'SUCCESS']
+        reference, gateway_status = event.payload.get('transaction_code'), event.payload.get('status', '')
+        if completed:
+            check_esewa_data(payment, event.payload)
+    else:
+        # Unsigned callback: trust only what Khalti says about the pidx initiated for this payment
+        reference = event.payload['pidx']
+        if reference != payment.transaction_id:
+            raise VerificationError('This pidx was not initiated for this payment.')
+        completed, gateway_status = lookup_status('Khalti', payment, reference)
+    if completed:
+        apply_verified(payment.id, event.gateway, reference, gateway_status)
+
+
+def _drain(payment_id):
+    """Process a payment's events in order. Returns False if it stopped at one to retry later."""
+    while True:
+        event = PaymentEvent.objects.filter(payment_id=payment_id, status='Received').select_related('payment').first()
+        if event is None:
+            return True
+        try:
+            process_event(event)
+            event.status, event.error = 'Processed', ''
+        except TRANSIENT_ERRORS as e:
+            event.attempts, event.error = event.attempts + 1, str(e)
+            if event.attempts < settings.PAYMENT_EVENT_MAX_ATTEMPTS:
+                # Later events wait behind this one; the next sweep retries it
+                logger.warning(f"Payment event {event.id} will be retried: {str(e)}")
+                event.save(update_fields=['attempts', 'error'])
+                return False
+            logger.error(f"Payment event {event.id} failed after {event.attempts} attempts: {str(e)}")
+            event.status = 'Failed'
+        except Exception as e:
+            logger.error(f"Payment event {event.id} failed: {str(e)}")
+            event.status, event.error = 'Failed', str(e)
+        event.processed_at = timezone.now()
+        event.save(update_fields=['status', 'error', 'attempts', 'processed_at'])
+
+
+def process_payment_events(payment_id):
+    """
+    Process a payment's received events one at a time, oldest first. One worker
+    (in any process) holds a payment's queue at a time; the others leave it to
+    the holder, who re-checks for new events before letting go.
+    """
+    lock_key = f'payments:events:{payment_id}'
+    while cache.add(lock_key, 1, QUEUE_LOCK_SECONDS):
+        try:
+            drained = _drain(payment_id)
+        finally:
+            cache.delete(lock_key)
+        if not drained or not PaymentEvent.objects.filter(payment_id=payment_id, status='Received').exists():
+            return
+
+
+def process_received_events():
+    """
+    Sweep every payment with unprocessed events: those left by a restart and
+    those waiting to retry a gateway error. Returns payments visited.
+    """
+    payment_ids = list(
+        PaymentEvent.objects.filter(status='Received').order_by('payment_id')
+        .values_list('payment_id', flat=True).distinct()
+    )
+    for payment_id in payment_ids:
+        process_payment_events(payment_id)
+    return len(payment_ids)
+
+
+def _run(payment_id):
+    try:
+        process_payment_events(payment_id)
+    except Exception as e:
+        logger.error(f"Processing events for payment {payment_id} failed: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_event_processing(payment_id):
+    transaction.on_commit(lambda: _executor.submit(_run, payment_id))
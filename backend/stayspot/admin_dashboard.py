@@ -6,14 +6,14 @@ from django.contrib.admin import AdminSite
 def get_admin_analytics():
     from accounts.models import User
     from OwnerRooms.models import Room, Booking, Complaint
-    from payments.models import Payment
+    from payments.models import OwnerBalance
 
     now = timezone.now()
     start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
-    # Financials
-    total_rev = Payment.objects.filter(status='Paid').aggregate(total=Sum('amount'))['total'] or 0
-    monthly_rev = Payment.objects.filter(status='Paid', paid_date__gte=start_of_month).aggregate(total=Sum('amount'))['total'] or 0
+    # Financials (from the owners' ledger balances)
+    total_rev = OwnerBalance.objects.filter(period__isnull=True).aggregate(total=Sum('received'))['total'] or 0
+    monthly_rev = OwnerBalance.objects.filter(period=start_of_month.date()).aggregate(total=Sum('received'))['total'] or 0
 
     # Complaint Breakdown
     total_complaints = Complaint.objects.count()
@@ -0,0 +1,386 @@
+"""
+Two-level cache tier.
+
+`TwoLevelCache` is a cache backend that keeps a small per-process LRU in front
+of a shared backend (the `shared` alias in CACHES: a database table or file
+cache by default, anything Django supports in production). Local copies live
+for at most LOCAL_TIMEOUT seconds, which bounds how stale another process can
+be after a write. If the shared backend is unavailable (e.g. the cache table
+has not been created yet) the tier keeps working from local memory alone.
+
+On top of any cache, this module provides tag-versioned keys
+(`tagged_key`/`invalidate_tags`), single-flight `get_or_build`, so an
+expensive value is rebuilt by one caller while concurrent callers wait for it,
+and hit/miss counters (`count_metric`/`read_metrics`) that are summed in
+process memory and added to the shared cache every few seconds.
+
+Tag versions are ordinary keys, so they are held in the local LRU too: after
+`invalidate_tags` the invalidating process sees the new version at once
+(incr drops its local copy), while other processes may keep serving values
+built under the old version for up to LOCAL_TIMEOUT seconds. That is the same
+bound as for any other key, and it is the staleness accepted for tagged
+results (room searches, room payloads); use LOCAL_TIMEOUT 0 where it is not.
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """Thread-safe, size-bounded LRU with per-entry expiry."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Django creates a cache instance per thread; the LRU must be shared by the whole process
+_local_stores = {}
+_local_stores_guard = threading.Lock()
+
+
+def _local_store(name, max_entries):
+    with _local_stores_guard:
+        if name not in _local_stores:
+            _local_stores[name] = LocalLRU(max_entries)
+        return _local_stores[name]
+
+
+class TwoLevelCache(BaseCache):
+    """
+    Per-process LRU (level 1) over a shared Django cache (level 2).
+
+    OPTIONS:
+        SHARED: alias of the shared backend in CACHES (default 'shared')
+        LOCAL_MAX_ENTRIES: size of the per-process LRU (default 1000)
+        LOCAL_TIMEOUT: max seconds a value is served from local memory (default 5)
+    """
+
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        super().__init__(params)
+        self.local = _local_store(location or self.shared_alias, options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._shared_down_until = 0
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _call_shared(self, method, *args, **kwargs):
+        """Run a shared-backend call; on failure fall back to local-only for a while."""
+        if self._shared_down_until > time.monotonic():
+            return _MISSING
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except ValueError:
+            # incr() on a missing key: a normal miss, not an outage
+            raise
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable, using local memory only: {str(e)}")
+            self._shared_down_until = time.monotonic() + 30
+            return _MISSING
+
+    def _local_timeout(self, timeout, shared_ok):
+        timeout = self.get_backend_timeout(timeout)
+        if not shared_ok:
+            # Local memory is the only copy, so keep it as long as asked
+            return timeout
+        return self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            return value
+        value = self._call_shared('get', key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        shared_ok = self._call_shared('set', key, value, timeout, version=version) is not _MISSING
+        self.local.set(local_key, value, self._local_timeout(timeout, shared_ok))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        added = self._call_shared('add', key, value, timeout, version=version)
+        if added is _MISSING:
+            # Shared backend down: local memory decides
+            if self.local.get(local_key) is not _MISSING:
+                return False
+            self.local.set(local_key, value, self._local_timeout(timeout, False))
+            return True
+        if added:
+            self.local.set(local_key, value, self._local_timeout(timeout, True))
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call_shared('touch', key, timeout, version=version) is True
+
+    def delete(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        deleted_locally = self.local.delete(local_key)
+        deleted = self._call_shared('delete', key, version=version)
+        return deleted_locally if deleted is _MISSING else bool(deleted)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        try:
+            value = self._call_shared('incr', key, delta, version=version)
+        except ValueError:
+            self.local.delete(local_key)
+            raise
+        if value is _MISSING:
+            current = self.local.get(local_key)
+            if current is _MISSING:
+                raise ValueError(f"Key '{key}' not found")
+            value = current + delta
+            self.local.set(local_key, value, None)
+        else:
+            self.local.delete(local_key)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        for key in keys:
+            value = self.local.get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            fetched = self._call_shared('get_many', remote, version=version)
+            if fetched is not _MISSING:
+                for key, value in fetched.items():
+                    self.local.set(self.make_and_validate_key(key, version=version), value, self.local_timeout)
+                found.update(fetched)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._call_shared('set_many', data, timeout, version=version)
+        shared_ok = failed is not _MISSING
+        local_timeout = self._local_timeout(timeout, shared_ok)
+        for key, value in data.items():
+            self.local.set(self.make_and_validate_key(key, version=version), value, local_timeout)
+        return failed if shared_ok else []
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self.make_and_validate_key(key, version=version))
+        self._call_shared('delete_many', keys, version=version)
+
+    def clear(self):
+        self.local.clear()
+        # Unflushed counts would otherwise reappear in the emptied cache
+        discard_metrics()
+        self._call_shared('clear')
+
+
+# Tag-versioned keys
+
+TAG_KEY = 'tag:{}'
+
+
+def _initial_version():
+    # Start from the clock so an evicted tag never reuses a version seen before
+    return int(time.time() * 1000)
+
+
+def tag_versions(tags, cache=None):
+    cache = cache or caches['default']
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in versions}
+    for key, version in missing.items():
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+        versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def tagged_key(key, tags=(), cache=None):
+    """`key` suffixed with the current version of every tag; bumping a tag orphans it."""
+    if not tags:
+        return key
+    versions = ':'.join(str(version) for version in tag_versions(tags, cache))
+    return f"{key}:{hashlib.sha1(versions.encode()).hexdigest()[:16]}"
+
+
+def invalidate_tags(*tags, cache=None):
+    """Invalidate every key built with any of these tags."""
+    cache = cache or caches['default']
+    for tag in tags:
+        key = TAG_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+# Single-flight get-or-build
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(key):
+    with _local_locks_guard:
+        return _local_locks.setdefault(key, threading.Lock())
+
+
+def get_or_build(key, build, timeout=DEFAULT_TIMEOUT, tags=(), lock_timeout=10, wait=5, cache=None, cache_if=None):
+    """
+    Return the cached value for `key` (under `tags`), building it at most once.
+
+    Threads in this process queue on a local lock; other processes see a
+    short-lived lock key in the shared cache and poll for the value instead
+    of rebuilding it. If the builder takes longer than `wait`, the caller
+    builds its own copy rather than failing, and leaves the lock to its owner:
+    only the caller whose token is in the lock key deletes it. `cache_if(value)` returning
+    False keeps a built value out of the cache (e.g. an answer that may change
+    any moment), so the next caller builds again. Returns (value, hit).
+    """
+    cache = cache or caches['default']
+    full_key = tagged_key(key, tags, cache)
+    value = cache.get(full_key, _MISSING)
+    if value is not _MISSING:
+        return value, True
+
+    try:
+        with _local_lock(full_key):
+            value = cache.get(full_key, _MISSING)
+            if value is not _MISSING:
+                return value, True
+
+            lock_key = f"lock:{full_key}"
+            token = uuid.uuid4().hex
+            owned = cache.add(lock_key, token, lock_timeout)
+            if not owned:
+                deadline = time.monotonic() + wait
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = cache.get(full_key, _MISSING)
+                    if value is not _MISSING:
+                        return value, True
+            try:
+                value = build()
+                if cache_if is None or cache_if(value):
+                    cache.set(full_key, value, timeout)
+            finally:
+                # Not ours if we gave up waiting, nor once it expired and another caller took it
+                if owned and cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+            return value, False
+    finally:
+        with _local_locks_guard:
+            _local_locks.pop(full_key, None)
+
+
+# Hit/miss counters
+
+METRIC_KEY = 'metrics:{}'
+
+
+_pending_metrics = {}
+_pending_guard = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def count_metric(name, n=1, cache=None):
+    """
+    Count `n` events. Counts are summed in process memory and added to the
+    shared cache once CACHE_METRICS_FLUSH_SECONDS have passed, so hot paths
+    don't write to the shared backend on every call.
+    """
+    if not n:
+        return
+    cache = cache or caches['default']
+    with _pending_guard:
+        _pending_metrics[(cache, name)] = _pending_metrics.get((cache, name), 0) + n
+        due = time.monotonic() - _last_flush >= settings.CACHE_METRICS_FLUSH_SECONDS
+    if due:
+        flush_metrics()
+
+
+def flush_metrics():
+    """Add this process's unflushed counts to the shared counters."""
+    global _last_flush
+    with _pending_guard:
+        pending = list(_pending_metrics.items())
+        _pending_metrics.clear()
+        _last_flush = time.monotonic()
+    for (cache, name), n in pending:
+        key = METRIC_KEY.format(name)
+        try:
+            cache.incr(key, n)
+        except ValueError:
+            cache.add(key, 0, None)
+            cache.incr(key, n)
+
+
+def discard_metrics():
+    with _pending_guard:
+        _pending_metrics.clear()
+
+
+def read_metrics(names, cache=None):
+    """
+    {name: count} plus `<prefix>_hit_rate` for every `<prefix>_hit`/`<prefix>_miss` pair.
+    Includes this process's unflushed counts; other processes' arrive within a flush interval.
+    """
+    cache = cache or caches['default']
+    flush_metrics()
+    found = cache.get_many([METRIC_KEY.format(name) for name in names])
+    stats = {name: found.get(METRIC_KEY.format(name), 0) for name in names}
+    for name in names:
+        if name.endswith('_hit') and f'{name[:-4]}_miss' in stats:
+            total = stats[name] + stats[f'{name[:-4]}_miss']
+            stats[f'{name[:-4]}_hit_rate'] = round(stats[name] / total, 4) if total else 0
+    return stats
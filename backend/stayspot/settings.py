@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'notifications',
     'chat',
     'payments',
+    'mediastore',
 ]
 
 MIDDLEWARE = [
@@ -91,6 +92,16 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Chat delivered/seen receipts are buffered per conversation and written at most once per window
+CHAT_RECEIPT_FLUSH_MS = int(os.environ.get('CHAT_RECEIPT_FLUSH_MS', '500'))
+
+# Chat media uploads (chunked + resumable); partial files live outside MEDIA_ROOT
+CHAT_UPLOAD_MAX_BYTES = int(os.environ.get('CHAT_UPLOAD_MAX_BYTES', str(25 * 1024 * 1024)))
+CHAT_UPLOAD_CHUNK_BYTES = int(os.environ.get('CHAT_UPLOAD_CHUNK_BYTES', str(1024 * 1024)))
+CHAT_UPLOAD_TEMP_DIR = os.environ.get('CHAT_UPLOAD_TEMP_DIR', str(BASE_DIR / 'chat_uploads'))
+# Unfinished uploads untouched this long are deleted by `expire_chat_uploads` (run hourly)
+CHAT_UPLOAD_EXPIRE_HOURS = int(os.environ.get('CHAT_UPLOAD_EXPIRE_HOURS', '24'))
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -148,6 +159,78 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded media is stored once per distinct content (SHA-256) with reference counting.
+# Set MEDIA_DEDUP=False to fall back to plain per-upload files.
+if os.environ.get('MEDIA_DEDUP', 'True') == 'True':
+    DEFAULT_FILE_STORAGE = 'mediastore.storage.ContentAddressedStorage'
+
+# Room image uploads: per-file limit, per-request byte budget and file count
+ROOM_IMAGE_MAX_BYTES = int(os.environ.get('ROOM_IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+ROOM_IMAGE_UPLOAD_BUDGET_BYTES = int(os.environ.get('ROOM_IMAGE_UPLOAD_BUDGET_BYTES', str(50 * 1024 * 1024)))
+ROOM_IMAGE_MAX_FILES = int(os.environ.get('ROOM_IMAGE_MAX_FILES', '20'))
+
+# Room view counts are buffered per process and flushed in the background as
+# `views = views + n` plus a batched insert into the view event log; 0 (or a
+# full buffer) flushes right away, still off the request.
+ROOM_VIEW_FLUSH_SECONDS = float(os.environ.get('ROOM_VIEW_FLUSH_SECONDS', '10'))
+ROOM_VIEW_FLUSH_MAX = int(os.environ.get('ROOM_VIEW_FLUSH_MAX', '1000'))
+# Viewers are logged for the nightly unique-viewer estimate; off, views are logged anonymously
+ROOM_VIEW_UNIQUE = os.environ.get('ROOM_VIEW_UNIQUE', 'True') == 'True'
+# Raw view events are kept this many days after the nightly rollup (rollup_room_stats)
+ROOM_VIEW_EVENT_RETENTION_DAYS = int(os.environ.get('ROOM_VIEW_EVENT_RETENTION_DAYS', '90'))
+
+# Personalized room suggestions: how many rooms are kept per tenant, and which
+# tenants count as active for the nightly refresh_recommendations run
+ROOM_RECOMMENDATION_TOP_K = int(os.environ.get('ROOM_RECOMMENDATION_TOP_K', '24'))
+ROOM_RECOMMENDATION_ACTIVE_DAYS = int(os.environ.get('ROOM_RECOMMENDATION_ACTIVE_DAYS', '30'))
+
+# Map markers: clusters are precomputed for zoom levels MIN..MAX on a grid of
+# 2^ROOM_MAP_CELL_BITS cells per map tile side; beyond MAX every room is its own marker
+ROOM_MAP_MIN_ZOOM = int(os.environ.get('ROOM_MAP_MIN_ZOOM', '3'))
+ROOM_MAP_MAX_ZOOM = int(os.environ.get('ROOM_MAP_MAX_ZOOM', '16'))
+ROOM_MAP_CELL_BITS = int(os.environ.get('ROOM_MAP_CELL_BITS', '2'))
+# Above ROOM_MAP_MAX_ZOOM, viewports wider than this many map tiles get clusters, not every room
+ROOM_MAP_MAX_VIEWPORT_TILES = int(os.environ.get('ROOM_MAP_MAX_VIEWPORT_TILES', '64'))
+
+# Vector tiles (/api/rooms/tiles/z/x/y.pbf) are rendered up to ROOM_TILE_MAX_ZOOM and
+# cached on disk per tile version; map clients overzoom beyond it
+ROOM_TILE_MAX_ZOOM = int(os.environ.get('ROOM_TILE_MAX_ZOOM', '16'))
+ROOM_TILE_CACHE_DIR = os.environ.get('ROOM_TILE_CACHE_DIR', str(BASE_DIR / 'tile_cache'))
+
+# Tenant search filters are buffered and folded into UserSearchPreference in background
+# batches (0, or a full buffer, flushes right away, still off the request); each new
+# search scales the weight of earlier ones by SEARCH_PREFERENCE_DECAY
+SEARCH_PREFERENCE_FLUSH_SECONDS = float(os.environ.get('SEARCH_PREFERENCE_FLUSH_SECONDS', '30'))
+SEARCH_PREFERENCE_FLUSH_MAX = int(os.environ.get('SEARCH_PREFERENCE_FLUSH_MAX', '500'))
+SEARCH_PREFERENCE_DECAY = float(os.environ.get('SEARCH_PREFERENCE_DECAY', '0.8'))
+
+# Two-level cache (stayspot.cache): a per-process LRU in front of the shared backend.
+# The shared backend defaults to a database table (`manage.py createcachetable`);
+# set CACHE_BACKEND/CACHE_LOCATION for a file, Redis or Memcached cache instead.
+# Bump CACHE_VERSION to orphan every cached value at once (e.g. after a payload change).
+# Other processes see writes and tag invalidations up to CACHE_LOCAL_TIMEOUT seconds late
+# (tag versions are held in the per-process LRU like any key); 0 turns the local level off.
+CACHES = {
+    'default': {
+        'BACKEND': 'stayspot.cache.TwoLevelCache',
+        'VERSION': int(os.environ.get('CACHE_VERSION', '1')),
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', '1000')),
+            'LOCAL_TIMEOUT': int(os.environ.get('CACHE_LOCAL_TIMEOUT', '5')),
+        },
+    },
+    'shared': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'stayspot_cache'),
+        'VERSION': int(os.environ.get('CACHE_VERSION', '1')),
+    },
+}
+ROOM_SEARCH_CACHE_SECONDS = int(os.environ.get('ROOM_SEARCH_CACHE_SECONDS', '120'))
+ROOM_DETAIL_CACHE_SECONDS = int(os.environ.get('ROOM_DETAIL_CACHE_SECONDS', '600'))
+# Hit/miss counters are summed per process and written to the shared cache at most this often
+CACHE_METRICS_FLUSH_SECONDS = int(os.environ.get('CACHE_METRICS_FLUSH_SECONDS', '10'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -210,9 +293,48 @@ ESEWA_SECRET_KEY = os.environ.get('ESEWA_SECRET_KEY', '8g7h9z9876nd97y') # Repla
 ESEWA_PRODUCT_CODE = os.environ.get('ESEWA_PRODUCT_CODE', 'EPAYTEST')
 # eSewa v2 Sandbox (UAT/RC)
 ESEWA_GATEWAY_URL = 'https://rc-epay.esewa.com.np/api/epay/main/v2/form'
+# eSewa Status Query API; rc-epay.esewa.com.np is more reliable than uat for testing
+ESEWA_STATUS_URL = os.environ.get(
+    'ESEWA_STATUS_URL',
+    'https://rc-epay.esewa.com.np/api/epay/transaction/status/'
+    if any(x in ESEWA_GATEWAY_URL.lower() for x in ["uat", "rc-epay", "rc"])
+    else 'https://esewa.com.np/api/epay/transaction/status/'
+)
 
 # Khalti Configuration (Sandbox)
 KHALTI_PUBLIC_KEY = os.environ.get('KHALTI_PUBLIC_KEY', '')
 KHALTI_SECRET_KEY = os.environ.get('KHALTI_SECRET_KEY', '')
 KHALTI_GATEWAY_URL = 'https://dev.khalti.com/api/v2/epayment/initiate/'
-KHALTI_LOOKUP_URL = 'https://dev.khalti.com/api/v2/epayment/lookup/'
\ No newline at end of file
+KHALTI_LOOKUP_URL = 'https://dev.khalti.com/api/v2/epayment/lookup/'
+
+# Gateway HTTP calls (payments.gateway): pooled keep-alive sessions, strict timeouts,
+# retried lookups with jittered backoff, and a circuit breaker per gateway that fails
+# fast for BREAKER_COOLDOWN seconds after BREAKER_THRESHOLD consecutive failures
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_CONNECT_TIMEOUT', '3'))
+PAYMENT_GATEWAY_READ_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_READ_TIMEOUT', '10'))
+PAYMENT_GATEWAY_RETRIES = int(os.environ.get('PAYMENT_GATEWAY_RETRIES', '2'))
+PAYMENT_GATEWAY_BACKOFF = float(os.environ.get('PAYMENT_GATEWAY_BACKOFF', '0.2'))
+PAYMENT_GATEWAY_POOL_SIZE = int(os.environ.get('PAYMENT_GATEWAY_POOL_SIZE', '10'))
+PAYMENT_GATEWAY_BREAKER_THRESHOLD = int(os.environ.get('PAYMENT_GATEWAY_BREAKER_THRESHOLD', '5'))
+PAYMENT_GATEWAY_BREAKER_COOLDOWN = float(os.environ.get('PAYMENT_GATEWAY_BREAKER_COOLDOWN', '30'))
+
+# Concurrent verifications of one payment share a single gateway lookup; a completed
+# result is reused for this long (pending answers are asked again on the next poll)
+PAYMENT_VERIFY_RESULT_SECONDS = int(os.environ.get('PAYMENT_VERIFY_RESULT_SECONDS', '5'))
+
+# Background sweep (manage.py reconcile_payments) of unpaid payments holding a gateway
+# transaction: payments are read BATCH_SIZE at a time and up to CONCURRENCY gateway
+# status lookups run at once
+PAYMENT_RECONCILE_BATCH_SIZE = int(os.environ.get('PAYMENT_RECONCILE_BATCH_SIZE', '100'))
+PAYMENT_RECONCILE_CONCURRENCY = int(os.environ.get('PAYMENT_RECONCILE_CONCURRENCY', '8'))
+
+# Owner payment log exports (payments.exports) read rows from the database this many at a time
+PAYMENT_EXPORT_CHUNK_SIZE = int(os.environ.get('PAYMENT_EXPORT_CHUNK_SIZE', '2000'))
+
+# Owner tenant directory (/api/owner/tenants/) page size, default and largest allowed
+OWNER_TENANTS_PAGE_SIZE = int(os.environ.get('OWNER_TENANTS_PAGE_SIZE', '20'))
+OWNER_TENANTS_MAX_PAGE_SIZE = int(os.environ.get('OWNER_TENANTS_MAX_PAGE_SIZE', '100'))
+
+# Stored gateway callbacks (payments.webhooks) hitting a gateway error stay queued for
+# the process_payment_events sweep, and are marked Failed after this many attempts
+PAYMENT_EVENT_MAX_ATTEMPTS = int(os.environ.get('PAYMENT_EVENT_MAX_ATTEMPTS', '5'))
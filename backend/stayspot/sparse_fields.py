@@ -0,0 +1,104 @@
+"""
+Sparse fieldsets for the API: `?fields=id,title` or `?exclude=images` on any
+read request.
+
+`SparseFieldsMixin` lets a serializer drop fields it was asked not to render.
+`SparseFieldsViewMixin` reads the query params for generic views and pushes
+the pruning down to the queryset, so unused columns are deferred and unused
+relations are never joined or prefetched. Plain ViewSets use `sparse_kwargs`
+and `sparse_queryset` directly.
+
+Serializer fields that read the instance through a method (`source='*'`)
+declare the model fields they need in `Meta.field_dependencies`; if a kept
+field has no declaration the queryset is left untouched rather than guessed.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+
+SPARSE_PARAMS = ('fields', 'exclude')
+
+
+def sparse_kwargs(request):
+    """{'fields': [...], 'exclude': [...]} from a GET request's query params (empty otherwise)."""
+    if request is None or request.method != 'GET':
+        return {}
+    kwargs = {}
+    for param in SPARSE_PARAMS:
+        names = [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+        if names:
+            kwargs[param] = names
+    return kwargs
+
+
+class SparseFieldsMixin:
+    """Serializer mixin accepting `fields=` / `exclude=` kwargs."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+        self.sparse = bool(fields or exclude)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in exclude or ():
+            self.fields.pop(name, None)
+
+
+def selected_columns(serializer, model):
+    """
+    Top-level model fields the serializer reads, or None when that can't be
+    known (a method field without Meta.field_dependencies, a property source).
+    """
+    dependencies = getattr(getattr(serializer, 'Meta', None), 'field_dependencies', {})
+    names = set()
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            if name not in dependencies:
+                return None
+            names.update(dependencies[name])
+        else:
+            names.add(field.source.split('.')[0])
+
+    columns = {}
+    for name in names:
+        try:
+            columns[name] = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+    return columns
+
+
+def sparse_queryset(queryset, serializer_class, **sparse):
+    """Restrict `queryset` to what `serializer_class(**sparse)` renders."""
+    if not sparse or not isinstance(queryset, QuerySet) or not issubclass(serializer_class, SparseFieldsMixin):
+        return queryset
+    columns = selected_columns(serializer_class(**sparse), queryset.model)
+    if columns is None:
+        return queryset
+
+    def kept(lookup):
+        return getattr(lookup, 'prefetch_through', lookup).split('__')[0] in columns
+
+    prefetches = [lookup for lookup in queryset._prefetch_related_lookups if kept(lookup)]
+    queryset = queryset.prefetch_related(None).prefetch_related(*prefetches)
+    related = queryset.query.select_related
+    if isinstance(related, dict):
+        queryset = queryset.select_related(None).select_related(*[name for name in related if name in columns])
+    # Reverse relations have no column; only() always keeps the primary key
+    return queryset.only(*[name for name, field in columns.items() if field.concrete])
+
+
+class SparseFieldsViewMixin:
+    """Generic view mixin applying ?fields= / ?exclude= to the serializer and the queryset."""
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            kwargs = {**sparse_kwargs(self.request), **kwargs}
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return sparse_queryset(queryset, self.get_serializer_class(), **sparse_kwargs(self.request))
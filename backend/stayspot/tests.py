@@ -0,0 +1,126 @@
+from django.test import TestCase
+
+
+class TwoLevelCacheTests(TestCase):
+    """
+    UNIT TESTS — Two-Level Cache Tier
+    Tests the local LRU over the shared backend, tags and single-flight builds.
+    """
+    def setUp(self):
+        from django.core.cache import caches
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_values_reach_shared_backend(self):
+        """Writes go to both levels; a cold local LRU refills from the shared backend."""
+        print("\n[RUNNING]: test_values_reach_shared_backend")
+        from django.core.cache import caches
+        self.cache.set('greeting', {'text': 'namaste'}, 60)
+        self.assertEqual(caches['shared'].get('greeting'), {'text': 'namaste'})
+
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get('greeting'), {'text': 'namaste'})
+        self.cache.delete('greeting')
+        self.assertIsNone(self.cache.get('greeting'))
+        print("[RESULT]: SUCCESS - Both cache levels stay in step.")
+
+    def test_falls_back_to_local_memory(self):
+        """If the shared backend errors, reads and writes keep working locally."""
+        print("\n[RUNNING]: test_falls_back_to_local_memory")
+        from unittest import mock
+        with mock.patch.object(type(self.cache), 'shared', new_callable=mock.PropertyMock) as shared:
+            shared.return_value.set.side_effect = RuntimeError('cache table missing')
+            self.cache._shared_down_until = 0
+            with self.assertLogs('stayspot.cache', 'WARNING'):
+                self.cache.set('offline', 42, 60)
+            self.assertEqual(self.cache.get('offline'), 42)
+        self.cache._shared_down_until = 0
+        print("[RESULT]: SUCCESS - Local memory used while shared cache is down.")
+
+    def test_tags_invalidate_keys(self):
+        """Bumping a tag should orphan every key built with it, and only those."""
+        print("\n[RUNNING]: test_tags_invalidate_keys")
+        from .cache import invalidate_tags, tagged_key
+        room_key = tagged_key('room-list', ['rooms'])
+        user_key = tagged_key('profile', ['user:1'])
+        invalidate_tags('rooms')
+        self.assertNotEqual(tagged_key('room-list', ['rooms']), room_key)
+        self.assertEqual(tagged_key('profile', ['user:1']), user_key)
+        print("[RESULT]: SUCCESS - Tag bump invalidated only tagged keys.")
+
+    def test_tag_versions_are_locally_stale_within_bound(self):
+        """Another process's tag bump is seen after the local copy expires, at once with LOCAL_TIMEOUT 0."""
+        print("\n[RUNNING]: test_tag_versions_are_locally_stale_within_bound")
+        from django.core.cache import caches
+        from .cache import TAG_KEY, TwoLevelCache, tag_versions
+        before = tag_versions(['rooms'])[0]
+        caches['shared'].incr(TAG_KEY.format('rooms'))  # a bump made by another process
+        self.assertEqual(tag_versions(['rooms'])[0], before)
+
+        uncached = TwoLevelCache('no-local', {'OPTIONS': {'LOCAL_TIMEOUT': 0}})
+        self.assertEqual(tag_versions(['rooms'], uncached)[0], before + 1)
+        self.cache.local.clear()
+        self.assertEqual(tag_versions(['rooms'])[0], before + 1)
+        print("[RESULT]: SUCCESS - Tag staleness bounded by the local timeout.")
+
+    def test_get_or_build_is_single_flight(self):
+        """Concurrent callers for the same key should trigger exactly one build."""
+        print("\n[RUNNING]: test_get_or_build_is_single_flight")
+        import threading
+        import time
+        from django.test import override_settings
+        from .cache import get_or_build
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return 'expensive'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_build('report', build, 60)))
+            for _ in range(5)
+        ]
+        # Worker threads can't share the test transaction, so use an in-memory shared level
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'stayspot.cache.TwoLevelCache', 'LOCATION': 'single-flight'},
+            'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual([value for value, _ in results], ['expensive'] * 5)
+        print("[RESULT]: SUCCESS - One build served every caller.")
+
+    def test_get_or_build_leaves_other_callers_lock(self):
+        """A caller that gives up waiting builds its own copy but doesn't release the builder's lock."""
+        print("\n[RUNNING]: test_get_or_build_leaves_other_callers_lock")
+        from .cache import get_or_build, tagged_key
+        lock_key = f"lock:{tagged_key('slow-report')}"
+        self.cache.add(lock_key, 'other-builder', 60)
+        self.assertEqual(get_or_build('slow-report', lambda: 'copy', 60, wait=0.1), ('copy', False))
+        self.assertEqual(self.cache.get(lock_key), 'other-builder')
+
+        self.cache.delete(lock_key)
+        self.assertEqual(get_or_build('fresh-report', lambda: 'built', 60), ('built', False))
+        self.assertIsNone(self.cache.get(f"lock:{tagged_key('fresh-report')}"))
+        print("[RESULT]: SUCCESS - Lock released only by its owner.")
+
+    def test_metrics_are_batched_in_memory(self):
+        """Counts stay in process memory until a flush, then land in the shared cache as one sum."""
+        print("\n[RUNNING]: test_metrics_are_batched_in_memory")
+        from django.core.cache import caches
+        from django.test import override_settings
+        from .cache import count_metric, flush_metrics, read_metrics
+        flush_metrics()
+        with override_settings(CACHE_METRICS_FLUSH_SECONDS=3600):
+            for _ in range(50):
+                count_metric('demo_hit')
+            count_metric('demo_miss', 2)
+        self.assertIsNone(caches['shared'].get('metrics:demo_hit'))
+        self.assertEqual(read_metrics(['demo_hit', 'demo_miss']), {'demo_hit': 50, 'demo_miss': 2, 'demo_hit_rate': 0.9615})
+        self.assertEqual(caches['shared'].get('metrics:demo_hit'), 50)
+        print("[RESULT]: SUCCESS - Metrics flushed in one write per counter.")
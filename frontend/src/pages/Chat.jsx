@@ -101,12 +101,16 @@ const Chat = ({ user }) => {
       chatService.connect(activeChat.id, (event) => {
         if (event.type === "message") {
           setMessages((prev) => [...prev, event]);
-          chatService.sendSeenEvent(user.id, activeChat.id); // mark as seen immediately
-        } else if (event.type === "seen") {
-          // other person saw our messages — show blue double ticks
-          if (event.user_id !== user.id) {
-            setMessages((prev) => prev.map((m) => ({ ...m, is_read: true })));
-          }
+          chatService.sendReceipt("seen", event.id); // mark as seen immediately
+        } else if (event.type === "receipts") {
+          // other person saw our messages — show blue double ticks up to their seen id
+          Object.entries(event.receipts || {}).forEach(([userId, [, seenId]]) => {
+            if (Number(userId) !== user.id && seenId) {
+              setMessages((prev) =>
+                prev.map((m) => (m.id && m.id <= seenId ? { ...m, is_read: true } : m)),
+              );
+            }
+          });
         }
       });
 
@@ -345,7 +349,7 @@ const Chat = ({ user }) => {
                           {msg.image && (
                             <div className="mt-2 rounded-lg overflow-hidden border border-white/20">
                               <img
-                                src={getMediaUrl(msg.image)}
+                                src={getMediaUrl(msg.thumbnail_urls?.["480"] || msg.image)}
                                 alt="Shared"
                                 className="max-w-full h-auto max-h-64 object-cover cursor-pointer hover:opacity-95 transition-opacity"
                                 onClick={() =>
@@ -30,6 +30,8 @@ const OwnerTenants = ({ user, onLogout }) => {
     maintenance_requests: 0,
   });
   const [tenants, setTenants] = useState([]);
+  const [pagination, setPagination] = useState({ total: 0, pages: 0 });
+  const [rooms, setRooms] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState("");
   const [propertyFilter, setPropertyFilter] = useState("All Properties");
@@ -39,44 +41,42 @@ const OwnerTenants = ({ user, onLogout }) => {
   const fetchTenantData = React.useCallback(async () => {
     try {
       setLoading(true);
-      const response = await apiRequest(API_ENDPOINTS.OWNER_TENANTS);
+      // Search, property filter and paging happen on the server
+      const queryParams = new URLSearchParams({
+        page: currentPage.toString(),
+        page_size: tenantsPerPage.toString(),
+        search: searchQuery,
+      });
+      if (propertyFilter !== "All Properties") {
+        queryParams.set("room", propertyFilter);
+      }
+      const response = await apiRequest(
+        `${API_ENDPOINTS.OWNER_TENANTS}?${queryParams.toString()}`,
+      );
       if (response.ok) {
         const data = await response.json();
         setStats(data.stats);
         setTenants(data.tenants);
+        setPagination(data.pagination);
+        setRooms(data.rooms);
       }
     } catch (error) {
       console.error(error);
     } finally {
       setLoading(false);
     }
-  }, []);
+  }, [currentPage, searchQuery, propertyFilter]);
 
   useEffect(() => {
-    fetchTenantData();
+    // Wait for typing to pause before searching
+    const timer = setTimeout(fetchTenantData, 300);
+    return () => clearTimeout(timer);
   }, [fetchTenantData]);
 
-  const filteredTenants = tenants.filter((t) => {
-    const matchesSearch =
-      t.tenant.full_name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      t.tenant.email.toLowerCase().includes(searchQuery.toLowerCase());
-    const matchesProperty =
-      propertyFilter === "All Properties" ||
-      t.property.includes(propertyFilter);
-    return matchesSearch && matchesProperty;
-  });
-
-  const indexOfLastTenant = currentPage * tenantsPerPage;
-  const indexOfFirstTenant = indexOfLastTenant - tenantsPerPage;
-  const currentTenants = filteredTenants.slice(
-    indexOfFirstTenant,
-    indexOfLastTenant,
-  );
-  const totalPages = Math.ceil(filteredTenants.length / tenantsPerPage);
-  const properties = [
-    "All Properties",
-    ...new Set(tenants.map((t) => t.property.split(", ")[1])),
-  ];
+  const indexOfFirstTenant = (currentPage - 1) * tenantsPerPage;
+  const indexOfLastTenant = indexOfFirstTenant + tenants.length;
+  const totalPages = pagination.pages;
+  const properties = ["All Properties", ...rooms];
 
   const getLeaseStyle = (s) => {
     if (s === "Active" || s === "Confirmed")
@@ -188,14 +188,20 @@ const OwnerTenants = ({ user, onLogout }) => {
                     placeholder="Search tenants..."
                     className="pl-9 pr-4 py-2.5 bg-gray-50 border border-gray-100 rounded-xl text-xs font-medium text-gray-700 outline-none focus:ring-2 focus:ring-indigo-500/20 focus:border-indigo-400 transition-all w-48"
                     value={searchQuery}
-                    onChange={(e) => setSearchQuery(e.target.value)}
+                    onChange={(e) => {
+                      setSearchQuery(e.target.value);
+                      setCurrentPage(1);
+                    }}
                   />
                 </div>
                 <div className="relative">
                   <select
                     className="appearance-none pl-3 pr-8 py-2.5 bg-gray-50 border border-gray-100 rounded-xl text-xs font-medium text-gray-700 outline-none focus:ring-2 focus:ring-indigo-500/20 focus:border-indigo-400 transition-all cursor-pointer"
                     value={propertyFilter}
-                    onChange={(e) => setPropertyFilter(e.target.value)}
+                    onChange={(e) => {
+                      setPropertyFilter(e.target.value);
+                      setCurrentPage(1);
+                    }}
                   >
                     {properties.map((p) => (
                       <option key={p} value={p}>
@@ -244,7 +250,7 @@ const OwnerTenants = ({ user, onLogout }) => {
                         </div>
                       </td>
                     </tr>
-                  ) : currentTenants.length === 0 ? (
+                  ) : tenants.length === 0 ? (
                     <tr>
                       <td colSpan="6" className="py-16 text-center">
                         <div className="flex flex-col items-center gap-3 text-gray-400">
@@ -261,7 +267,7 @@ const OwnerTenants = ({ user, onLogout }) => {
                       </td>
                     </tr>
                   ) : (
-                    currentTenants.map((item) => (
+                    tenants.map((item) => (
                       <tr
                         key={item.id}
                         className="hover:bg-gray-50/60 transition-colors group"
@@ -391,15 +397,15 @@ const OwnerTenants = ({ user, onLogout }) => {
               <p className="text-xs text-gray-400">
                 Showing{" "}
                 <span className="font-semibold text-gray-700">
-                  {indexOfFirstTenant + 1}
+                  {pagination.total ? indexOfFirstTenant + 1 : 0}
                 </span>
                 –
                 <span className="font-semibold text-gray-700">
-                  {Math.min(indexOfLastTenant, filteredTenants.length)}
+                  {indexOfLastTenant}
                 </span>{" "}
                 of{" "}
                 <span className="font-semibold text-gray-700">
-                  {filteredTenants.length}
+                  {pagination.total}
                 </span>{" "}
                 tenants
               </p>
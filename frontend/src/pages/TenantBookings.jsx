@@ -276,8 +276,8 @@ const TenantBookings = ({ user }) => {
                   ) : (
                     currentBookings.map((booking) => {
                       const imageUrl =
-                        booking.room.images?.length > 0
-                          ? getMediaUrl(booking.room.images[0].image)
+                        booking.room.cover_image
+                          ? getMediaUrl(booking.room.cover_image.image)
                           : "https://images.unsplash.com/photo-1522708323590-d24dbb6b0267?w=800&q=80";
 
                       const handleMessageOwner = async () => {
@@ -301,8 +301,8 @@ export default function TenantVisits({ user }) {
                 filteredVisits.map((visit) => {
                   const statusConfig = getStatusConfig(visit.status);
                   const roomImage =
-                    visit.room.images?.length > 0
-                      ? getMediaUrl(visit.room.images[0].image)
+                    visit.room.cover_image
+                      ? getMediaUrl(visit.room.cover_image.image)
                       : "https://images.unsplash.com/photo-1522708323590-d24dbb6b0267?w=800&h=600&fit=crop";
 
                   return (
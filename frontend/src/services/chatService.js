@@ -154,45 +154,94 @@ class ChatService {
   }
 
   /**
-   * Upload media via API and then notify via WebSocket
+   * Acknowledge the highest message id delivered/seen via WebSocket.
+   * The server batches these and broadcasts one "receipts" frame per flush.
    */
-  async sendMedia(conversationId, file, text, senderId, senderName) {
-    const formData = new FormData();
-    if (file.type.startsWith("image/")) {
-      formData.append("image", file);
-    } else {
-      formData.append("file", file);
+  sendReceipt(kind, messageId) {
+    if (!messageId) return;
+    if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+      this.socket.send(
+        JSON.stringify({
+          type: "receipt",
+          kind: kind,
+          message_id: messageId,
+        }),
+      );
     }
-    if (text) formData.append("text", text);
+  }
 
-    const response = await apiRequest(
-      `${API_ENDPOINTS.CHAT}${conversationId}/send_media/`,
-      {
-        method: "POST",
-        body: formData,
-      },
-    );
+  /**
+   * Upload a file in resumable chunks; returns the saved message.
+   * The sha256 lets the server skip the transfer for media it already stores.
+   */
+  async uploadInChunks(conversationId, file, text) {
+    const base = `${API_ENDPOINTS.CHAT}${conversationId}/uploads/`;
+    const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+    const sha256 = Array.from(new Uint8Array(digest))
+      .map((b) => b.toString(16).padStart(2, "0"))
+      .join("");
+
+    const startResponse = await apiRequest(base, {
+      method: "POST",
+      body: JSON.stringify({
+        filename: file.name,
+        content_type: file.type,
+        size: file.size,
+        sha256: sha256,
+        text: text,
+      }),
+    });
+    if (!startResponse.ok) throw new Error("Failed to start upload");
+    let state = await startResponse.json();
 
-    if (response.ok) {
-      const savedMsg = await response.json();
-      // Notify others via websocket about the new media message
-      if (this.socket && this.socket.readyState === WebSocket.OPEN) {
-        this.socket.send(
-          JSON.stringify({
-            type: "chat_message",
-            message: savedMsg.text,
-            sender_id: senderId,
-            sender_name: senderName,
-            media_url: savedMsg.image || savedMsg.file,
-            media_type: savedMsg.image ? "image" : "file",
-            msg_id: savedMsg.id,
-          }),
-        );
+    while (state.status !== "Complete" && state.offset < state.size) {
+      const chunk = file.slice(state.offset, state.offset + state.chunk_size);
+      const chunkResponse = await apiRequest(
+        `${base}${state.upload_id}/?offset=${state.offset}`,
+        {
+          method: "PUT",
+          body: chunk,
+          headers: { "Content-Type": "application/octet-stream" },
+        },
+      );
+      // 409 means we were out of sync; its body carries the offset to resume from
+      if (!chunkResponse.ok && chunkResponse.status !== 409) {
+        throw new Error("Failed to upload media");
       }
-      return savedMsg;
-    } else {
-      throw new Error("Failed to upload media");
+      state = await chunkResponse.json();
+    }
+
+    if (state.status !== "Complete") {
+      const completeResponse = await apiRequest(
+        `${base}${state.upload_id}/complete/`,
+        { method: "POST", body: JSON.stringify({ text: text }) },
+      );
+      if (!completeResponse.ok) throw new Error("Failed to upload media");
+      state = await completeResponse.json();
+    }
+    return state.message;
+  }
+
+  /**
+   * Upload media via API and then notify via WebSocket
+   */
+  async sendMedia(conversationId, file, text, senderId, senderName) {
+    const savedMsg = await this.uploadInChunks(conversationId, file, text);
+    // Notify others via websocket about the new media message
+    if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+      this.socket.send(
+        JSON.stringify({
+          type: "chat_message",
+          message: savedMsg.text,
+          sender_id: senderId,
+          sender_name: senderName,
+          media_url: savedMsg.image || savedMsg.file,
+          media_type: savedMsg.image ? "image" : "file",
+          msg_id: savedMsg.id,
+        }),
+      );
     }
+    return savedMsg;
   }
 
   /**
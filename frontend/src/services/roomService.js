@@ -318,4 +318,36 @@ export const roomService = {
       console.warn("Could not increment room views:", error);
     }
   },
+
+  // Daily views, unique viewers, visits and bookings for an owner's room (nightly rollups)
+  getRoomAnalytics: async (id, days = 30) => {
+    try {
+      const response = await apiRequest(`/rooms/${id}/analytics/?days=${days}`);
+      if (!response.ok) throw new Error("Failed to fetch room analytics");
+      return await response.json();
+    } catch (error) {
+      console.error("Error in getRoomAnalytics:", error);
+      throw error;
+    }
+  },
+
+  // Clustered markers for a map viewport; bounds = { west, south, east, north }.
+  // Returns { zoom, markers: [{ lat, lng, count, min_price, max_price, room_id }] }
+  getMapClusters: async (bounds, zoom) => {
+    try {
+      const bbox = [bounds.west, bounds.south, bounds.east, bounds.north].join(",");
+      const response = await apiRequest(`/rooms/map/?bbox=${bbox}&zoom=${zoom}`);
+      if (!response.ok) throw new Error("Failed to fetch map clusters");
+      const data = await response.json();
+      return {
+        zoom: data.zoom,
+        markers: data.markers.map((row) =>
+          Object.fromEntries(data.columns.map((column, i) => [column, row[i]])),
+        ),
+      };
+    } catch (error) {
+      console.error("Error in getMapClusters:", error);
+      throw error;
+    }
+  },
 };